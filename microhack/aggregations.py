@@ -0,0 +1,316 @@
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Literal, Optional
+
+import pathway as pw
+
+from microhack.metrics import INGESTED_AT
+from microhack.sketches import DDSketch, HyperLogLog
+
+
+def _sum(value: pw.ColumnExpression, strict: bool = False) -> pw.ColumnExpression:
+    """`strict` recomputes a float sum from the group's values instead of updating it incrementally.
+
+    The incremental float sum loses batches whose rows cancel out in number, such as
+    an update (one row deleted, one inserted), so tables with deletions need it.
+    """
+    return pw.reducers.sum(value, strict=True) if strict else pw.reducers.sum(value)
+
+
+# Exact reducers, given the value column and whether float sums must be strict
+REDUCERS = {
+    "count": lambda value, strict: pw.reducers.count(),
+    "sum": _sum,
+    "min": lambda value, strict: pw.reducers.min(value),
+    "max": lambda value, strict: pw.reducers.max(value),
+    "mean": lambda value, strict: _sum(value, strict) / pw.reducers.count(),
+}
+
+# Reducers that can be computed per shard and combined: partial columns, and how to combine them
+PARTIALS = {
+    "count": {"_count": lambda value, strict: pw.reducers.count()},
+    "sum": {"_sum": _sum},
+    "min": {"_min": lambda value, strict: pw.reducers.min(value)},
+    "max": {"_max": lambda value, strict: pw.reducers.max(value)},
+    "mean": {"_sum": _sum, "_count": lambda value, strict: pw.reducers.count()},
+}
+# Partial results change as rows arrive, so float sums of them are strict (see `_strict_sums`)
+COMBINE = {
+    "count": lambda partial, strict: pw.reducers.sum(partial._count),
+    "sum": lambda partial, strict: _sum(partial._sum, strict),
+    "min": lambda partial, strict: pw.reducers.min(partial._min),
+    "max": lambda partial, strict: pw.reducers.max(partial._max),
+    "mean": lambda partial, strict: _sum(partial._sum, strict) / pw.reducers.sum(partial._count),
+}
+
+# Approximate reducers: "distinct" and percentiles such as "p50", "p99" or "p99.9"
+PERCENTILE = re.compile(r"p(\d{1,2}(\.\d+)?)")
+
+
+class DistinctCountAccumulator(pw.BaseCustomAccumulator):
+    """HyperLogLog-backed distinct count; memory per group is capped at `2 ** precision` bytes.
+
+    HyperLogLog cannot forget values, so retracted rows stay counted: `retract` is a
+    no-op. Without it the engine would keep every row of a group to recompute the
+    count on each retraction, losing the memory cap.
+    """
+
+    precision = 14
+
+    def __init__(self, sketch: HyperLogLog):
+        self.sketch = sketch
+
+    @classmethod
+    def from_row(cls, row):
+        [value] = row
+        sketch = HyperLogLog(cls.precision)
+        sketch.add(value)
+        return cls(sketch)
+
+    def update(self, other):
+        self.sketch.merge(other.sketch)
+
+    def retract(self, other):
+        pass
+
+    def compute_result(self) -> int:
+        return self.sketch.count()
+
+
+class QuantileAccumulator(pw.BaseCustomAccumulator):
+    """DDSketch-backed percentile, accurate to `relative_accuracy` with at most `max_bins` buckets."""
+
+    quantile = 0.5
+    relative_accuracy = 0.01
+    max_bins = 2048
+
+    def __init__(self, sketch: DDSketch):
+        self.sketch = sketch
+
+    @classmethod
+    def from_row(cls, row):
+        [value] = row
+        sketch = DDSketch(cls.relative_accuracy, cls.max_bins)
+        sketch.add(value)
+        return cls(sketch)
+
+    def update(self, other):
+        self.sketch.merge(other.sketch)
+
+    def retract(self, other):
+        self.sketch.subtract(other.sketch)
+
+    def compute_result(self) -> float:
+        return self.sketch.quantile(self.quantile)
+
+
+def _accumulator(base: type, **parameters) -> type:
+    """Subclass of `base` with `parameters` as class attributes, defined once per parameter set.
+
+    The engine pickles accumulator state, so the subclass is registered in this
+    module under a name derived from its parameters, where pickle can find it.
+    """
+    suffix = "_".join(f"{name}_{value}" for name, value in parameters.items())
+    name = f"{base.__name__}_{re.sub(r'[^0-9A-Za-z]', '_', suffix)}"
+    accumulator = globals().get(name)
+    if accumulator is None:
+        accumulator = type(name, (base,), {"__module__": __name__, "__qualname__": name, **parameters})
+        globals()[name] = accumulator
+    return accumulator
+
+
+def distinct_count(precision: int = 14):
+    return pw.reducers.udf_reducer(_accumulator(DistinctCountAccumulator, precision=precision))
+
+
+def percentile(quantile: float, relative_accuracy: float = 0.01, max_bins: int = 2048):
+    accumulator = _accumulator(
+        QuantileAccumulator, quantile=quantile, relative_accuracy=relative_accuracy, max_bins=max_bins
+    )
+    return pw.reducers.udf_reducer(accumulator)
+
+
+def _split(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+@dataclass
+class AggregationSpec:
+    """What `pipeline()` computes: reducers over `value_column`, optionally per group and per window.
+
+    Windows are defined on `time_column`, which must hold numeric event times
+    (e.g. epoch seconds); durations are expressed in the same unit. Events arriving
+    more than `allowed_lateness` after their window closed are dropped, and the
+    state of closed windows is released.
+    """
+
+    reducers: List[str] = field(default_factory=lambda: ["sum"])
+    group_by: List[str] = field(default_factory=list)
+    # Columns to count distinct values of, as `distinct_<column>`
+    distinct_columns: List[str] = field(default_factory=list)
+    value_column: str = "value"
+    window: Literal["none", "tumbling", "sliding"] = "none"
+    time_column: str = "timestamp"
+    duration: float = 60
+    hop: float = 10
+    allowed_lateness: Optional[float] = None
+    # "updates" refreshes window results as events arrive, "final" emits each window once it closes
+    emit: Literal["updates", "final"] = "updates"
+    keep_closed_windows: bool = True
+    # Split each group over this many shards and combine the partial results,
+    # so a hot group (or the global total) is reduced by several workers
+    shards: int = 1
+    # Sketch parameters of the approximate reducers
+    sketch_relative_accuracy: float = 0.01
+    sketch_max_bins: int = 2048
+    hll_precision: int = 14
+
+    def __post_init__(self):
+        unknown = [
+            name
+            for name in self.reducers
+            if name not in REDUCERS and name != "distinct" and not PERCENTILE.fullmatch(name)
+        ]
+        if unknown:
+            raise ValueError(
+                f"Unknown reducers {unknown}, expected any of {sorted(REDUCERS)}, "
+                "'distinct' or percentiles like 'p99'"
+            )
+
+    @property
+    def sharded(self) -> bool:
+        """Whether to reduce in two phases; only exact reducers can be combined across shards."""
+        decomposable = all(name in PARTIALS for name in self.reducers) and not self.distinct_columns
+        return self.shards > 1 and self.window == "none" and decomposable
+
+    @classmethod
+    def from_settings(cls, settings) -> "AggregationSpec":
+        return cls(
+            reducers=_split(settings.aggregation_reducers),
+            group_by=_split(settings.aggregation_group_by),
+            distinct_columns=_split(settings.aggregation_distinct_columns),
+            value_column=settings.aggregation_value_column,
+            window=settings.aggregation_window,
+            time_column=settings.aggregation_time_column,
+            duration=settings.aggregation_window_duration,
+            hop=settings.aggregation_window_hop,
+            allowed_lateness=settings.aggregation_allowed_lateness,
+            emit=settings.aggregation_emit,
+            keep_closed_windows=settings.aggregation_keep_closed_windows,
+            shards=settings.aggregation_shards,
+            sketch_relative_accuracy=settings.sketch_relative_accuracy,
+            sketch_max_bins=settings.sketch_max_bins,
+            hll_precision=settings.hll_precision,
+        )
+
+    def reducer(self, name: str, column: pw.ColumnExpression, strict: bool = False) -> pw.ColumnExpression:
+        """Reducer `name` over `column`; `strict` makes float sums exact under deletions (see `_sum`)."""
+        if name in REDUCERS:
+            return REDUCERS[name](column, strict)
+        if name == "distinct":
+            return distinct_count(self.hll_precision)(column)
+        quantile = float(PERCENTILE.fullmatch(name).group(1)) / 100
+        return percentile(quantile, self.sketch_relative_accuracy, self.sketch_max_bins)(column)
+
+    def reducer_columns(self, table: pw.Table, strict: bool = False) -> Dict[str, pw.ColumnExpression]:
+        value = table[self.value_column]
+        columns = {name.replace(".", "_"): self.reducer(name, value, strict) for name in self.reducers}
+        for column in self.distinct_columns:
+            columns[f"distinct_{column}"] = self.reducer("distinct", table[column])
+        return columns
+
+    def window_definition(self):
+        if self.window == "tumbling":
+            return pw.temporal.tumbling(duration=self.duration)
+        return pw.temporal.sliding(hop=self.hop, duration=self.duration)
+
+    def behavior(self):
+        if self.emit == "final":
+            return pw.temporal.exactly_once_behavior(shift=self.allowed_lateness)
+        if self.allowed_lateness is None and self.keep_closed_windows:
+            return None
+        return pw.temporal.common_behavior(cutoff=self.allowed_lateness, keep_results=self.keep_closed_windows)
+
+
+def _strict_sums(table: pw.Table, column: str) -> bool:
+    """Whether sums of `column` must be strict: it holds floats and rows of `table` can be deleted."""
+    return not table.is_append_only and table.schema.typehints()[column] in (float, Optional[float])
+
+
+def _latency_columns(table: pw.Table, source) -> Dict[str, pw.ColumnExpression]:
+    """Newest ingest time among the rows behind each result, when the input carries one (0 if unknown)."""
+    if INGESTED_AT not in table.column_names():
+        return {}
+    return {INGESTED_AT: pw.reducers.max(pw.coalesce(source[INGESTED_AT], 0.0))}
+
+
+def _shard(key: pw.Pointer, shards: int) -> int:
+    """Shard of a row; stable across processes, unlike `hash()`, so every worker agrees on it."""
+    return zlib.crc32(str(key).encode("ascii")) % shards
+
+
+def _sharded_aggregate(table: pw.Table, spec: AggregationSpec) -> pw.Table:
+    """Reduce per (group, shard), then combine the shards of each group."""
+    shards = spec.shards
+    table = table.with_columns(_shard=pw.apply_with_type(lambda key: _shard(key, shards), int, table.id))
+    partials = {}
+    strict = _strict_sums(table, spec.value_column)
+    for name in spec.reducers:
+        partials.update(
+            {column: reducer(table[spec.value_column], strict) for column, reducer in PARTIALS[name].items()}
+        )
+    partial = table.groupby(*[table[column] for column in spec.group_by], table._shard).reduce(
+        *[table[column] for column in spec.group_by],
+        **partials,
+        **_latency_columns(table, table),
+    )
+
+    strict = "_sum" in partial.column_names() and _strict_sums(partial, "_sum")
+    combined = {
+        **{name: COMBINE[name](partial, strict) for name in spec.reducers},
+        **({INGESTED_AT: pw.reducers.max(partial[INGESTED_AT])} if INGESTED_AT in partial.column_names() else {}),
+    }
+    if not spec.group_by:
+        return partial.reduce(**combined)
+    return partial.groupby(*[partial[column] for column in spec.group_by]).reduce(
+        *[partial[column] for column in spec.group_by],
+        **combined,
+    )
+
+
+def aggregate(table: pw.Table, spec: AggregationSpec) -> pw.Table:
+    """Apply the grouped and/or windowed reducers described by `spec`."""
+    if spec.sharded:
+        return _sharded_aggregate(table, spec)
+    strict = _strict_sums(table, spec.value_column)
+    if spec.window == "none":
+        if not spec.group_by:
+            return table.reduce(**spec.reducer_columns(table, strict), **_latency_columns(table, table))
+        grouped = table.groupby(*[table[column] for column in spec.group_by])
+        return grouped.reduce(
+            **{column: pw.this[column] for column in spec.group_by},
+            **spec.reducer_columns(pw.this, strict),
+            **_latency_columns(table, pw.this),
+        )
+
+    table = table.filter(table[spec.time_column].is_not_none())
+    instance = None
+    if len(spec.group_by) == 1:
+        instance = table[spec.group_by[0]]
+    elif spec.group_by:
+        instance = pw.make_tuple(*[table[column] for column in spec.group_by])
+
+    windowed = table.windowby(
+        table[spec.time_column],
+        window=spec.window_definition(),
+        behavior=spec.behavior(),
+        instance=instance,
+    )
+    return windowed.reduce(
+        window_start=pw.this._pw_window_start,
+        window_end=pw.this._pw_window_end,
+        **{column: pw.reducers.any(pw.this[column]) for column in spec.group_by},
+        **spec.reducer_columns(pw.this, strict),
+        **_latency_columns(table, pw.this),
+    )
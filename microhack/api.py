@@ -1,15 +1,93 @@
-from fastapi import FastAPI, WebSocket
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 import asyncio
-import json
-from typing import Dict, Any
+import threading
+from functools import partial
+from typing import Any, Dict, List, Optional
 import pathway as pw
-from microhack.pipeline import pipeline
-from microhack.input import input
-from microhack.output import output
+from microhack.broadcast import BroadcastHub
+from microhack.subscriptions import Subscription
+from microhack.ingest import iter_batches, iter_records
+from microhack.input import get_codec, get_ingest_subject, input
+from microhack.aggregations import AggregationSpec
+from microhack.checkpoint import persistence_config
 from microhack.config import get_settings
+from microhack.instrumentation import observe_input, observe_output, without_ingest_time
+from microhack.metrics import CONTENT_TYPE, QUEUE_DEPTH, REGISTRY, WEBSOCKET_CLIENTS
+from microhack.profiling import Profiler, get_profiler, output_prefix, timed, track_pipelines
+from microhack.registry import MAIN, PipelineDefinition, build_pipelines, input_columns, load_pipelines
+from microhack.shared_pipeline import PipelineClient, PipelineError
+from microhack.view import MaterializedView
 
-app = FastAPI(title="MicroHack API", description="Pathway-based data processing API")
+hub = BroadcastHub()
+# Hubs of every registered pipeline by name; the main one is `hub`
+hubs: Dict[str, BroadcastHub] = {MAIN: hub}
+definitions: List[PipelineDefinition] = []
+# Set in worker processes sharing the pipeline of run_api.py
+pipeline_client: Optional[PipelineClient] = None
+
+
+def start_pipeline(on_change=None) -> threading.Thread:
+    """Build the registered pipelines on one input and run the engine in a background thread.
+
+    Output changes go to `on_change`, called with `pipeline=<name>`, by default
+    to this process's hub of each pipeline.
+    """
+    registered = load_pipelines(get_settings())
+    input_table = input(input_columns(registered))
+    output_tables = build_pipelines(input_table, registered)
+    for name, output_table in output_tables.items():
+        callback = partial(on_change, pipeline=name) if on_change else hubs[name].on_change
+        pw.io.subscribe(without_ingest_time(output_table), on_change=timed(f"subscriber:{name}", callback))
+    track_pipelines(input_table, output_tables)
+    observe_input(input_table, get_settings().input_connector)
+    observe_output(output_tables[MAIN])
+
+    thread = threading.Thread(
+        target=pw.run,
+        kwargs={
+            "monitoring_level": pw.MonitoringLevel.NONE,
+            "persistence_config": persistence_config(get_settings()),
+        },
+        name="pathway-engine",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def configure_hub(target: BroadcastHub, spec: AggregationSpec) -> None:
+    settings = get_settings()
+    target.queue_size = settings.websocket_queue_size
+    target.policy = settings.websocket_slow_consumer_policy
+    target.log_size = settings.websocket_resume_log_size
+    target.view = MaterializedView(spec.group_by, "window_start" if spec.window != "none" else None)
+    target.attach(asyncio.get_running_loop())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    definitions[:] = load_pipelines(settings)
+    for definition in definitions:
+        configure_hub(hubs.setdefault(definition.name, BroadcastHub()), definition.spec)
+    WEBSOCKET_CLIENTS.set_function(lambda: sum(each.subscriber_count for each in hubs.values()))
+    QUEUE_DEPTH.set_function(lambda: sum(each.buffered for each in hubs.values()), queue="websocket")
+    if settings.pipeline_address:
+        global pipeline_client
+        named = {name: each for name, each in hubs.items() if name != MAIN}
+        pipeline_client = PipelineClient(
+            settings.pipeline_address, bytes.fromhex(settings.pipeline_authkey), hub, named
+        )
+        pipeline_client.start()
+    else:
+        start_pipeline()
+    yield
+
+
+app = FastAPI(title="MicroHack API", description="Pathway-based data processing API", lifespan=lifespan)
 
 # Enable CORS for frontend integration
 app.add_middleware(
@@ -20,66 +98,306 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global state for current sum
-current_sum = 0
+ingest_counters = {"records": 0, "batches": 0}
+# Running sum of /process-data when the pipeline reads from another connector
+processed_sum = 0
+# Bodies of /ingest in the MessagePack format of microhack.wire
+MSGPACK_CONTENT_TYPES = {"application/msgpack", "application/x-msgpack"}
+
+
+def ingested():
+    """Ingestion totals, across all workers when the pipeline is shared."""
+    return pipeline_client.counters if pipeline_client else ingest_counters
+
+
+def pipeline_results():
+    """Latest output rows of the shared pipeline."""
+    return list(hub.snapshot().values())
+
+
+def current_sum():
+    results = pipeline_results()
+    return sum(row.get("sum", 0) for row in results)
+
+
+def check_value(record: Dict[str, Any]) -> None:
+    if "value" not in record:
+        raise HTTPException(status_code=422, detail=f"Record without 'value': {record}")
+    value = record["value"]
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise HTTPException(status_code=422, detail=f"Record with a non-numeric 'value': {record}")
+
+
+async def push_batch(records, typed=False):
+    if get_settings().input_connector != "http":
+        raise HTTPException(status_code=409, detail="Ingestion requires INPUT_CONNECTOR=http")
+    for record in records:
+        check_value(record)
+    # Blocks while the engine is behind; keep it off the event loop
+    push = pipeline_client.push if pipeline_client else get_ingest_subject().push
+    try:
+        await asyncio.to_thread(push, records, typed)
+    except PipelineError as e:
+        raise HTTPException(status_code=502, detail=f"The shared pipeline failed to ingest the batch: {e}")
+    # This worker's own totals; `ingested()` reports the shared pipeline's when there is one
+    ingest_counters["records"] += len(records)
+    ingest_counters["batches"] += 1
+
 
 @app.get("/")
 async def root():
     return {"message": "MicroHack API is running"}
 
+
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "current_sum": current_sum}
+    # A worker sharing the pipeline has no results until it received the snapshot
+    ready = pipeline_client is None or pipeline_client.connected.is_set()
+    return {"status": "healthy" if ready else "starting", "current_sum": current_sum()}
+
 
 @app.post("/process-data")
 async def process_data(data: Dict[str, Any]):
-    """Process a single data point"""
-    global current_sum
-    value = data.get("value", 0)
-    current_sum += value
-    return {"processed_value": value, "current_sum": current_sum}
+    """Process a single data point.
 
-@app.websocket("/ws/stream")
-async def websocket_stream(websocket: WebSocket):
-    """WebSocket endpoint for real-time data streaming"""
+    With INPUT_CONNECTOR=http the value is handed to the pipeline asynchronously,
+    so `current_sum` may not include it yet. With other connectors the pipeline
+    reads its own input, and the value is added to this worker's running sum.
+    """
+    global processed_sum
+    if get_settings().input_connector == "http":
+        await push_batch([data])
+        return {"processed_value": data["value"], "current_sum": current_sum()}
+    data = {"value": 0, **data}
+    check_value(data)
+    processed_sum += data["value"]
+    return {"processed_value": data["value"], "current_sum": processed_sum}
+
+
+@app.post("/ingest")
+async def ingest(request: Request):
+    """Ingest NDJSON or a JSON array of records, streamed from the request body.
+
+    With `Content-Type: application/msgpack` the body is instead one batch in the
+    MessagePack input format, validated against the input schema as a whole.
+    """
+    if request.headers.get("content-type", "").split(";")[0].strip() in MSGPACK_CONTENT_TYPES:
+        return await ingest_msgpack(request)
+    accepted = 0
+    try:
+        batches = iter_batches(iter_records(request.stream()), get_settings().ingest_max_batch_size)
+        async for batch in batches:
+            await push_batch(batch)
+            accepted += len(batch)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{e} (accepted {accepted} records before the error)")
+    return {"accepted": accepted}
+
+
+async def ingest_msgpack(request: Request):
+    try:
+        records = get_codec().decode_records(await request.body(), strict=True)
+    except ImportError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    size = get_settings().ingest_max_batch_size
+    for start in range(0, len(records), size):
+        await push_batch(records[start : start + size], typed=True)
+    return {"accepted": len(records)}
+
+
+def get_hub(name: str) -> BroadcastHub:
+    if name not in hubs:
+        raise HTTPException(status_code=404, detail=f"No pipeline named '{name}'")
+    return hubs[name]
+
+
+async def stream(websocket: WebSocket, source: BroadcastHub):
     await websocket.accept()
-    
+    if websocket.query_params:
+        try:
+            subscription = Subscription.from_query(websocket.query_params)
+        except (ValueError, ImportError) as e:
+            await websocket.close(code=1008, reason=str(e)[:120])
+            return
+        subscriber = source.subscribe_stream(subscription)
+    else:
+        subscriber = source.subscribe()
+
     try:
-        # Initialize Pathway pipeline
-        get_settings()
-        input_table = input()
-        output_table = pipeline(input_table)
-        
-        # Create a custom output that sends data to WebSocket
-        def websocket_output(table):
-            def callback(key, row, time, is_addition):
-                asyncio.create_task(
-                    websocket.send_text(
-                        json.dumps({
-                            "key": key,
-                            "sum": row["sum"],
-                            "timestamp": time,
-                            "is_addition": is_addition
-                        })
-                    )
-                )
-            
-            table.subscribe(callback)
-        
-        websocket_output(output_table)
-        
-        # Keep connection alive
         while True:
-            await asyncio.sleep(1)
-            await websocket.ping()
-            
-    except Exception as e:
-        await websocket.close(code=1000, reason=str(e))
+            message = await subscriber.get()
+            if message is None:
+                # Buffer overflowed under the "disconnect" policy
+                await websocket.close(code=1013, reason="slow consumer")
+                break
+            if isinstance(message, bytes):
+                await websocket.send_bytes(message)
+            else:
+                await websocket.send_text(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        source.unsubscribe(subscriber)
+
+
+def query_results(
+    source: BroadcastHub,
+    request: Request,
+    limit: int,
+    cursor: Optional[str],
+    time_from: Optional[float],
+    time_to: Optional[float],
+):
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    reserved = {"limit", "cursor", "time_from", "time_to"}
+    filters = {name: value for name, value in request.query_params.items() if name not in reserved}
+    try:
+        rows, next_cursor = source.view.query(filters, time_from, time_to, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"rows": rows, "next_cursor": next_cursor}
+
+
+def get_result(source: BroadcastHub, key: str):
+    row = source.view.get(key)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"No result for key '{key}'")
+    return row
+
+
+@app.websocket("/ws/stream")
+async def websocket_stream(websocket: WebSocket):
+    """WebSocket endpoint for real-time data streaming.
+
+    All clients share one pipeline; each gets a bounded buffer drained here.
+    Without query parameters every engine change is sent as its own JSON message.
+    With any of `keys`, `group`, `since`, `snapshot`, `max_fps` or `encoding` the
+    client gets the subscription protocol instead: a snapshot (or resume) frame,
+    then coalesced, sequence-numbered frames of the latest rows of matching keys.
+    """
+    await stream(websocket, hub)
+
+
+@app.get("/results")
+async def results(
+    request: Request,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    time_from: Optional[float] = None,
+    time_to: Optional[float] = None,
+):
+    """Query the latest pipeline results without touching the engine.
+
+    Every other query parameter is an equality filter on an output column, e.g.
+    `/results?region=eu&time_from=1700000000`. Rows are ordered by (time, key);
+    pass `next_cursor` back as `cursor` to get the next page.
+    """
+    return query_results(hub, request, limit, cursor, time_from, time_to)
+
+
+@app.get("/results/{key}")
+async def result(key: str):
+    """Latest output row for one key."""
+    return get_result(hub, key)
+
+
+@app.get("/pipelines")
+async def pipelines():
+    """Pipelines registered in PIPELINES, next to the main one, all on the same input."""
+    return [
+        {
+            "name": definition.name,
+            "function": definition.function,
+            "reducers": definition.spec.reducers,
+            "group_by": definition.spec.group_by,
+            "window": definition.spec.window,
+            "output_path": definition.output_path,
+            "results": len(hubs[definition.name].view.rows),
+        }
+        for definition in definitions
+    ]
+
+
+@app.websocket("/pipelines/{name}/ws/stream")
+async def pipeline_stream(websocket: WebSocket, name: str):
+    """`/ws/stream` for the pipeline `name`."""
+    if name not in hubs:
+        await websocket.close(code=1008, reason=f"No pipeline named '{name}'")
+        return
+    await stream(websocket, hubs[name])
+
+
+@app.get("/pipelines/{name}/results")
+async def pipeline_results_query(
+    name: str,
+    request: Request,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    time_from: Optional[float] = None,
+    time_to: Optional[float] = None,
+):
+    """`/results` for the pipeline `name`."""
+    return query_results(get_hub(name), request, limit, cursor, time_from, time_to)
+
+
+@app.get("/pipelines/{name}/results/{key}")
+async def pipeline_result(name: str, key: str):
+    """`/results/{key}` for the pipeline `name`."""
+    return get_result(get_hub(name), key)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: connector rates, commit sizes, queue depths and latencies."""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+def require_profiler() -> Profiler:
+    profiler = get_profiler()
+    if profiler is None:
+        raise HTTPException(status_code=409, detail="Profiling requires PROFILING_ENABLED=true")
+    return profiler
+
+
+@app.get("/profile")
+async def profile():
+    """Profile summary: busiest threads and functions, stage row counts and latencies, callback times.
+
+    In a worker sharing the pipeline of `run_api.py` this covers the worker only;
+    the pipeline's profile is written by the serving process when it exits.
+    """
+    return require_profiler().summary()
+
+
+@app.get("/profile/flamegraph")
+async def profile_flamegraph(format: str = "svg"):
+    """Flame graph of the sampled stacks, as SVG or, with `format=folded`, folded stacks."""
+    profiler = require_profiler()
+    if format == "folded":
+        return Response(profiler.folded(), media_type="text/plain")
+    if format != "svg":
+        raise HTTPException(status_code=400, detail="format must be svg or folded")
+    return Response(profiler.flamegraph(), media_type="image/svg+xml")
+
+
+@app.post("/profile/dump")
+async def profile_dump():
+    """Write the profile to PROFILING_OUTPUT now."""
+    profiler = require_profiler()
+    return {"paths": await asyncio.to_thread(profiler.dump, output_prefix(get_settings()))}
+
 
 @app.get("/stats")
 async def get_stats():
     """Get current processing statistics"""
     return {
-        "current_sum": current_sum,
-        "status": "running"
-    } 
\ No newline at end of file
+        "current_sum": current_sum(),
+        "results": pipeline_results(),
+        "ingested_records": ingested()["records"],
+        "ingested_batches": ingested()["batches"],
+        "status": "running",
+        "websocket_clients": hub.subscriber_count,
+    }
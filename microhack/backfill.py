@@ -0,0 +1,100 @@
+import glob
+import hashlib
+import os
+import tempfile
+from typing import Dict, List, Optional, Sequence
+
+from microhack.timestamps import to_epoch
+
+# Readers by file extension: CSV, or JSON Lines such as dumps of /ingest requests
+BACKFILL_FORMATS = {".csv": "csv", ".jsonl": "jsonlines", ".ndjson": "jsonlines", ".json": "jsonlines"}
+
+
+def _format(path: str) -> Optional[str]:
+    return BACKFILL_FORMATS.get(os.path.splitext(path)[1].lower())
+
+
+def find_files(patterns: Sequence[str]) -> List[str]:
+    """Absolute paths of the CSV/JSONL files under the given directories or matching the given globs."""
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = glob.glob(os.path.join(pattern, "**", "*"), recursive=True)
+        else:
+            candidates = glob.glob(pattern, recursive=True)
+        files.update(os.path.abspath(path) for path in candidates if os.path.isfile(path) and _format(path))
+    return sorted(files)
+
+
+def shard_files(files: Sequence[str], shards: int) -> List[List[str]]:
+    """Split files into `shards` groups of similar total size, largest files first.
+
+    Deterministic for a given file list, so every process computes the same split.
+    """
+    sizes = {path: os.path.getsize(path) for path in files}
+    loads = [0] * shards
+    groups: List[List[str]] = [[] for _ in range(shards)]
+    for path in sorted(files, key=lambda path: (-sizes[path], path)):
+        target = loads.index(min(loads))
+        groups[target].append(path)
+        loads[target] += sizes[path]
+    return [sorted(group) for group in groups]
+
+
+def stage_shards(files: Sequence[str], shards: int, directory: Optional[str] = None) -> List[Dict[str, str]]:
+    """One directory of symlinks per shard and format, since the engine's file readers take a directory.
+
+    Returns, per shard, the staged directory of each format it has files of. The
+    default location is derived from the file list, so that all processes of a
+    multi-process run build the same readers.
+    """
+    digest = hashlib.sha1("\n".join([str(shards), *files]).encode("utf-8")).hexdigest()[:12]
+    root = directory or os.path.join(tempfile.gettempdir(), f"microhack-backfill-{digest}")
+    staged = []
+    for index, group in enumerate(shard_files(files, shards)):
+        directories: Dict[str, str] = {}
+        for position, path in enumerate(group):
+            fmt = _format(path)
+            target = directories.setdefault(fmt, os.path.join(root, f"shard-{index}", fmt))
+            os.makedirs(target, exist_ok=True)
+            link = os.path.join(target, f"{position:06d}-{os.path.basename(path)}")
+            try:
+                os.symlink(path, link)
+            except FileExistsError:
+                # Staged by another process, or by an earlier run over the same files
+                pass
+        staged.append(directories)
+    return staged
+
+
+def backfill_input(
+    patterns: Sequence[str], extra_columns: Sequence[str] = (), shards: int = 1, staging_dir: Optional[str] = None
+):
+    """Static table of every event in the matching files, with the schema of `input()`.
+
+    Files are split into `shards` groups read by separate engine readers in bulk,
+    with no Python code per row except to convert CSV timestamps, which may be
+    date-times as in `sample_data.csv`.
+    """
+    import pathway as pw
+
+    from microhack.input import input_schema
+
+    files = find_files(patterns)
+    if not files:
+        raise ValueError(f"No CSV or JSONL files found in {', '.join(patterns)}")
+    print(f"Backfilling {len(files)} files in {shards} shards")
+
+    schema = input_schema(extra_columns)
+    # Read as text, converted below
+    csv_schema = schema.with_types(timestamp=Optional[str])
+    tables = []
+    for directories in stage_shards(files, shards, staging_dir):
+        if "csv" in directories:
+            table = pw.io.csv.read(directories["csv"], schema=csv_schema, mode="static")
+            tables.append(
+                table.with_columns(timestamp=pw.apply_with_type(to_epoch, Optional[float], pw.this.timestamp))
+            )
+        if "jsonlines" in directories:
+            tables.append(pw.io.jsonlines.read(directories["jsonlines"], schema=schema, mode="static"))
+    return tables[0] if len(tables) == 1 else pw.Table.concat_reindex(*tables)
@@ -0,0 +1,103 @@
+import time
+from typing import Callable, Optional
+
+from microhack.metrics import COMMIT_BATCH_TARGET, COMMIT_DECISIONS
+
+# Weight of the latest commit interval in the smoothed arrival rate
+RATE_SMOOTHING = 0.3
+
+
+class CommitController:
+    """Decides when a Python connector commits the rows it has emitted.
+
+    Connectors call `add()` after emitting rows and commit whenever it returns a
+    non-zero count, and call `flush()` when their source has nothing more for now.
+
+    Without a `latency_target` every `batch_size` rows are committed. With one, the
+    batch size follows the arrival rate: it is the number of rows expected within
+    the target, between `min_batch` and `max_batch`. Under heavy load batches grow
+    and per-commit overhead shrinks; under light load rows are committed almost one
+    by one. Rows are also committed once the oldest of them has waited for the
+    target, so a drop in traffic never holds them back for long.
+    """
+
+    def __init__(
+        self,
+        connector: str,
+        batch_size: int,
+        latency_target: Optional[float] = None,
+        min_batch: int = 1,
+        max_batch: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.connector = connector
+        self.latency_target = latency_target
+        self.min_batch = max(1, min_batch)
+        self.max_batch = max(self.min_batch, max_batch)
+        self.batch_size = max(1, batch_size) if latency_target is None else self.min_batch
+        self.pending = 0
+        # Smoothed rows per second
+        self.rate = 0.0
+        self._clock = clock
+        self._oldest: Optional[float] = None
+        self._last_commit = clock()
+        COMMIT_BATCH_TARGET.set(self.batch_size, connector=connector)
+
+    @property
+    def adaptive(self) -> bool:
+        return self.latency_target is not None
+
+    def add(self, count: int = 1) -> int:
+        """Account for `count` emitted rows; returns how many rows to commit now (0 to keep batching)."""
+        if count and self._oldest is None:
+            self._oldest = self._clock()
+        self.pending += count
+        if self.pending >= self.batch_size:
+            return self._decide("size")
+        if self.pending and self.adaptive and self._clock() - self._oldest >= self.latency_target:
+            return self._decide("deadline")
+        return 0
+
+    def flush(self) -> int:
+        """Commit whatever is pending, e.g. at the end of a file or a request."""
+        return self._decide("flush") if self.pending else 0
+
+    def timeout(self) -> Optional[float]:
+        """Seconds until pending rows are due, for connectors waiting on their source; None if nothing is."""
+        if not self.adaptive or self._oldest is None:
+            return None
+        return max(0.0, self._oldest + self.latency_target - self._clock())
+
+    def _decide(self, reason: str) -> int:
+        rows, now = self.pending, self._clock()
+        COMMIT_DECISIONS.inc(connector=self.connector, reason=reason)
+        if self.adaptive:
+            rate = rows / max(now - self._last_commit, 1e-6)
+            # Grow gradually, but shrink at once when the batch could not fill in time
+            smoothing = 1 if reason == "deadline" else RATE_SMOOTHING
+            self.rate = smoothing * rate + (1 - smoothing) * self.rate
+            target = int(self.rate * self.latency_target)
+            self.batch_size = min(self.max_batch, max(self.min_batch, target))
+            COMMIT_BATCH_TARGET.set(self.batch_size, connector=self.connector)
+        self.pending = 0
+        self._oldest = None
+        self._last_commit = now
+        return rows
+
+
+def commit_controller(settings, connector: str, batch_size: int = 1) -> CommitController:
+    """Controller for `connector`: `batch_size` rows per commit, or adaptive when `COMMIT_MODE=adaptive`."""
+    if settings.commit_mode != "adaptive":
+        return CommitController(connector, batch_size)
+    return CommitController(
+        connector,
+        batch_size,
+        latency_target=settings.commit_latency_target_ms / 1000,
+        min_batch=settings.commit_min_batch,
+        max_batch=settings.commit_max_batch,
+    )
+
+
+def autocommit_duration_ms(settings) -> Optional[int]:
+    """Engine-side autocommit for Python connectors; off in adaptive mode, where the controller commits."""
+    return None if settings.commit_mode == "adaptive" else settings.autocommit_duration_ms
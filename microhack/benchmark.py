@@ -0,0 +1,299 @@
+import bisect
+import json
+import os
+import resource
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import pathway as pw
+
+from microhack.aggregations import AggregationSpec
+from microhack.fake_broker import FakeBroker
+from microhack.input import input_schema
+from microhack.loadgen import LoadGenerator, percentile
+from microhack.pipeline import pipeline
+from microhack.scaleout import spawn_command
+
+# `on_change` receives the engine time as `time`, shadowing the module
+_monotonic = time.monotonic
+
+# Metrics compared against the baseline, and whether higher values are better
+REGRESSION_METRICS = {"events_per_sec": True, "p99_latency_ms": False, "peak_rss_mb": False}
+
+
+class LoadGeneratorSubject(pw.io.python.ConnectorSubject):
+    """Feeds `LoadGenerator` batches to the engine, remembering when each batch was sent."""
+
+    def __init__(self, generator: LoadGenerator, batch_size: int = 1000):
+        super().__init__()
+        self.generator = generator
+        self.batch_size = batch_size
+        # Cumulative event count at the end of each batch, and the time it started sending
+        self.sent: List[int] = []
+        self.sent_at: List[float] = []
+
+    def run(self):
+        count = 0
+        for batch in self.generator.batches(self.batch_size):
+            count += len(batch)
+            self.sent_at.append(time.monotonic())
+            self.sent.append(count)
+            for record in batch:
+                self.next_json(record)
+
+
+class LatencyProbe:
+    """Subscriber on the running event count of the pipeline output, timing when each batch became visible."""
+
+    def __init__(self, subject: LoadGeneratorSubject):
+        self.subject = subject
+        self.latencies: List[float] = []
+        self.processed = 0
+        self.completed_at: Optional[float] = None
+
+    def on_change(self, key, row, time, is_addition):
+        if not is_addition:
+            return
+        now = _monotonic()
+        index = bisect.bisect_left(self.subject.sent, row["count"])
+        self.latencies.append(now - self.subject.sent_at[index])
+        self.processed = row["count"]
+        self.completed_at = now
+
+
+class BrokerSubject(pw.io.python.ConnectorSubject):
+    """Reads the given partitions of a `FakeBroker` in turn, like one member of a consumer group."""
+
+    def __init__(self, broker: FakeBroker, partitions: List[int], batch_size: int = 1000):
+        super().__init__()
+        self.broker = broker
+        self.partitions = partitions
+        self.batch_size = batch_size
+        self.emitted = 0
+
+    def run(self):
+        offsets = {partition: 0 for partition in self.partitions}
+        while offsets:
+            for partition, offset in list(offsets.items()):
+                records = self.broker.consume(partition, offset, self.batch_size)
+                if not records:
+                    del offsets[partition]
+                    continue
+                for record in records:
+                    self.next_json(record)
+                offsets[partition] = offset + len(records)
+                self.emitted += len(records)
+
+
+def run_single(
+    generator: LoadGenerator, batch_size: int, autocommit_ms: int, group_by_key: bool = True
+) -> Dict[str, Any]:
+    """Run `pipeline()` once over the generated load and measure it. Call once per process."""
+    subject = LoadGeneratorSubject(generator, batch_size)
+    input_table = pw.io.python.read(
+        subject, schema=input_schema(["key"]), format="json", autocommit_duration_ms=autocommit_ms
+    )
+    spec = AggregationSpec(reducers=["count", "sum"], group_by=["key"] if group_by_key else [])
+    output_table = pipeline(input_table, spec)
+
+    updates = 0
+
+    def count_update(key, row, time, is_addition):
+        nonlocal updates
+        updates += 1
+
+    pw.io.subscribe(output_table, on_change=count_update)
+    probe = LatencyProbe(subject)
+    # Latency up to the aggregated output: the total of the per-key counts covers an event once it is aggregated
+    pw.io.subscribe(output_table.reduce(count=pw.reducers.sum(pw.this.count)), on_change=probe.on_change)
+
+    start = time.monotonic()
+    pw.run(monitoring_level=pw.MonitoringLevel.NONE)
+    elapsed = (probe.completed_at or time.monotonic()) - start
+
+    return {
+        "events": probe.processed,
+        "output_updates": updates,
+        "events_per_sec": probe.processed / elapsed if elapsed > 0 else float("nan"),
+        "p50_latency_ms": percentile(probe.latencies, 0.50) * 1000,
+        "p99_latency_ms": percentile(probe.latencies, 0.99) * 1000,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run_partition_worker(broker: FakeBroker, batch_size: int, autocommit_ms: int) -> Dict[str, Any]:
+    """One process of the scaling benchmark without Kafka: consume the topic and aggregate by key, sharded.
+
+    The engine runs Python connectors in the first process only, so that process
+    reads every partition and the workers of all processes share the aggregation.
+    """
+    processes = int(os.environ.get("PATHWAY_PROCESSES", "1"))
+    process_id = int(os.environ.get("PATHWAY_PROCESS_ID", "0"))
+    threads = int(os.environ.get("PATHWAY_THREADS", "1"))
+    subject = BrokerSubject(broker, list(range(len(broker.partitions))), batch_size)
+    input_table = pw.io.python.read(
+        subject, schema=input_schema(["key"]), format="json", autocommit_duration_ms=autocommit_ms
+    )
+    spec = AggregationSpec(reducers=["count", "sum"], group_by=["key"], shards=processes * threads)
+
+    def discard(key, row, time, is_addition):
+        pass
+
+    pw.io.subscribe(pipeline(input_table, spec), on_change=discard)
+
+    start = time.monotonic()
+    pw.run(monitoring_level=pw.MonitoringLevel.NONE)
+    return {"process_id": process_id, "events": subject.emitted, "elapsed_sec": time.monotonic() - start}
+
+
+def run_partitioned(processes: int, threads: int, autocommit_ms: int, args: List[str]) -> Dict[str, Any]:
+    """Run the in-memory partitioned workload on `processes` x `threads` workers and combine per-process reports."""
+    command = spawn_command(
+        processes,
+        threads,
+        [sys.executable, "run_benchmark.py", "--partition-worker", "--autocommit-ms", str(autocommit_ms), *args],
+    )
+    completed = subprocess.run(command, capture_output=True, text=True, check=True)
+    reports = [json.loads(line) for line in completed.stdout.splitlines() if line.startswith("{")]
+    events = sum(report["events"] for report in reports)
+    elapsed = max(report["elapsed_sec"] for report in reports)
+    return {
+        "processes": processes,
+        "threads": threads,
+        "events": events,
+        "events_per_sec": events / elapsed if elapsed > 0 else float("nan"),
+        "per_process_events": [report["events"] for report in sorted(reports, key=lambda r: r["process_id"])],
+    }
+
+
+def produce_events(bootstrap_servers: str, topic: str, generator: LoadGenerator) -> int:
+    """Write the generated events to a Kafka topic as JSON messages, with a static engine run."""
+    records = [record for batch in generator.batches() for record in batch]
+    schema = pw.schema_from_types(**{column: type(value) for column, value in records[0].items()})
+    table = pw.debug.table_from_rows(schema, [tuple(record.values()) for record in records])
+    pw.io.kafka.write(table, {"bootstrap.servers": bootstrap_servers}, topic_name=topic, format="json")
+    pw.run(monitoring_level=pw.MonitoringLevel.NONE)
+    return len(records)
+
+
+def run_kafka_worker(events: int) -> None:
+    """One process of the scaling benchmark: the shipped Kafka `input()` and a sharded `pipeline()`.
+
+    The topic and consumer settings come from the environment, as in `run.py`. The
+    process holding the probe's result prints the time at which the output covered
+    all `events`; the caller then stops the run.
+    """
+    from microhack.config import get_settings
+    from microhack.input import input
+
+    settings = get_settings()
+    spec = AggregationSpec(
+        reducers=["count", "sum"], group_by=["key"], shards=settings.pathway_processes * settings.pathway_threads
+    )
+    output_table = pipeline(input(["key"]), spec)
+    start = time.monotonic()
+
+    def on_change(key, row, time, is_addition):
+        if is_addition and row["events"] >= events:
+            print(json.dumps({"events": row["events"], "elapsed_sec": _monotonic() - start}), flush=True)
+
+    # Measured on the pipeline's output: events are counted once aggregated
+    pw.io.subscribe(output_table.reduce(events=pw.reducers.sum(pw.this.count)), on_change=on_change)
+    pw.run(monitoring_level=pw.MonitoringLevel.NONE)
+
+
+def run_scaling(
+    processes: int,
+    threads: int,
+    autocommit_ms: int,
+    events: int,
+    bootstrap_servers: str,
+    topic: str,
+    timeout: float = 600,
+) -> Dict[str, Any]:
+    """Consume `events` from a Kafka topic on `processes` x `threads` workers through `input()`.
+
+    Each run uses a new consumer group reading from the earliest offset, so every
+    run consumes the whole topic; its partitions are divided among the workers'
+    readers, as in production.
+    """
+    command = spawn_command(processes, threads, [sys.executable, "run_benchmark.py", "--kafka-worker", str(events)])
+    env = dict(
+        os.environ,
+        INPUT_CONNECTOR="kafka",
+        INPUT_FORMAT="json",
+        KAFKA_BOOTSTRAP_SERVERS=bootstrap_servers,
+        KAFKA_TOPIC=topic,
+        KAFKA_GROUP_ID=f"microhack-benchmark-{uuid.uuid4().hex}",
+        KAFKA_AUTO_OFFSET_RESET="earliest",
+        KAFKA_PARALLEL_READERS="0",
+        AUTOCOMMIT_DURATION_MS=str(autocommit_ms),
+        PATHWAY_PROCESSES=str(processes),
+        PATHWAY_THREADS=str(threads),
+        PERSISTENCE_PATH="",
+    )
+    # Streaming runs never end by themselves; stop the whole process group once a report arrives
+    worker = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True, start_new_session=True)
+    deadline = time.monotonic() + timeout
+    report = None
+    try:
+        for line in worker.stdout:
+            if line.startswith("{"):
+                report = json.loads(line)
+                break
+            if time.monotonic() > deadline:
+                break
+    finally:
+        os.killpg(worker.pid, signal.SIGTERM)
+        worker.wait()
+    if report is None:
+        raise RuntimeError(f"Workers did not consume {events} events from {topic}")
+    return {
+        "processes": processes,
+        "threads": threads,
+        "events": report["events"],
+        "events_per_sec": report["events"] / report["elapsed_sec"] if report["elapsed_sec"] > 0 else float("nan"),
+    }
+
+
+def run_in_subprocess(threads: int, autocommit_ms: int, args: List[str]) -> Dict[str, Any]:
+    """Run one configuration in a fresh process, since the engine graph and thread count are per process."""
+    env = dict(os.environ, PATHWAY_THREADS=str(threads))
+    command = [sys.executable, "run_benchmark.py", "--single", "--autocommit-ms", str(autocommit_ms), *args]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {"threads": threads, "autocommit_ms": autocommit_ms, **result}
+
+
+def result_key(result: Dict[str, Any]) -> str:
+    return f"threads={result['threads']},autocommit_ms={result['autocommit_ms']}"
+
+
+def find_regressions(
+    results: List[Dict[str, Any]], baseline: Dict[str, Dict[str, float]], tolerance: float
+) -> List[str]:
+    """Describe every metric that is worse than the baseline by more than `tolerance` (a fraction)."""
+    regressions = []
+    for result in results:
+        expected = baseline.get(result_key(result))
+        if expected is None:
+            continue
+        for metric, higher_is_better in REGRESSION_METRICS.items():
+            if metric not in expected:
+                continue
+            limit = expected[metric] * (1 - tolerance if higher_is_better else 1 + tolerance)
+            worse = result[metric] < limit if higher_is_better else result[metric] > limit
+            if worse:
+                regressions.append(
+                    f"{result_key(result)}: {metric} {result[metric]:.1f} vs baseline {expected[metric]:.1f}"
+                )
+    return regressions
+
+
+def baseline_from(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    return {result_key(result): {metric: result[metric] for metric in REGRESSION_METRICS} for result in results}
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, Literal, Optional, Set, Tuple, Union
+
+from microhack.metrics import WEBSOCKET_DROPPED, WEBSOCKET_FANOUT_LAG
+from microhack.subscriptions import StreamSubscriber, Subscription, Update
+from microhack.view import MaterializedView
+
+SlowConsumerPolicy = Literal["drop_oldest", "latest", "disconnect"]
+
+
+def legacy_message(update: Update) -> str:
+    """Message of the original `/ws/stream` format: one per engine change, retractions included."""
+    return json.dumps(
+        {"key": update.key, **update.row, "timestamp": update.time, "is_addition": update.is_addition},
+        default=str,
+    )
+
+
+class Subscriber:
+    """Bounded per-client message buffer drained by a single WebSocket sender."""
+
+    def __init__(self, queue_size: int = 100, policy: SlowConsumerPolicy = "drop_oldest"):
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.dropped = 0
+        self.closed = False
+        self._buffer: deque = deque()
+        self._ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def offer(self, message: str, published_at: Optional[float] = None) -> None:
+        """Enqueue a message, applying the slow-consumer policy when the buffer is full."""
+        if self.closed:
+            return
+        dropped = 0
+        if self.policy == "latest":
+            dropped = len(self._buffer)
+            self._buffer.clear()
+        elif len(self._buffer) >= self.queue_size:
+            if self.policy == "disconnect":
+                self.close()
+                return
+            self._buffer.popleft()
+            dropped = 1
+        if dropped:
+            self.dropped += dropped
+            WEBSOCKET_DROPPED.inc(dropped)
+        self._buffer.append((time.monotonic() if published_at is None else published_at, message))
+        self._ready.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self._buffer.clear()
+        self._ready.set()
+
+    async def get(self) -> Optional[str]:
+        """Wait for the next message; returns None once the subscriber is closed."""
+        while not self._buffer:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        published_at, message = self._buffer.popleft()
+        WEBSOCKET_FANOUT_LAG.observe(time.monotonic() - published_at)
+        return message
+
+
+class BroadcastHub:
+    """Fans out pipeline updates from the engine thread to every connected client.
+
+    The engine calls `on_change` from its own thread; every change is numbered and
+    handed to the event loop with `call_soon_threadsafe`, so a slow client only ever
+    affects its own bounded buffer. The last `log_size` changes are kept so that a
+    reconnecting stream subscriber can resume from the sequence number it last saw.
+    """
+
+    def __init__(self, queue_size: int = 100, policy: SlowConsumerPolicy = "drop_oldest", log_size: int = 10000):
+        self.queue_size = queue_size
+        self.policy = policy
+        self._subscribers: Set[Union[Subscriber, StreamSubscriber]] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Current output rows; replace before the engine starts to index more columns
+        self.view = MaterializedView()
+        self._state_lock = threading.Lock()
+        self.seq = 0
+        self._log: deque = deque(maxlen=log_size)
+
+    @property
+    def log_size(self) -> int:
+        return self._log.maxlen
+
+    @log_size.setter
+    def log_size(self, value: int) -> None:
+        self._log = deque(self._log, maxlen=value)
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def buffered(self) -> int:
+        """Messages waiting in all subscriber buffers."""
+        return sum(len(subscriber) for subscriber in list(self._subscribers))
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size, self.policy)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def subscribe_stream(self, subscription: Subscription) -> StreamSubscriber:
+        """Register a protocol subscriber, starting from a snapshot or from `subscription.since`.
+
+        Resuming sends the current state of every key changed after `since`, if the
+        log still reaches back that far; otherwise the client gets a full snapshot.
+        """
+        with self._state_lock:
+            since = subscription.since
+            oldest = self._log[0].seq if self._log else self.seq + 1
+            if since is not None and oldest - 1 <= since <= self.seq:
+                changed = {update.key: update for update in self._log if update.seq > since}
+                initial = {
+                    key: update.current
+                    for key, update in changed.items()
+                    if subscription.matches(key, update.row if update.current is None else update.current)
+                }
+                initial_type = "resume"
+            elif subscription.snapshot or since is not None:
+                initial = {key: row for key, row in self.view.rows.items() if subscription.matches(key, row)}
+                initial_type = "snapshot"
+            else:
+                initial, initial_type = {}, "update"
+            subscriber = StreamSubscriber(subscription, self.seq, initial, initial_type)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Union[Subscriber, StreamSubscriber]) -> None:
+        self._subscribers.discard(subscriber)
+        subscriber.close()
+
+    def publish(self, message: Union[str, Update]) -> None:
+        """Thread-safe: schedule delivery of a message or numbered update to all subscribers."""
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._dispatch, message, time.monotonic())
+
+    def _dispatch(self, message: Union[str, Update], published_at: float) -> None:
+        legacy = None
+        for subscriber in list(self._subscribers):
+            if isinstance(subscriber, Subscriber) and isinstance(message, Update):
+                # Serialized once, for all subscribers of the original format
+                legacy = legacy or legacy_message(message)
+                subscriber.offer(legacy, published_at)
+            else:
+                subscriber.offer(message, published_at)
+            if subscriber.closed:
+                self._subscribers.discard(subscriber)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Current pipeline output rows, by key."""
+        with self._state_lock:
+            return dict(self.view.rows)
+
+    def load(self, entries: Iterable[Tuple[str, Dict[str, Any], Any]], seq: int) -> None:
+        """Replace the state with a snapshot taken at `seq`, e.g. from a pipeline in another process.
+
+        Changes applied afterwards through `on_change` must be the ones following `seq`,
+        so that sequence numbers match the origin's. Clients cannot resume from before it.
+        """
+        view = self.view.empty()
+        for key, row, time in entries:
+            view.apply(key, row, time, True)
+        with self._state_lock:
+            self.view = view
+            self.seq = seq
+            self._log.clear()
+
+    def on_change(self, key: Any, row: Dict[str, Any], time: int, is_addition: bool) -> None:
+        """Callback for `pw.io.subscribe`."""
+        key = str(key)
+        with self._state_lock:
+            self.view.apply(key, row, time, is_addition)
+            self.seq += 1
+            update = Update(self.seq, key, row, time, is_addition, self.view.get(key))
+            self._log.append(update)
+        self.publish(update)
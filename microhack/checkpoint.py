@@ -0,0 +1,56 @@
+import json
+import os
+from typing import Any, Dict, Optional
+
+DRIVE_CHECKPOINT = "google_drive.json"
+
+
+def load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, state: Dict[str, Any]) -> None:
+    """Atomically replace the checkpoint, so a crash leaves either the old or the new one."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, default=str)
+    os.replace(tmp_path, path)
+
+
+def shard_path(path: str, name: str) -> str:
+    """Where one part of the state checkpointed at `path` is kept, so that it is rewritten on its own."""
+    return os.path.join(f"{path}.d", f"{name}.json")
+
+
+def remove_checkpoint(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def drive_checkpoint_path(settings) -> Optional[str]:
+    if not settings.persistence_path:
+        return None
+    return os.path.join(settings.persistence_path, DRIVE_CHECKPOINT)
+
+
+def persistence_config(settings):
+    """Engine persistence for operator state and connector offsets, or None when disabled.
+
+    The Google Drive connector checkpoints its own state instead (see
+    `drive_checkpoint_path`): on restart it re-emits the rows of the last ingested
+    revision, which rebuilds the operator state without downloading the file again.
+    """
+    if not settings.persistence_path or settings.input_connector == "google_drive":
+        return None
+    import pathway as pw
+
+    return pw.persistence.Config(
+        pw.persistence.Backend.filesystem(os.path.join(settings.persistence_path, "pathway")),
+        snapshot_interval_ms=settings.persistence_snapshot_interval_ms,
+    )
@@ -1,5 +1,5 @@
 from functools import lru_cache
-from typing import Literal
+from typing import Literal, Optional
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
@@ -8,20 +8,126 @@ ENV_FILE_PATH = "config/.env"
 
 
 class Settings(BaseSettings):
-    input_connector: Literal["python", "kafka", "google_drive"]
+    input_connector: Literal["python", "kafka", "google_drive", "http"]
+    # Wire format of Kafka messages: one JSON object per message, or "msgpack" batches
+    # of rows validated against the input schema (see microhack.wire); with msgpack the
+    # python and http connectors hand typed values to the engine instead of JSON text
+    input_format: Literal["json", "msgpack"] = "json"
     autocommit_duration_ms: int
+    # "adaptive" lets Python connectors size their commits at runtime to meet
+    # commit_latency_target_ms, within [commit_min_batch, commit_max_batch] rows
+    commit_mode: Literal["static", "adaptive"] = "static"
+    commit_latency_target_ms: int = 100
+    commit_min_batch: int = 1
+    commit_max_batch: int = 100_000
     pathway_threads: int
+    # Worker processes; run.py relaunches itself through `pathway spawn` when above 1
+    pathway_processes: int = 1
 
     kafka_bootstrap_servers: str
     kafka_group_id: str
     kafka_session_timeout_ms: str
     kafka_topic: str
+    # Kafka readers sharing the topic's partitions; 0 lets the engine use one per worker
+    kafka_parallel_readers: int = 0
+    # Where a consumer group without committed offsets starts: "earliest" or "latest";
+    # empty keeps the librdkafka default
+    kafka_auto_offset_reset: str = ""
 
     # Google Drive settings
     google_drive_filename: str = ""
+    # Watch every CSV/spreadsheet in this folder and/or matching this Drive query instead of one file
+    google_drive_folder_id: str = ""
+    google_drive_query: str = ""
+    google_drive_max_concurrent_downloads: int = 8
+    # On-disk cache of downloaded and parsed revisions; empty disables
+    google_drive_cache_dir: str = ""
+    google_drive_cache_max_bytes: int = 1024 * 1024 * 1024
     google_drive_credentials_file: str = "config/credentials.json"
     google_drive_refresh_interval: int = 60
     google_drive_value_column: str = "value"
+    # Column holding each row's event time (epoch seconds or ISO 8601); ingest time when absent
+    google_drive_timestamp_column: str = "timestamp"
+    # Column identifying a row across edits; rows are matched by content hash when empty
+    google_drive_key_column: str = ""
+    # Watch the Drive changes feed instead of polling file metadata
+    google_drive_use_changes_feed: bool = False
+    # Upper bound for the polling delay while Drive requests keep failing
+    google_drive_max_backoff: int = 900
+    # Rows parsed and emitted per batch, and bytes fetched per download request
+    google_drive_batch_size: int = 10000
+    google_drive_download_chunk_size: int = 4 * 1024 * 1024
+    # Rows per engine commit, and an optional cap on emitted rows per second (0 = unlimited)
+    google_drive_commit_size: int = 1000
+    google_drive_max_rows_per_second: float = 0
+    # Columns to parse (comma-separated; value, key and aggregation columns are always
+    # added; empty parses all) and pandas dtype hints as column:dtype pairs
+    google_drive_columns: str = ""
+    google_drive_dtypes: str = ""
+
+    # Aggregation settings, see microhack.aggregations.AggregationSpec
+    aggregation_reducers: str = "sum"  # comma-separated: count, sum, min, max, mean, distinct, p50, p99, ...
+    aggregation_group_by: str = ""  # comma-separated column names
+    aggregation_distinct_columns: str = ""  # comma-separated column names
+    aggregation_value_column: str = "value"
+    aggregation_window: Literal["none", "tumbling", "sliding"] = "none"
+    aggregation_time_column: str = "timestamp"
+    aggregation_window_duration: float = 60
+    aggregation_window_hop: float = 10
+    aggregation_allowed_lateness: Optional[float] = None
+    aggregation_emit: Literal["updates", "final"] = "updates"
+    aggregation_keep_closed_windows: bool = True
+    # Shards per group for exact reducers, e.g. processes x threads to spread a hot group; 1 reduces in one phase
+    aggregation_shards: int = 1
+    # Approximate reducers: DDSketch accuracy/size for percentiles, HyperLogLog precision for distinct counts
+    sketch_relative_accuracy: float = 0.01
+    sketch_max_bins: int = 2048
+    hll_precision: int = 14
+    # More pipelines on the same input, as a JSON object of name -> options: aggregation
+    # settings without the "aggregation_" prefix, "function" (module:function) and
+    # "output_path"; see microhack.registry
+    pipelines: str = ""
+
+    # Output sink: "csv" changelog, compacted "snapshot" of the latest state, or a
+    # "rotating" JSON Lines/Parquet changelog (format taken from the output_path extension)
+    output_sink: Literal["csv", "snapshot", "rotating"] = "csv"
+    output_path: str = "output.csv"
+    output_flush_rows: int = 1000
+    output_flush_interval_ms: int = 1000
+    output_rotate_bytes: int = 64 * 1024 * 1024
+    output_rotate_seconds: int = 3600
+    output_keep_files: int = 0  # 0 keeps all rotated files
+
+    # HTTP batch ingestion settings (INPUT_CONNECTOR=http)
+    ingest_max_batch_size: int = 1000
+    ingest_max_queued_batches: int = 64
+
+    # WebSocket fan-out settings
+    websocket_queue_size: int = 100
+    websocket_slow_consumer_policy: Literal["drop_oldest", "latest", "disconnect"] = "drop_oldest"
+    # Recent updates kept for clients resuming with ?since=<seq>
+    websocket_resume_log_size: int = 10000
+
+    # API worker processes for run_api.py; above 1 they share one pipeline in the parent process
+    api_workers: int = 1
+    # Set by run_api.py for its workers: where the shared pipeline is served, and its hex authkey
+    pipeline_address: str = ""
+    pipeline_authkey: str = ""
+
+    # Checkpoint directory for operator state and connector offsets; empty disables
+    persistence_path: str = ""
+    persistence_snapshot_interval_ms: int = 10000
+
+    # Prometheus metrics for run.py (the API always serves /metrics); 0 disables
+    metrics_port: int = 0
+
+    # Stack sampling and per-stage counters, dumped to <profiling_output>.{svg,folded,json}
+    # on exit, on SIGUSR1 and through /profile; see microhack.profiling
+    profiling_enabled: bool = False
+    profiling_interval_ms: float = 10
+    profiling_output: str = "profile"
+    # Also sample threads waiting on queues, locks and sockets
+    profiling_include_idle: bool = False
 
     class Config:
         case_sensitive = False
@@ -0,0 +1,203 @@
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+import pandas as pd
+
+from microhack.metrics import Counter, Gauge, REGISTRY
+
+CACHE_REQUESTS = REGISTRY.register(
+    Counter("microhack_drive_cache_requests_total", "Drive cache lookups", ["kind", "result"])
+)
+CACHE_BYTES = REGISTRY.register(Gauge("microhack_drive_cache_bytes", "Size of the Drive cache on disk"))
+
+
+def _remove(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def _size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+
+class _PinnedFrames:
+    """Frames of a pinned cache entry; unpins it once exhausted, closed or collected."""
+
+    def __init__(self, frames: Iterator[pd.DataFrame], release: Callable[[], None]):
+        self._frames = frames
+        self._release: Optional[Callable[[], None]] = release
+
+    def __iter__(self) -> "_PinnedFrames":
+        return self
+
+    def __next__(self) -> pd.DataFrame:
+        try:
+            return next(self._frames)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+    def __del__(self):
+        self.close()
+
+
+class DriveCache:
+    """On-disk cache of Drive file contents and parsed frames, keyed by file id and revision.
+
+    A new revision gets a new key, so stale entries are never read; they just age
+    out. The least recently used entries are evicted once the cache grows past
+    `max_bytes`. Recency survives restarts through the entries' modification times.
+    Entries being read are pinned and only evicted once their readers are done.
+    Frames are stored as pickles, so only point `directory` at trusted storage.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Entry name -> size, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        # Entry name -> readers currently holding it
+        self._pins: Dict[str, int] = {}
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp"):
+                # Left over from an interrupted write
+                _remove(path)
+                continue
+            entries.append((os.path.getmtime(path), name, _size(path)))
+        for _, name, size in sorted(entries):
+            self._entries[name] = size
+        CACHE_BYTES.set(self.size)
+
+    @property
+    def size(self) -> int:
+        return sum(self._entries.values())
+
+    def _name(self, kind: str, file_id: str, revision: str, variant: str = "") -> str:
+        digest = hashlib.sha1(f"{revision}|{variant}".encode("utf-8")).hexdigest()[:16]
+        return f"{file_id}-{digest}.{kind}"
+
+    def _lookup(self, kind: str, name: str) -> Optional[str]:
+        """Path of entry `name`, pinned until `_release(name)`; None on a miss."""
+        with self._lock:
+            if name not in self._entries:
+                self.misses += 1
+                CACHE_REQUESTS.inc(kind=kind, result="miss")
+                return None
+            self._entries.move_to_end(name)
+            self._pins[name] = self._pins.get(name, 0) + 1
+            self.hits += 1
+            CACHE_REQUESTS.inc(kind=kind, result="hit")
+        path = os.path.join(self.directory, name)
+        os.utime(path)
+        return path
+
+    def _release(self, name: str) -> None:
+        with self._lock:
+            self._pins[name] -= 1
+            if not self._pins[name]:
+                del self._pins[name]
+                # Evictions skipped while the entry was pinned
+                self._evict()
+
+    def _commit(self, name: str, tmp_path: str) -> None:
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            if os.path.isdir(path):
+                # A concurrent reader of the same revision finished first
+                if name in self._pins:
+                    # Still being read: keep that copy, which holds the same frames
+                    shutil.rmtree(tmp_path)
+                    self._entries.move_to_end(name)
+                    return
+                shutil.rmtree(path)
+            os.replace(tmp_path, path)
+            self._entries[name] = _size(path)
+            self._entries.move_to_end(name)
+            self._evict()
+
+    def _evict(self) -> None:
+        size = self.size
+        # Least recently used first; the most recent entry always stays
+        for name in list(self._entries)[:-1]:
+            if size <= self.max_bytes:
+                break
+            if name in self._pins:
+                continue
+            size -= self._entries.pop(name)
+            _remove(os.path.join(self.directory, name))
+        CACHE_BYTES.set(self.size)
+
+    def get_content(self, file_id: str, revision: str) -> Optional[bytes]:
+        name = self._name("bin", file_id, revision)
+        path = self._lookup("content", name)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            self._release(name)
+
+    def put_content(self, file_id: str, revision: str, content: bytes) -> None:
+        name = self._name("bin", file_id, revision)
+        tmp_path = os.path.join(self.directory, f"{name}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        self._commit(name, tmp_path)
+
+    def _frames_name(self, file_id: str, revision: str, batch_size: int, projection: str) -> str:
+        variant = f"{batch_size}|{projection}" if projection else str(batch_size)
+        return self._name("frames", file_id, revision, variant)
+
+    def get_frames(
+        self, file_id: str, revision: str, batch_size: int, projection: str = ""
+    ) -> Optional[Iterator[pd.DataFrame]]:
+        """The cached batches of a parsed file, read lazily one at a time.
+
+        `projection` identifies how the file was parsed (columns, dtypes). The entry
+        stays pinned until the iterator is exhausted or closed, so iterate or close it.
+        """
+        name = self._frames_name(file_id, revision, batch_size, projection)
+        path = self._lookup("frames", name)
+        if path is None:
+            return None
+        frames = (pd.read_pickle(os.path.join(path, frame)) for frame in sorted(os.listdir(path)))
+        return _PinnedFrames(frames, lambda: self._release(name))
+
+    def put_frames(
+        self, file_id: str, revision: str, batch_size: int, frames: Iterable[pd.DataFrame], projection: str = ""
+    ) -> Iterator[pd.DataFrame]:
+        """Pass `frames` through while storing them; the entry appears only if all of them are read."""
+        name = self._frames_name(file_id, revision, batch_size, projection)
+        tmp_path = os.path.join(self.directory, f"{name}.{threading.get_ident()}.tmp")
+        os.makedirs(tmp_path, exist_ok=True)
+        try:
+            for index, frame in enumerate(frames):
+                frame.to_pickle(os.path.join(tmp_path, f"{index:08d}.pkl"))
+                yield frame
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        self._commit(name, tmp_path)
@@ -0,0 +1,42 @@
+import zlib
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def partition_for(key: str, partitions: int) -> int:
+    """Partition of a message key; stable across processes, unlike `hash()`."""
+    return zlib.crc32(key.encode("utf-8")) % partitions
+
+
+def assign_partitions(partitions: int, workers: int, worker_id: int) -> List[int]:
+    """Round-robin partition assignment, as a consumer group does with equal members."""
+    return list(range(worker_id, partitions, workers))
+
+
+class FakeBroker:
+    """In-memory stand-in for a partitioned Kafka topic, for benchmarks and tests.
+
+    Records are routed by their `key` field, so all events of a key land in one
+    partition and keep their order, like keyed Kafka messages.
+    """
+
+    def __init__(self, partitions: int = 8):
+        if partitions < 1:
+            raise ValueError("partitions must be at least 1")
+        self.partitions: List[List[Dict[str, Any]]] = [[] for _ in range(partitions)]
+
+    def produce(self, record: Dict[str, Any], key: Optional[str] = None) -> int:
+        key = str(record.get("key", "")) if key is None else key
+        partition = partition_for(key, len(self.partitions))
+        self.partitions[partition].append(record)
+        return partition
+
+    def produce_all(self, records: Iterable[Dict[str, Any]]) -> None:
+        for record in records:
+            self.produce(record)
+
+    def consume(self, partition: int, offset: int, max_records: int = 1000) -> List[Dict[str, Any]]:
+        return self.partitions[partition][offset : offset + max_records]
+
+    def size(self, partitions: Optional[Iterable[int]] = None) -> int:
+        indices = range(len(self.partitions)) if partitions is None else partitions
+        return sum(len(self.partitions[index]) for index in indices)
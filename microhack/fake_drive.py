@@ -0,0 +1,213 @@
+"""In-memory stand-in for the Google Drive v3 service, for offline tests and demos.
+
+Only the calls made by `microhack.google_drive` are implemented. Native Google files
+(e.g. Sheets) hold their export content and can only be exported. Media downloads go
+through a fake HTTP transport that honours `Range` headers, so the real
+`MediaIoBaseDownload` can be used against it.
+"""
+
+import hashlib
+import itertools
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+_NATIVE_PREFIX = "application/vnd.google-apps."
+
+
+class _Call:
+    def __init__(self, service: "FakeDriveService", name: str, fn: Callable[[], Any]):
+        self._service = service
+        self._name = name
+        self._fn = fn
+
+    def execute(self, num_retries: int = 0) -> Any:
+        self._service.calls[self._name] += 1
+        self._service._maybe_fail()
+        return self._fn()
+
+
+class _FakeHttp:
+    def __init__(self, service: "FakeDriveService", file_id: str, kind: str):
+        self._service = service
+        self._file_id = file_id
+        self._kind = kind
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        self._service.calls[self._kind] += 1
+        self._service._maybe_fail()
+        content = self._service.contents[self._file_id]
+        match = re.match(r"bytes=(\d+)-(\d+)", (headers or {}).get("range", ""))
+        if not match:
+            return httplib2.Response({"status": 200, "content-length": str(len(content))}), content
+        start, end = int(match.group(1)), int(match.group(2))
+        if start >= len(content):
+            return httplib2.Response({"status": 416, "content-range": f"bytes */{len(content)}"}), b""
+        chunk = content[start : end + 1]
+        self._service.bytes_served += len(chunk)
+        headers = {"status": 206, "content-range": f"bytes {start}-{start + len(chunk) - 1}/{len(content)}"}
+        return httplib2.Response(headers), chunk
+
+
+class FakeMediaRequest:
+    def __init__(self, service: "FakeDriveService", file_id: str, export_mime_type: Optional[str] = None):
+        if export_mime_type:
+            self.uri = f"fake://drive/files/{file_id}/export?mimeType={export_mime_type}"
+        else:
+            self.uri = f"fake://drive/files/{file_id}?alt=media"
+        self.headers: Dict[str, str] = {}
+        self.http = _FakeHttp(service, file_id, "export" if export_mime_type else "media")
+
+
+class _FakeFiles:
+    def __init__(self, service: "FakeDriveService"):
+        self._service = service
+
+    def get(self, fileId: str, fields: Optional[str] = None, **kwargs) -> _Call:
+        def fn():
+            if fileId not in self._service.metadata:
+                raise HttpError(httplib2.Response({"status": 404}), b"File not found")
+            return dict(self._service.metadata[fileId])
+
+        return _Call(self._service, "files.get", fn)
+
+    def get_media(self, fileId: str, **kwargs) -> FakeMediaRequest:
+        if self._service.metadata[fileId]["mimeType"].startswith(_NATIVE_PREFIX):
+            raise HttpError(httplib2.Response({"status": 403}), b"Only files with binary content can be downloaded")
+        return FakeMediaRequest(self._service, fileId)
+
+    def export_media(self, fileId: str, mimeType: str, **kwargs) -> FakeMediaRequest:
+        if not self._service.metadata[fileId]["mimeType"].startswith(_NATIVE_PREFIX):
+            raise HttpError(httplib2.Response({"status": 403}), b"Export only supports Docs Editors files")
+        return FakeMediaRequest(self._service, fileId, mimeType)
+
+    def list(self, q: Optional[str] = None, pageSize: int = 100, pageToken: Optional[str] = None, **kwargs) -> _Call:
+        def fn():
+            matches = [dict(meta) for meta in self._service.metadata.values() if _matches(meta, q)]
+            start = int(pageToken or 0)
+            result: Dict[str, Any] = {"files": matches[start : start + pageSize]}
+            if start + pageSize < len(matches):
+                result["nextPageToken"] = str(start + pageSize)
+            return result
+
+        return _Call(self._service, "files.list", fn)
+
+
+class _FakeChanges:
+    def __init__(self, service: "FakeDriveService"):
+        self._service = service
+
+    def getStartPageToken(self, **kwargs) -> _Call:
+        token = {"startPageToken": str(len(self._service.log))}
+        return _Call(self._service, "changes.getStartPageToken", lambda: token)
+
+    def list(self, pageToken: str, pageSize: int = 100, **kwargs) -> _Call:
+        def fn():
+            start = int(pageToken)
+            changes = self._service.log[start : start + pageSize]
+            if start + pageSize < len(self._service.log):
+                return {"changes": changes, "nextPageToken": str(start + pageSize)}
+            return {"changes": changes, "newStartPageToken": str(len(self._service.log))}
+
+        return _Call(self._service, "changes.list", fn)
+
+
+def _matches(meta: Dict[str, Any], query: Optional[str]) -> bool:
+    """Evaluate the subset of the Drive query language used by this project."""
+    if not query:
+        return True
+    for clause in query.split(" and "):
+        clause = clause.strip()
+        if m := re.fullmatch(r"name\s*=\s*'(.*)'", clause):
+            ok = meta["name"] == m.group(1)
+        elif m := re.fullmatch(r"name\s+contains\s+'(.*)'", clause):
+            ok = m.group(1) in meta["name"]
+        elif m := re.fullmatch(r"'(.*)'\s+in\s+parents", clause):
+            ok = m.group(1) in meta.get("parents", [])
+        elif m := re.fullmatch(r"modifiedTime\s*>\s*'(.*)'", clause):
+            ok = meta["modifiedTime"] > m.group(1)
+        elif m := re.fullmatch(r"mimeType\s*=\s*'(.*)'", clause):
+            ok = meta["mimeType"] == m.group(1)
+        elif re.fullmatch(r"trashed\s*=\s*false", clause):
+            ok = True
+        else:
+            raise ValueError(f"Unsupported query clause: {clause}")
+        if not ok:
+            return False
+    return True
+
+
+class FakeDriveService:
+    """Drop-in replacement for `build('drive', 'v3', ...)` backed by in-memory files."""
+
+    def __init__(self):
+        self.metadata: Dict[str, Dict[str, Any]] = {}
+        self.contents: Dict[str, bytes] = {}
+        self.log: List[Dict[str, Any]] = []
+        self.calls: Counter = Counter()
+        self.bytes_served = 0
+        self.failures: List[int] = []
+        self._ids = itertools.count(1)
+        self._clock = itertools.count(1)
+
+    def put_file(
+        self,
+        name: str,
+        content: bytes,
+        mime_type: str = "text/csv",
+        file_id: Optional[str] = None,
+        parents: Optional[List[str]] = None,
+    ) -> str:
+        """Create or overwrite a file, bumping its revision and recording a change."""
+        file_id = file_id or next((fid for fid, meta in self.metadata.items() if meta["name"] == name), None)
+        file_id = file_id or f"file-{next(self._ids)}"
+        previous = self.metadata.get(file_id, {})
+        self.contents[file_id] = content
+        metadata = {
+            "id": file_id,
+            "name": name,
+            "mimeType": mime_type,
+            "modifiedTime": (_EPOCH + timedelta(seconds=next(self._clock))).isoformat().replace("+00:00", "Z"),
+            "md5Checksum": hashlib.md5(content).hexdigest(),
+            "version": str(int(previous.get("version", 0)) + 1),
+            "size": str(len(content)),
+            "parents": parents or previous.get("parents", ["root"]),
+        }
+        if mime_type.startswith(_NATIVE_PREFIX):
+            # Native files have no binary content to checksum
+            del metadata["md5Checksum"]
+        self.metadata[file_id] = metadata
+        self.log.append({"fileId": file_id, "removed": False, "file": dict(self.metadata[file_id])})
+        return file_id
+
+    def touch(self, file_id: str) -> None:
+        """Bump `modifiedTime` without changing the content, like re-saving a file."""
+        self.metadata[file_id]["modifiedTime"] = (
+            (_EPOCH + timedelta(seconds=next(self._clock))).isoformat().replace("+00:00", "Z")
+        )
+        self.log.append({"fileId": file_id, "removed": False, "file": dict(self.metadata[file_id])})
+
+    def delete_file(self, file_id: str) -> None:
+        self.metadata.pop(file_id)
+        self.contents.pop(file_id)
+        self.log.append({"fileId": file_id, "removed": True})
+
+    def fail_next(self, count: int = 1, status: int = 503) -> None:
+        """Make the next `count` API calls raise `HttpError` with the given status."""
+        self.failures.extend([status] * count)
+
+    def _maybe_fail(self) -> None:
+        if self.failures:
+            status = self.failures.pop(0)
+            raise HttpError(httplib2.Response({"status": status}), b"Injected failure")
+
+    def files(self) -> _FakeFiles:
+        return _FakeFiles(self)
+
+    def changes(self) -> _FakeChanges:
+        return _FakeChanges(self)
@@ -1,33 +1,131 @@
 import os
 import json
+import threading
+from functools import lru_cache
+import httplib2
 import pandas as pd
-from typing import List, Dict, Any, Optional
+from typing import Iterable, Iterator, List, Dict, Any, Optional, Sequence, Set, Tuple
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from googleapiclient.http import MediaIoBaseDownload
+from microhack.drive_cache import DriveCache
 import io
+import random
 import time
 
 # If modifying these scopes, delete the file token.json.
-SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
+
+# Metadata needed to tell whether a file's content changed
+FILE_FIELDS = "id, name, mimeType, modifiedTime, md5Checksum, version"
+
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Largest page size files().list accepts
+LIST_PAGE_SIZE = 1000
+
+# Native Google Sheets cannot be downloaded as-is; they are exported as CSV (first sheet only)
+GOOGLE_SHEETS_MIME = "application/vnd.google-apps.spreadsheet"
+
+
+def is_tabular(mime_type: str) -> bool:
+    """Whether `iter_file_batches` can read files of this MIME type."""
+    return "csv" in mime_type or "spreadsheet" in mime_type or "excel" in mime_type
+
+
+def parse_dtypes(spec: str) -> Dict[str, str]:
+    """Parse `column:dtype` pairs, e.g. `value:float64,category:category`, into pandas dtype hints."""
+    dtypes = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        column, separator, dtype = item.partition(":")
+        if not separator or not column.strip() or not dtype.strip():
+            raise ValueError(f"Dtype hint '{item}' must look like column:dtype")
+        dtypes[column.strip()] = dtype.strip()
+    return dtypes
+
+
+@lru_cache()
+def _discovery_document() -> Optional[str]:
+    """Drive API description bundled with the client library, parsed once per process."""
+    return get_static_doc("drive", "v3")
+
+
+def build_service(credentials):
+    """Drive service over one persistent, authorized HTTP connection, without fetching discovery."""
+    http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=120))
+    document = _discovery_document()
+    if document is None:
+        return build("drive", "v3", http=http)
+    return build_from_document(document, http=http)
+
+
+class ChunkStream(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks, consumed lazily."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._chunk = memoryview(b"")
+        self._offset = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while self._offset == len(self._chunk):
+            try:
+                self._chunk = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+            self._offset = 0
+        size = min(len(buffer), len(self._chunk) - self._offset)
+        buffer[:size] = self._chunk[self._offset : self._offset + size]
+        self._offset += size
+        return size
+
 
 class GoogleDriveConnector:
-    def __init__(self, credentials_file: str = "config/credentials.json", token_file: str = "config/token.json"):
+    """Lists and reads Drive files.
+
+    `columns` restricts parsing to those columns (others are skipped by the parser,
+    missing ones ignored) and `dtypes` gives pandas dtype hints, so tables are not
+    parsed wider or with more inference than the pipeline needs.
+    """
+
+    def __init__(
+        self,
+        credentials_file: str = "config/credentials.json",
+        token_file: str = "config/token.json",
+        service=None,
+        cache: Optional[DriveCache] = None,
+        columns: Optional[Sequence[str]] = None,
+        dtypes: Optional[Dict[str, str]] = None,
+    ):
         self.credentials_file = credentials_file
         self.token_file = token_file
-        self.service = None
-        self._authenticate()
-    
+        self.service = service
+        self.cache = cache
+        self.columns = frozenset(columns) if columns else None
+        self.dtypes = dict(dtypes or {})
+        self._credentials = None
+        # httplib2 connections are not thread-safe: download threads get their own service
+        self._local = threading.local()
+        if self.service is None:
+            self._authenticate()
+
     def _authenticate(self):
         """Authenticate with Google Drive API."""
         creds = None
-        
+
         # The file token.json stores the user's access and refresh tokens.
         if os.path.exists(self.token_file):
             creds = Credentials.from_authorized_user_file(self.token_file, SCOPES)
-        
+
         # If there are no (valid) credentials available, let the user log in.
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
@@ -36,119 +134,389 @@ class GoogleDriveConnector:
                 if not os.path.exists(self.credentials_file):
                     raise FileNotFoundError(
                         f"Credentials file not found: {self.credentials_file}\n"
-                        "Please download credentials.json from Google Cloud Console and place it in the config/ directory."
+                        "Please download credentials.json from Google Cloud Console "
+                        "and place it in the config/ directory."
                     )
-                
+
                 flow = InstalledAppFlow.from_client_secrets_file(self.credentials_file, SCOPES)
                 creds = flow.run_local_server(port=0)
-            
+
             # Save the credentials for the next run
             os.makedirs(os.path.dirname(self.token_file), exist_ok=True)
-            with open(self.token_file, 'w') as token:
+            with open(self.token_file, "w") as token:
                 token.write(creds.to_json())
-        
-        self.service = build('drive', 'v3', credentials=creds)
-    
+
+        self._credentials = creds
+        self.service = build_service(creds)
+
+    def _thread_service(self):
+        """Service for the calling thread; each keeps its own HTTP connection alive between downloads."""
+        if self._credentials is None:
+            return self.service
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = self._local.service = build_service(self._credentials)
+        return service
+
+    def iter_files(self, query: str = None, page_size: int = LIST_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+        """Yield the metadata of every file matching `query`, following `nextPageToken`.
+
+        Errors are raised rather than logged.
+        """
+        page_token = None
+        while True:
+            results = (
+                self.service.files()
+                .list(pageSize=page_size, pageToken=page_token, fields=f"nextPageToken, files({FILE_FIELDS})", q=query)
+                .execute()
+            )
+            yield from results.get("files", [])
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                return
+
     def list_files(self, query: str = None) -> List[Dict[str, Any]]:
         """List files in Google Drive."""
         try:
-            results = self.service.files().list(
-                pageSize=100,
-                fields="nextPageToken, files(id, name, mimeType, modifiedTime)",
-                q=query
-            ).execute()
-            
-            return results.get('files', [])
+            return list(self.iter_files(query))
         except Exception as e:
             print(f"Error listing files: {e}")
             return []
-    
-    def download_file(self, file_id: str) -> Optional[bytes]:
-        """Download a file from Google Drive."""
+
+    def _read_options(self) -> Dict[str, Any]:
+        """Projection and dtype arguments shared by `pd.read_csv` and `pd.read_excel`."""
+        columns = self.columns
+        return {
+            "usecols": (lambda column: column in columns) if columns else None,
+            "dtype": self.dtypes or None,
+        }
+
+    def _projection(self) -> str:
+        """Identifies the projection in cache keys, so frames parsed differently are not mixed up."""
+        if self.columns is None and not self.dtypes:
+            return ""
+        return json.dumps([sorted(self.columns or []), sorted(self.dtypes.items())])
+
+    def iter_file_chunks(
+        self, file_id: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE, export_mime_type: Optional[str] = None
+    ) -> Iterator[bytes]:
+        """Download a file from Google Drive, yielding each chunk as soon as it arrives.
+
+        With `export_mime_type` a native Google file is converted server-side instead.
+        """
+        files = self._thread_service().files()
+        if export_mime_type:
+            request = files.export_media(fileId=file_id, mimeType=export_mime_type)
+        else:
+            request = files.get_media(fileId=file_id)
+        buffer = io.BytesIO()
+        downloader = MediaIoBaseDownload(buffer, request, chunksize=chunk_size)
+
+        done = False
+        while done is False:
+            _, done = downloader.next_chunk(num_retries=3)
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            if chunk:
+                yield chunk
+
+    def download_file(
+        self, file_id: str, revision: Optional[str] = None, export_mime_type: Optional[str] = None
+    ) -> Optional[bytes]:
+        """Download a file from Google Drive, from the cache if this revision was downloaded before.
+
+        `revision` is the file's `file_revision()` from its polled metadata.
+        """
         try:
-            request = self.service.files().get_media(fileId=file_id)
-            file = io.BytesIO()
-            downloader = MediaIoBaseDownload(file, request)
-            
-            done = False
-            while done is False:
-                status, done = downloader.next_chunk()
-                print(f"Download {int(status.progress() * 100)}%")
-            
-            return file.getvalue()
+            if self.cache is None or revision is None:
+                return b"".join(self.iter_file_chunks(file_id, export_mime_type=export_mime_type))
+            content = self.cache.get_content(file_id, revision)
+            if content is None:
+                content = b"".join(self.iter_file_chunks(file_id, export_mime_type=export_mime_type))
+                self.cache.put_content(file_id, revision, content)
+            return content
         except Exception as e:
             print(f"Error downloading file {file_id}: {e}")
             return None
-    
-    def read_csv_from_drive(self, file_id: str) -> Optional[pd.DataFrame]:
-        """Read a CSV file from Google Drive."""
-        file_content = self.download_file(file_id)
-        if file_content:
-            try:
-                return pd.read_csv(io.BytesIO(file_content))
-            except Exception as e:
-                print(f"Error reading CSV: {e}")
-                return None
-        return None
-    
-    def read_excel_from_drive(self, file_id: str) -> Optional[pd.DataFrame]:
-        """Read an Excel file from Google Drive."""
-        file_content = self.download_file(file_id)
+
+    def iter_csv_batches(
+        self, file_id: str, batch_size: int = 10000, chunk_size: int = DOWNLOAD_CHUNK_SIZE, export: bool = False
+    ) -> Iterator[pd.DataFrame]:
+        """Parse a CSV file while it downloads, yielding frames of at most `batch_size` rows.
+
+        Peak memory is bounded by `batch_size` and `chunk_size`, not by the file size.
+        With `export` the file is a Google Sheet exported as CSV.
+        """
+        chunks = self.iter_file_chunks(file_id, chunk_size, "text/csv" if export else None)
+        stream = io.BufferedReader(ChunkStream(chunks))
+        try:
+            yield from pd.read_csv(stream, chunksize=batch_size, **self._read_options())
+        except pd.errors.EmptyDataError:
+            return
+
+    def read_csv_from_drive(
+        self, file_id: str, export: bool = False, revision: Optional[str] = None
+    ) -> Optional[pd.DataFrame]:
+        """Read a CSV file, or with `export` a Google Sheet exported as CSV, from Google Drive.
+
+        With a cache and the file's `revision`, an unchanged file is read from disk instead of downloaded.
+        """
+        export_mime_type = "text/csv" if export else None
+        try:
+            if self.cache is not None and revision is not None:
+                content = self.download_file(file_id, revision, export_mime_type)
+                if content is None:
+                    return None
+                return pd.read_csv(io.BytesIO(content), **self._read_options())
+            chunks = self.iter_file_chunks(file_id, export_mime_type=export_mime_type)
+            return pd.read_csv(io.BufferedReader(ChunkStream(chunks)), **self._read_options())
+        except Exception as e:
+            print(f"Error reading CSV: {e}")
+            return None
+
+    def read_excel_from_drive(self, file_id: str, revision: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """Read an Excel file from Google Drive, from the cache if this `revision` was downloaded before."""
+        file_content = self.download_file(file_id, revision)
         if file_content:
             try:
-                return pd.read_excel(io.BytesIO(file_content))
+                return pd.read_excel(io.BytesIO(file_content), **self._read_options())
             except Exception as e:
                 print(f"Error reading Excel: {e}")
                 return None
         return None
-    
+
+    def read_file(self, file_info: Dict[str, Any]) -> Optional[pd.DataFrame]:
+        """Read a CSV or spreadsheet file, dispatching on its MIME type."""
+        mime_type = file_info["mimeType"]
+        revision = file_revision(file_info)
+        if "csv" in mime_type:
+            return self.read_csv_from_drive(file_info["id"], revision=revision)
+        elif mime_type == GOOGLE_SHEETS_MIME:
+            return self.read_csv_from_drive(file_info["id"], export=True, revision=revision)
+        elif "spreadsheet" in mime_type or "excel" in mime_type:
+            return self.read_excel_from_drive(file_info["id"], revision)
+        raise ValueError(f"Unsupported file type: {mime_type}")
+
+    def iter_file_batches(
+        self, file_info: Dict[str, Any], batch_size: int = 10000, chunk_size: int = DOWNLOAD_CHUNK_SIZE
+    ) -> Iterator[pd.DataFrame]:
+        """Stream a file as frames of at most `batch_size` rows.
+
+        CSV files and Google Sheets (exported as CSV) are parsed incrementally; Excel
+        files have to be loaded whole and are sliced afterwards. Errors are raised rather than logged. With a cache, a
+        revision parsed before is read back from disk instead of downloaded.
+        """
+        if self.cache is None:
+            yield from self._download_batches(file_info, batch_size, chunk_size)
+            return
+        revision = file_revision(file_info)
+        cached = self.cache.get_frames(file_info["id"], revision, batch_size, self._projection())
+        if cached is not None:
+            yield from cached
+            return
+        yield from self.cache.put_frames(
+            file_info["id"],
+            revision,
+            batch_size,
+            self._download_batches(file_info, batch_size, chunk_size),
+            self._projection(),
+        )
+
+    def _download_batches(self, file_info: Dict[str, Any], batch_size: int, chunk_size: int) -> Iterator[pd.DataFrame]:
+        mime_type = file_info["mimeType"]
+        if not is_tabular(mime_type):
+            raise ValueError(f"Unsupported file type: {mime_type}")
+        if "csv" in mime_type or mime_type == GOOGLE_SHEETS_MIME:
+            yield from self.iter_csv_batches(
+                file_info["id"], batch_size, chunk_size, export=mime_type == GOOGLE_SHEETS_MIME
+            )
+        else:
+            content = b"".join(self.iter_file_chunks(file_info["id"], chunk_size))
+            df = pd.read_excel(io.BytesIO(content), **self._read_options())
+            for start in range(0, len(df), batch_size):
+                yield df.iloc[start : start + batch_size]
+
     def get_file_by_name(self, filename: str) -> Optional[Dict[str, Any]]:
         """Get file metadata by filename."""
         files = self.list_files(f"name='{filename}'")
         return files[0] if files else None
-    
+
     def get_recent_files(self, days: int = 7) -> List[Dict[str, Any]]:
         """Get files modified in the last N days."""
         from datetime import datetime, timedelta
-        cutoff_date = (datetime.now() - timedelta(days=days)).isoformat() + 'Z'
-        return self.list_files(f"modifiedTime > '{cutdown_date}'")
+
+        cutoff_date = (datetime.now() - timedelta(days=days)).isoformat() + "Z"
+        return self.list_files(f"modifiedTime > '{cutoff_date}'")
+
+
+def file_revision(file_info: Dict[str, Any]) -> str:
+    """Fingerprint of a file's content.
+
+    Binary files carry an `md5Checksum`; native Google files only have `version`
+    and `modifiedTime`.
+    """
+    return file_info.get("md5Checksum") or f"{file_info.get('version')}@{file_info.get('modifiedTime')}"
+
+
+class Backoff:
+    """Polling delay that grows exponentially, with jitter, while requests keep failing."""
+
+    def __init__(self, interval: float, max_delay: float = 900):
+        self.interval = interval
+        self.max_delay = max(max_delay, interval)
+        self.failures = 0
+
+    def success(self) -> float:
+        self.failures = 0
+        return self.interval
+
+    def failure(self) -> float:
+        self.failures += 1
+        delay = min(self.max_delay, self.interval * 2**self.failures)
+        return random.uniform(self.interval, delay)
+
+
+class DriveFilePoller:
+    """Detects content changes of one Drive file without downloading it.
+
+    By default every poll is a metadata-only `files().get`. With `use_changes_feed`
+    the poller instead lists the Drive changes feed, which is a single cheap request
+    that comes back empty while nothing changed.
+    """
+
+    def __init__(self, service, file_id: str, use_changes_feed: bool = False):
+        self.service = service
+        self.file_id = file_id
+        self.use_changes_feed = use_changes_feed
+        self.revision: Optional[str] = None
+        self.page_token: Optional[str] = None
+        # Change seen on the feed but not yet acknowledged, e.g. because the download failed
+        self.pending: Optional[Dict[str, Any]] = None
+
+    def poll(self) -> Optional[Dict[str, Any]]:
+        """Return the file metadata if its content changed since the last `acknowledge`."""
+        if self.use_changes_feed and self.revision is not None:
+            file_info = self._poll_changes()
+        else:
+            if self.use_changes_feed and self.page_token is None:
+                # Start watching before the initial read so no change slips through
+                self.page_token = self.service.changes().getStartPageToken().execute()["startPageToken"]
+            file_info = self.service.files().get(fileId=self.file_id, fields=FILE_FIELDS).execute()
+
+        if file_info is None or file_revision(file_info) == self.revision:
+            return None
+        return file_info
+
+    def acknowledge(self, file_info: Dict[str, Any]) -> None:
+        """Record that the content described by `file_info` has been ingested."""
+        self.revision = file_revision(file_info)
+        self.pending = None
+
+    def state(self) -> Dict[str, Any]:
+        return {"revision": self.revision, "page_token": self.page_token}
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        self.revision = state["revision"]
+        self.page_token = state["page_token"]
+
+    def _poll_changes(self) -> Optional[Dict[str, Any]]:
+        latest = self.pending
+        page_token = self.page_token
+        while page_token is not None:
+            response = (
+                self.service.changes()
+                .list(
+                    pageToken=page_token,
+                    spaces="drive",
+                    fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}))",
+                )
+                .execute()
+            )
+            for change in response.get("changes", []):
+                if change.get("fileId") == self.file_id and not change.get("removed"):
+                    latest = change["file"]
+            if "newStartPageToken" in response:
+                self.page_token = response["newStartPageToken"]
+            page_token = response.get("nextPageToken")
+        self.pending = latest
+        return latest
+
+
+def folder_query(folder_id: Optional[str] = None, query: Optional[str] = None) -> str:
+    """Drive query for the files to watch: the children of `folder_id`, narrowed by `query`."""
+    clauses = ["trashed = false"]
+    if folder_id:
+        clauses.insert(0, f"'{folder_id}' in parents")
+    if query:
+        clauses.append(query)
+    return " and ".join(clauses)
+
+
+class DriveFolderPoller:
+    """Detects which of the files matching a query changed, with one paginated listing per poll.
+
+    The listing carries each file's revision, so unchanged files cost nothing beyond it.
+    """
+
+    def __init__(self, drive: GoogleDriveConnector, query: str):
+        self.drive = drive
+        self.query = query
+        # Acknowledged revision per file id
+        self.revisions: Dict[str, str] = {}
+
+    def poll(self) -> Tuple[List[Dict[str, Any]], Set[str]]:
+        """Return the metadata of changed or new files, and the ids of all files currently matching."""
+        files = [info for info in self.drive.iter_files(self.query) if is_tabular(info["mimeType"])]
+        changed = [info for info in files if file_revision(info) != self.revisions.get(info["id"])]
+        return changed, {info["id"] for info in files}
+
+    def acknowledge(self, file_info: Dict[str, Any]) -> None:
+        self.revisions[file_info["id"]] = file_revision(file_info)
+
+    def forget(self, file_id: str) -> None:
+        self.revisions.pop(file_id, None)
+
+    def state(self) -> Dict[str, Any]:
+        return {"revisions": self.revisions}
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        self.revisions = dict(state["revisions"])
+
 
 class GoogleDriveStream:
     """Stream data from Google Drive files."""
-    
-    def __init__(self, drive_connector: GoogleDriveConnector, file_id: str = None, filename: str = None, 
-                 refresh_interval: int = 60):
+
+    def __init__(
+        self,
+        drive_connector: GoogleDriveConnector,
+        file_id: str = None,
+        filename: str = None,
+        refresh_interval: int = 60,
+    ):
         self.drive = drive_connector
         self.file_id = file_id
         self.filename = filename
         self.refresh_interval = refresh_interval
-        self.last_modified = None
-        
+
         if not file_id and filename:
             file_info = self.drive.get_file_by_name(filename)
             if file_info:
-                self.file_id = file_info['id']
-                self.last_modified = file_info['modifiedTime']
+                self.file_id = file_info["id"]
             else:
                 raise ValueError(f"File '{filename}' not found in Google Drive")
-    
+        self.poller = DriveFilePoller(self.drive.service, self.file_id) if self.file_id else None
+
     def get_data(self) -> Optional[pd.DataFrame]:
-        """Get current data from the file."""
-        if not self.file_id:
+        """Get current data from the file, or None if it has not changed."""
+        if not self.poller:
             return None
-        
-        # Check if file has been modified
-        file_info = self.drive.service.files().get(fileId=self.file_id).execute()
-        current_modified = file_info['modifiedTime']
-        
-        if self.last_modified != current_modified:
-            self.last_modified = current_modified
-            
-            # Determine file type and read accordingly
-            mime_type = file_info['mimeType']
-            if 'csv' in mime_type:
-                return self.drive.read_csv_from_drive(self.file_id)
-            elif 'spreadsheet' in mime_type or 'excel' in mime_type:
-                return self.drive.read_excel_from_drive(self.file_id)
-        
-        return None 
\ No newline at end of file
+
+        file_info = self.poller.poll()
+        if file_info is None:
+            return None
+
+        df = self.drive.read_file(file_info)
+        if df is not None:
+            self.poller.acknowledge(file_info)
+        return df
@@ -1,123 +1,498 @@
+import logging
+import queue
 import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from typing import Dict, Any, Optional
+from itertools import repeat
+from typing import Dict, Any, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple, Type
 import pathway as pw
-from microhack.google_drive import GoogleDriveConnector, GoogleDriveStream
+from microhack.batching import CommitController
+from microhack.checkpoint import load_checkpoint, remove_checkpoint, save_checkpoint, shard_path
+from microhack.drive_cache import DriveCache
+from microhack.google_drive import (
+    DOWNLOAD_CHUNK_SIZE,
+    Backoff,
+    DriveFilePoller,
+    DriveFolderPoller,
+    GoogleDriveConnector,
+    folder_query,
+)
+from microhack.metrics import INGESTED_AT
+from microhack.pacing import RateLimiter
+from microhack.row_diff import RowDiffer
+from microhack.timestamps import to_epoch
+
+logger = logging.getLogger(__name__)
+
+
+class DriveEvent(NamedTuple):
+    """One emitted row, kept compactly until it has to be deleted.
+
+    `extra` holds the values of the connector's `extra_columns`, as strings.
+    """
+
+    row_key: str
+    value: float
+    row_index: int
+    file_id: str
+    timestamp: float
+    ingested_at: float
+    extra: Tuple[Optional[str], ...] = ()
+
+
+def _string_values(rows: pd.DataFrame, column: str) -> Iterable[Optional[str]]:
+    if column not in rows.columns:
+        return repeat(None, len(rows))
+    return [None if pd.isna(value) else str(value) for value in rows[column].tolist()]
+
+
+class GoogleDriveSchema(pw.Schema):
+    row_key: str = pw.column_definition(primary_key=True)
+    value: float
+    row_index: int
+    file_id: str
+    timestamp: float
+    ingested_at: float
+
+
+def drive_schema(extra_columns: Sequence[str] = ()) -> Type[pw.Schema]:
+    """Schema of the rows the Drive connectors emit, with `extra_columns` as optional strings."""
+    extra = {
+        column: pw.column_definition(dtype=Optional[str], default_value=None)
+        for column in extra_columns
+        if column not in GoogleDriveSchema.column_names()
+    }
+    return GoogleDriveSchema | pw.schema_builder(extra) if extra else GoogleDriveSchema
+
 
 class GoogleDrivePathwayConnector(pw.io.python.ConnectorSubject):
-    """Pathway connector for Google Drive data streaming."""
-    
-    def __init__(self, 
-                 credentials_file: str = "config/credentials.json",
-                 file_id: str = None,
-                 filename: str = None,
-                 refresh_interval: int = 60,
-                 value_column: str = "value"):
-        super().__init__()
-        self.drive_connector = GoogleDriveConnector(credentials_file)
+    """Pathway connector for Google Drive data streaming.
+
+    Runs an upsert session keyed by `row_key`: an edited row is sent again and
+    replaces its previous version, and a removed row is deleted.
+    """
+
+    def __init__(
+        self,
+        credentials_file: str = "config/credentials.json",
+        file_id: str = None,
+        filename: str = None,
+        refresh_interval: int = 60,
+        value_column: str = "value",
+        timestamp_column: str = "timestamp",
+        key_column: Optional[str] = None,
+        use_changes_feed: bool = False,
+        max_backoff: int = 900,
+        batch_size: int = 10000,
+        chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+        commit_size: int = 1000,
+        max_rows_per_second: Optional[float] = None,
+        checkpoint_path: Optional[str] = None,
+        cache: Optional[DriveCache] = None,
+        commits: Optional[CommitController] = None,
+        columns: Optional[Sequence[str]] = None,
+        dtypes: Optional[Dict[str, str]] = None,
+        extra_columns: Sequence[str] = (),
+        drive_connector: Optional[GoogleDriveConnector] = None,
+    ):
+        super().__init__(session_type="upsert")
+        self.drive_connector = drive_connector or GoogleDriveConnector(
+            credentials_file, cache=cache, columns=columns, dtypes=dtypes
+        )
         self.file_id = file_id
         self.filename = filename
         self.refresh_interval = refresh_interval
+        self.use_changes_feed = use_changes_feed
+        self.backoff = Backoff(refresh_interval, max_backoff)
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.commit_size = commit_size
+        self.commits = commits or CommitController("google_drive", commit_size)
+        self.rate_limiter = RateLimiter(max_rows_per_second)
         self.value_column = value_column
-        self.last_data = None
-        
+        self.timestamp_column = timestamp_column
+        self.key_column = key_column
+        self.differ = RowDiffer(key_column)
+        # Columns passed through to the pipeline as strings, e.g. for grouping
+        self.extra_columns = list(extra_columns)
+        # Last event emitted per row key, needed to delete it and to checkpoint it
+        self.emitted: Dict[str, DriveEvent] = {}
+        # Files whose rows changed since the last checkpoint
+        self.changed_files: Set[str] = set()
+        self.checkpoint_path = checkpoint_path
+
         # Initialize the stream
         if not file_id and filename:
             file_info = self.drive_connector.get_file_by_name(filename)
             if file_info:
-                self.file_id = file_info['id']
+                self.file_id = file_info["id"]
             else:
                 raise ValueError(f"File '{filename}' not found in Google Drive")
-    
+
+    def resolve_value_column(self, df: pd.DataFrame) -> Optional[str]:
+        """Column providing the pipeline's 'value' field.
+
+        Falls back to the first numeric column, or None to use a constant 1.
+        """
+        if self.value_column in df.columns:
+            return self.value_column
+        numeric_cols = df.select_dtypes(include=["number"]).columns
+        return numeric_cols[0] if len(numeric_cols) > 0 else None
+
+    def emit_changes(self, df: pd.DataFrame, changes, file_id: str) -> None:
+        """Send inserts and updates as additions, replacing earlier events with the same `row_key`.
+
+        Events are tagged with `file_id`, which also prefixes their `row_key`. Their
+        `timestamp` is read from `timestamp_column` (epoch seconds or ISO 8601), falling
+        back to the ingest time for rows without one. They carry only the schema's
+        columns plus `extra_columns`, are built column-wise and are committed as decided
+        by the `commits` controller (every `commit_size` rows unless it is adaptive).
+        The rest is committed by `commit_file` together with the file's deleted rows.
+        """
+        positions = changes.updated + changes.inserted
+        if not positions:
+            return
+        self.changed_files.add(file_id)
+
+        rows = df.iloc[positions]
+        value_column = self.resolve_value_column(df)
+        values = rows[value_column].astype(float) if value_column else pd.Series(1.0, index=rows.index)
+        keys = [f"{file_id}:{changes.keys[position]}" for position in positions]
+        ingested_at = time.time()
+        timestamps = [
+            ingested_at if timestamp is None else timestamp
+            for timestamp in map(to_epoch, _string_values(rows, self.timestamp_column))
+        ]
+
+        if self.extra_columns:
+            extras = zip(*[_string_values(rows, column) for column in self.extra_columns])
+        else:
+            extras = repeat(())
+
+        for key, row_index, value, timestamp, extra in zip(
+            keys, rows.index.tolist(), values.tolist(), timestamps, extras
+        ):
+            event = DriveEvent(key, value, row_index, file_id, timestamp, ingested_at, extra)
+            self.emitted[key] = event
+            self.next_json(self.event_json(event))
+            self._commit_rows(self.commits.add())
+
+    def _commit_rows(self, count: int) -> None:
+        if count:
+            self.commit()
+            self.rate_limiter.acquire(count)
+
+    def commit_file(self) -> None:
+        """Commit the rest of a file's changes, so that its edits and deletions become visible at once."""
+        count = self.commits.flush()
+        self.commit()
+        self.rate_limiter.acquire(count)
+
+    def event_json(self, event: DriveEvent) -> Dict[str, Any]:
+        data = event._asdict()
+        data.update(zip(self.extra_columns, data.pop("extra")))
+        return data
+
+    def event_from_json(self, data: Dict[str, Any]) -> DriveEvent:
+        return DriveEvent(
+            data["row_key"],
+            data["value"],
+            data["row_index"],
+            data["file_id"],
+            data["timestamp"],
+            data.get(INGESTED_AT, data["timestamp"]),
+            tuple(None if data.get(column) is None else str(data[column]) for column in self.extra_columns),
+        )
+
+    def _delete(self, key: str) -> None:
+        event = self.emitted.pop(key, None)
+        if event is not None:
+            self.changed_files.add(event.file_id)
+            self.delete(**self.event_json(event))
+
+    def poll_once(self, poller: DriveFilePoller) -> None:
+        """Download and diff the file if its metadata says the content changed.
+
+        Batches are diffed and emitted while the file is still downloading.
+        """
+        file_info = poller.poll()
+        if file_info is None:
+            return
+
+        inserted = updated = 0
+        self.differ.begin()
+        for batch in self.drive_connector.iter_file_batches(file_info, self.batch_size, self.chunk_size):
+            changes = self.differ.diff_batch(batch)
+            self.emit_changes(batch, changes, self.file_id)
+            inserted += len(changes.inserted)
+            updated += len(changes.updated)
+        deleted = self.differ.finish()
+        for key in deleted:
+            self._delete(f"{self.file_id}:{key}")
+        self.commit_file()
+
+        if inserted or updated or deleted:
+            logger.info(
+                "Streamed %d inserts, %d updates and %d deletes from Google Drive", inserted, updated, len(deleted)
+            )
+        poller.acknowledge(file_info)
+        self.save_checkpoint(poller)
+
+    def save_checkpoint(self, poller: DriveFilePoller) -> None:
+        """Persist the ingested revision, row hashes and emitted rows, after a completed poll."""
+        if self.checkpoint_path:
+            self.save_changed_files()
+            save_checkpoint(
+                self.checkpoint_path,
+                {
+                    "file_id": self.file_id,
+                    "poller": poller.state(),
+                    "files": [self.file_id],
+                },
+            )
+
+    def restore_checkpoint(self, poller: DriveFilePoller) -> bool:
+        """Resume from the last checkpoint, re-emitting the rows it describes.
+
+        The engine starts empty, so this rebuilds its state from one revision of the
+        file instead of downloading it again. Returns whether a checkpoint was used.
+        """
+        state = load_checkpoint(self.checkpoint_path) if self.checkpoint_path else None
+        # Checkpoints without "files" predate per-file checkpoints and are ignored
+        if state is None or state.get("file_id") != self.file_id or "files" not in state:
+            return False
+        poller.restore(state["poller"])
+        hashes, emitted = self.load_file(self.file_id)
+        self.differ.hashes = hashes
+        self.replay(emitted)
+        return True
+
+    def differ_for(self, file_id: str) -> Optional[RowDiffer]:
+        return self.differ if file_id == self.file_id else None
+
+    def save_changed_files(self) -> None:
+        """Checkpoint the row hashes and emitted rows of the files changed since the last checkpoint.
+
+        Each file has its own checkpoint, so a poll rewrites only the files it changed.
+        """
+        changed, self.changed_files = self.changed_files, set()
+        emitted: Dict[str, Dict[str, Dict[str, Any]]] = {file_id: {} for file_id in changed}
+        for key, event in self.emitted.items():
+            if event.file_id in emitted:
+                emitted[event.file_id][key] = self.event_json(event)
+        for file_id, rows in emitted.items():
+            path = shard_path(self.checkpoint_path, file_id)
+            differ = self.differ_for(file_id)
+            if differ is None:
+                remove_checkpoint(path)
+            else:
+                save_checkpoint(path, {"hashes": differ.hashes, "emitted": rows})
+
+    def load_file(self, file_id: str) -> Tuple[Dict[str, int], Dict[str, Dict[str, Any]]]:
+        """Row hashes and emitted rows checkpointed for a file; none if it had no rows."""
+        state = load_checkpoint(shard_path(self.checkpoint_path, file_id)) or {"hashes": {}, "emitted": {}}
+        return state["hashes"], state["emitted"]
+
+    def replay(self, emitted: Dict[str, Dict[str, Any]]) -> None:
+        self.emitted = {key: self.event_from_json(data) for key, data in emitted.items()}
+        for count, event in enumerate(self.emitted.values(), start=1):
+            self.next_json(self.event_json(event))
+            if count % self.commit_size == 0:
+                self.commit()
+        self.commit()
+        logger.info("Restored %d rows from %s", len(self.emitted), self.checkpoint_path)
+
+    def describe(self) -> str:
+        return f"file: {self.filename or self.file_id}"
+
+    def make_poller(self):
+        return DriveFilePoller(self.drive_connector.service, self.file_id, self.use_changes_feed)
+
     def run(self):
         """Main loop that streams data from Google Drive."""
-        print(f"Starting Google Drive stream for file: {self.filename or self.file_id}")
-        
+        logger.info("Starting Google Drive stream for %s", self.describe())
+        poller = self.make_poller()
+        self.restore_checkpoint(poller)
+
         while True:
             try:
-                # Get current data from Google Drive
-                if self.file_id:
-                    file_info = self.drive_connector.service.files().get(fileId=self.file_id).execute()
-                    mime_type = file_info['mimeType']
-                    
-                    # Read data based on file type
-                    if 'csv' in mime_type:
-                        df = self.drive_connector.read_csv_from_drive(self.file_id)
-                    elif 'spreadsheet' in mime_type or 'excel' in mime_type:
-                        df = self.drive_connector.read_excel_from_drive(self.file_id)
-                    else:
-                        print(f"Unsupported file type: {mime_type}")
-                        time.sleep(self.refresh_interval)
-                        continue
-                    
-                    if df is not None and not df.empty:
-                        # Check if data has changed
-                        if self.last_data is None or not df.equals(self.last_data):
-                            self.last_data = df.copy()
-                            
-                            # Stream each row as a separate event
-                            for index, row in df.iterrows():
-                                # Convert row to dictionary
-                                row_dict = row.to_dict()
-                                
-                                # Ensure we have a 'value' field for the pipeline
-                                if self.value_column in row_dict:
-                                    value = row_dict[self.value_column]
-                                else:
-                                    # If no value column, use the first numeric column or default to 1
-                                    numeric_cols = df.select_dtypes(include=['number']).columns
-                                    if len(numeric_cols) > 0:
-                                        value = row_dict[numeric_cols[0]]
-                                    else:
-                                        value = 1
-                                
-                                # Create event data
-                                event_data = {
-                                    "value": float(value),
-                                    "row_index": int(index),
-                                    "timestamp": time.time(),
-                                    **row_dict  # Include all original columns
-                                }
-                                
-                                # Send to Pathway
-                                self.next_json(event_data)
-                                
-                                # Small delay between rows to avoid overwhelming the pipeline
-                                time.sleep(0.1)
-                            
-                            print(f"Streamed {len(df)} rows from Google Drive")
-                
-                # Wait before next check
-                time.sleep(self.refresh_interval)
-                
+                self.poll_once(poller)
+                delay = self.backoff.success()
             except Exception as e:
-                print(f"Error in Google Drive stream: {e}")
-                time.sleep(self.refresh_interval)
-
-def google_drive_input(file_id: str = None, 
-                      filename: str = None,
-                      credentials_file: str = "config/credentials.json",
-                      refresh_interval: int = 60,
-                      value_column: str = "value"):
-    """Create a Pathway input from Google Drive."""
-    
-    class GoogleDriveSchema(pw.Schema):
-        value: float
-        row_index: int
-        timestamp: float
-        # Additional fields will be added dynamically
-    
-    connector = GoogleDrivePathwayConnector(
+                delay = self.backoff.failure()
+                logger.warning("Error in Google Drive stream: %s; retrying in %.1fs", e, delay)
+
+            # Wait before next check
+            time.sleep(delay)
+
+
+class GoogleDriveFolderConnector(GoogleDrivePathwayConnector):
+    """Watches every tabular file matching a Drive query (e.g. all files in a folder).
+
+    Each poll is one paginated listing; new and changed files are downloaded and
+    diffed concurrently by `max_concurrent_downloads` threads, and their batches are
+    emitted into the same table as they arrive, tagged with their file id. Rows of
+    files that disappear from the listing are deleted.
+    """
+
+    def __init__(self, query: str, max_concurrent_downloads: int = 8, **kwargs):
+        super().__init__(**kwargs)
+        self.query = query
+        self.max_concurrent_downloads = max_concurrent_downloads
+        self.differs: Dict[str, RowDiffer] = {}
+
+    def describe(self) -> str:
+        return f"files matching: {self.query}"
+
+    def make_poller(self):
+        return DriveFolderPoller(self.drive_connector, self.query)
+
+    def poll_once(self, poller: DriveFolderPoller) -> None:
+        changed, present = poller.poll()
+        for file_id in [file_id for file_id in self.differs if file_id not in present]:
+            self.remove_file(file_id)
+            poller.forget(file_id)
+        if not changed:
+            return
+
+        for file_info in changed:
+            self.differs.setdefault(file_info["id"], RowDiffer(self.key_column))
+        # Bounded so that downloads pause while the engine catches up
+        results: queue.Queue = queue.Queue(maxsize=2 * self.max_concurrent_downloads)
+        errors: List[Exception] = []
+        with ThreadPoolExecutor(self.max_concurrent_downloads, thread_name_prefix="drive-download") as pool:
+            for file_info in changed:
+                pool.submit(self._diff_file, file_info, results)
+            remaining = len(changed)
+            while remaining:
+                kind, file_info, payload, changes = results.get()
+                if kind == "batch":
+                    self.emit_changes(payload, changes, file_info["id"])
+                    continue
+                remaining -= 1
+                if kind == "error":
+                    errors.append(payload)
+                    logger.warning("Error reading %s from Google Drive: %s", file_info["name"], payload)
+                    continue
+                for key in payload:
+                    self._delete(f"{file_info['id']}:{key}")
+                self.commit_file()
+                poller.acknowledge(file_info)
+
+        logger.info("Ingested %d of %d changed files from Google Drive", len(changed) - len(errors), len(changed))
+        self.save_checkpoint(poller)
+        if errors:
+            # Unacknowledged files are retried on the next poll
+            raise errors[0]
+
+    def _diff_file(self, file_info: Dict[str, Any], results: queue.Queue) -> None:
+        """Download thread: stream one file's batches, diffed against its previous revision."""
+        differ = self.differs[file_info["id"]]
+        try:
+            differ.begin()
+            for batch in self.drive_connector.iter_file_batches(file_info, self.batch_size, self.chunk_size):
+                results.put(("batch", file_info, batch, differ.diff_batch(batch)))
+            results.put(("done", file_info, differ.finish(), None))
+        except Exception as e:
+            results.put(("error", file_info, e, None))
+
+    def remove_file(self, file_id: str) -> None:
+        differ = self.differs.pop(file_id)
+        for key in differ.hashes:
+            self._delete(f"{file_id}:{key}")
+        self.commit()
+
+    def differ_for(self, file_id: str) -> Optional[RowDiffer]:
+        return self.differs.get(file_id)
+
+    def save_checkpoint(self, poller: DriveFolderPoller) -> None:
+        if self.checkpoint_path:
+            self.save_changed_files()
+            save_checkpoint(
+                self.checkpoint_path,
+                {
+                    "query": self.query,
+                    "poller": poller.state(),
+                    "files": list(self.differs),
+                },
+            )
+
+    def restore_checkpoint(self, poller: DriveFolderPoller) -> bool:
+        state = load_checkpoint(self.checkpoint_path) if self.checkpoint_path else None
+        if state is None or state.get("query") != self.query or "files" not in state:
+            return False
+        poller.restore(state["poller"])
+        emitted = {}
+        for file_id in state["files"]:
+            hashes, rows = self.load_file(file_id)
+            self.differs[file_id] = RowDiffer(self.key_column)
+            self.differs[file_id].hashes = hashes
+            emitted.update(rows)
+        self.replay(emitted)
+        return True
+
+
+def google_drive_input(
+    file_id: str = None,
+    filename: str = None,
+    credentials_file: str = "config/credentials.json",
+    refresh_interval: int = 60,
+    value_column: str = "value",
+    timestamp_column: str = "timestamp",
+    key_column: Optional[str] = None,
+    use_changes_feed: bool = False,
+    max_backoff: int = 900,
+    batch_size: int = 10000,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    commit_size: int = 1000,
+    max_rows_per_second: Optional[float] = None,
+    checkpoint_path: Optional[str] = None,
+    folder_id: Optional[str] = None,
+    query: Optional[str] = None,
+    max_concurrent_downloads: int = 8,
+    cache_dir: Optional[str] = None,
+    cache_max_bytes: int = 1024 * 1024 * 1024,
+    commits: Optional[CommitController] = None,
+    autocommit_duration_ms: Optional[int] = 1000,
+    columns: Optional[Sequence[str]] = None,
+    dtypes: Optional[Dict[str, str]] = None,
+    extra_columns: Sequence[str] = (),
+):
+    """Create a Pathway input from Google Drive.
+
+    Reads a single file (`file_id` or `filename`), or, when `folder_id` or `query`
+    is given, every matching file. `extra_columns` are passed through as optional
+    strings. With `columns`, only those, the value, timestamp, key and extra columns are parsed.
+    """
+    if columns:
+        needed = [value_column, timestamp_column, key_column, *extra_columns]
+        columns = list(dict.fromkeys([*columns, *[column for column in needed if column]]))
+
+    schema = drive_schema(extra_columns)
+    extra = [column for column in schema.column_names() if column not in GoogleDriveSchema.column_names()]
+
+    options = dict(
         credentials_file=credentials_file,
-        file_id=file_id,
-        filename=filename,
         refresh_interval=refresh_interval,
-        value_column=value_column
+        value_column=value_column,
+        timestamp_column=timestamp_column,
+        key_column=key_column,
+        use_changes_feed=use_changes_feed,
+        max_backoff=max_backoff,
+        batch_size=batch_size,
+        chunk_size=chunk_size,
+        commit_size=commit_size,
+        max_rows_per_second=max_rows_per_second,
+        checkpoint_path=checkpoint_path,
+        cache=DriveCache(cache_dir, cache_max_bytes) if cache_dir else None,
+        commits=commits,
+        columns=columns,
+        dtypes=dtypes,
+        extra_columns=list(extra),
     )
-    
-    return pw.io.python.read(
-        connector,
-        schema=GoogleDriveSchema,
-        format="json",
-        autocommit_duration_ms=1000
-    ) 
\ No newline at end of file
+    if folder_id or query:
+        connector = GoogleDriveFolderConnector(folder_query(folder_id, query), max_concurrent_downloads, **options)
+    else:
+        connector = GoogleDrivePathwayConnector(file_id=file_id, filename=filename, **options)
+
+    return pw.io.python.read(connector, schema=schema, format="json", autocommit_duration_ms=autocommit_duration_ms)
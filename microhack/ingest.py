@@ -0,0 +1,96 @@
+import codecs
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Tuple
+
+# Upper bound on a single buffered, not-yet-parsed record.
+MAX_RECORD_BYTES = 1 << 20
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+def _split_ndjson(buffer: str, final: bool) -> Tuple[List[Any], str]:
+    lines = buffer.split("\n")
+    rest = "" if final else lines.pop()
+    return [json.loads(line) for line in lines if line.strip()], rest
+
+
+def _split_array(buffer: str, final: bool) -> Tuple[List[Any], str, bool]:
+    records = []
+    pos = 0
+    while True:
+        while pos < len(buffer) and (buffer[pos] in _WHITESPACE or buffer[pos] == ","):
+            pos += 1
+        if pos == len(buffer):
+            return records, "", False
+        if buffer[pos] == "]":
+            return records, "", True
+        try:
+            record, pos = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            # The record is split across chunks; wait for more data
+            return records, buffer[pos:], False
+        records.append(record)
+
+
+async def iter_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """Incrementally parse a request body holding NDJSON or a single JSON array of objects.
+
+    Records are yielded as soon as they are complete, so the body never has to be
+    buffered in full.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    mode = None
+    done = False
+
+    def parse(final: bool) -> List[Any]:
+        nonlocal buffer, done
+        if mode == "array":
+            records, buffer, done = _split_array(buffer, final)
+        else:
+            records, buffer = _split_ndjson(buffer, final)
+        if len(buffer) > MAX_RECORD_BYTES:
+            raise ValueError(f"Record exceeds {MAX_RECORD_BYTES} bytes")
+        for record in records:
+            if not isinstance(record, dict):
+                raise ValueError(f"Expected a JSON object, got {type(record).__name__}")
+        return records
+
+    async for chunk in chunks:
+        if done:
+            break
+        buffer += decoder.decode(chunk)
+        if mode is None:
+            buffer = buffer.lstrip()
+            if not buffer:
+                continue
+            mode = "array" if buffer[0] == "[" else "ndjson"
+            if mode == "array":
+                buffer = buffer[1:]
+        for record in parse(final=False):
+            yield record
+
+    buffer += decoder.decode(b"", final=True)
+    if mode is None or done:
+        return
+    for record in parse(final=True):
+        yield record
+    if mode == "array" and not done:
+        raise ValueError("Unterminated JSON array")
+
+
+async def iter_batches(
+    records: AsyncIterable[Dict[str, Any]], max_batch_size: int
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Group records into lists of at most `max_batch_size` items."""
+    batch = []
+    async for record in records:
+        batch.append(record)
+        if len(batch) >= max_batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
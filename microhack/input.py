@@ -1,22 +1,138 @@
+import queue
 import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
 
+from microhack.aggregations import AggregationSpec
+from microhack.batching import CommitController, autocommit_duration_ms, commit_controller
+from microhack.checkpoint import drive_checkpoint_path
 from microhack.config import get_settings
+from microhack.metrics import INGESTED_AT, QUEUE_DEPTH
+from microhack.registry import input_columns, load_pipelines
+from microhack.wire import RowCodec, require_msgpack
 
 import pathway as pw
 
 
 class InfiniteStream(pw.io.python.ConnectorSubject):
+    def __init__(self, commits: Optional[CommitController] = None, typed: bool = False):
+        super().__init__()
+        # Engine autocommit applies when None
+        self.commits = commits
+        # Send values as they are rather than as JSON text parsed again by the engine
+        self.typed = typed
+
     def run(self):
         while True:
-            self.next_json({"value": 1})
+            now = time.time()
+            if self.typed:
+                self.next(**{"value": 1, "timestamp": now, INGESTED_AT: now})
+            else:
+                self.next_json({"value": 1, "timestamp": now, INGESTED_AT: now})
+            if self.commits is not None and self.commits.add():
+                self.commit()
             time.sleep(0.100)
 
 
-def input():
+class IngestSubject(pw.io.python.ConnectorSubject):
+    """Feeds record batches pushed by the API into the engine, one commit per batch.
+
+    An adaptive `commits` controller instead merges batches into larger commits
+    under load, holding rows back no longer than its latency target.
+    """
+
+    def __init__(self, max_queued_batches: int = 64, commits: Optional[CommitController] = None):
+        super().__init__()
+        self._batches: queue.Queue = queue.Queue(maxsize=max_queued_batches)
+        self.commits = commits or CommitController("http", batch_size=1)
+
+    def push(self, records: List[Dict[str, Any]], typed: bool = False) -> None:
+        """Blocks while the engine is `max_queued_batches` behind, applying backpressure.
+
+        Records are stamped with their arrival time, so queueing counts towards latency.
+        `typed` records hold exactly the input schema's columns with values of their
+        types, e.g. decoded by `RowCodec`, and skip the engine's JSON parsing.
+        """
+        now = time.time()
+        for record in records:
+            record[INGESTED_AT] = now
+        self._batches.put((records, typed))
+
+    def queue_depth(self) -> int:
+        return self._batches.qsize()
+
+    def run(self):
+        while True:
+            try:
+                records, typed = self._batches.get(timeout=self.commits.timeout())
+            except queue.Empty:
+                # Pending rows reached the latency target
+                records, typed = [], False
+            for record in records:
+                if typed:
+                    self.next(**record)
+                else:
+                    self.next_json(record)
+            if self.commits.add(len(records)):
+                self.commit()
+
+
+@lru_cache()
+def get_ingest_subject() -> IngestSubject:
+    subject = IngestSubject(get_settings().ingest_max_queued_batches, commit_controller(get_settings(), "http"))
+    QUEUE_DEPTH.set_function(subject.queue_depth, queue="ingest")
+    return subject
+
+
+def input_schema(extra_columns: Sequence[str] = ()) -> type[pw.Schema]:
+    """Schema of incoming events; `extra_columns` (group-by, distinct) are read as optional strings.
+
+    `ingested_at` is the wall-clock time the event reached its connector, used to
+    measure ingest-to-output latency; producers writing to Kafka may set it themselves.
+    """
+
     class InputSchema(pw.Schema):
         value: int
+        timestamp: Optional[float] = pw.column_definition(default_value=None)
+        ingested_at: Optional[float] = pw.column_definition(default_value=None)
 
-    format="json"
+    extra = {
+        column: pw.column_definition(dtype=Optional[str], default_value=None)
+        for column in extra_columns
+        if column not in InputSchema.column_names()
+    }
+    return InputSchema | pw.schema_builder(extra) if extra else InputSchema
+
+
+@lru_cache()
+def get_codec() -> RowCodec:
+    """MessagePack codec for the input schema of the registered pipelines."""
+    return RowCodec.from_schema(input_schema(input_columns(load_pipelines(get_settings()))))
+
+
+def unpack_messages(messages: pw.Table, schema: type[pw.Schema]) -> pw.Table:
+    """One row per row of the MessagePack batches in the `data` column of raw messages."""
+    codec = RowCodec.from_schema(schema)
+    types = schema.typehints()
+    row_type = tuple[tuple(types.values())]
+    rows = messages.select(rows=pw.apply_with_type(codec.decode, list[row_type], pw.this.data))
+    rows = rows.flatten(pw.this.rows)
+    return rows.select(
+        **{column: pw.declare_type(dtype, pw.this.rows[index]) for index, (column, dtype) in enumerate(types.items())}
+    )
+
+
+def input(extra_columns: Optional[Sequence[str]] = None):
+    """The configured input table; `extra_columns` defaults to the columns the aggregation needs."""
+    if extra_columns is None:
+        spec = AggregationSpec.from_settings(get_settings())
+        extra_columns = spec.group_by + spec.distinct_columns
+    InputSchema = input_schema(extra_columns)
+    binary = get_settings().input_format == "msgpack"
+    if binary:
+        require_msgpack()
+
+    format = "json"
 
     if get_settings().input_connector == "kafka":
         rdkafka_settings = {
@@ -25,26 +141,64 @@ def input():
             "group.id": get_settings().kafka_group_id,
             "session.timeout.ms": get_settings().kafka_session_timeout_ms,
         }
-        return pw.io.kafka.read(
+        if get_settings().kafka_auto_offset_reset:
+            rdkafka_settings["auto.offset.reset"] = get_settings().kafka_auto_offset_reset
+        messages = pw.io.kafka.read(
             rdkafka_settings,
             topic=get_settings().kafka_topic,
-            schema=InputSchema,
-            format=format,
+            # Raw messages are a single `data` column of bytes, unpacked below
+            schema=None if binary else InputSchema,
+            format="raw" if binary else format,
             autocommit_duration_ms=get_settings().autocommit_duration_ms,
+            # Offsets are persisted under this name when persistence is enabled
+            name="kafka",
+            # Partitions are divided among the readers, which run on separate workers
+            parallel_readers=get_settings().kafka_parallel_readers or None,
         )
+        return unpack_messages(messages, InputSchema) if binary else messages
     elif get_settings().input_connector == "python":
+        adaptive = get_settings().commit_mode == "adaptive"
         return pw.io.python.read(
-            InfiniteStream(),
+            InfiniteStream(commit_controller(get_settings(), "python") if adaptive else None, typed=binary),
             schema=InputSchema,
             format=format,
-            autocommit_duration_ms=get_settings().autocommit_duration_ms,
+            autocommit_duration_ms=autocommit_duration_ms(get_settings()),
+            name="python",
+        )
+    elif get_settings().input_connector == "http":
+        return pw.io.python.read(
+            get_ingest_subject(),
+            schema=InputSchema,
+            format=format,
+            autocommit_duration_ms=autocommit_duration_ms(get_settings()),
+            name="http",
         )
     elif get_settings().input_connector == "google_drive":
+        from microhack.google_drive import parse_dtypes
         from microhack.google_drive_connector import google_drive_input
-        
+
         return google_drive_input(
             filename=get_settings().google_drive_filename,
             credentials_file=get_settings().google_drive_credentials_file,
             refresh_interval=get_settings().google_drive_refresh_interval,
-            value_column=get_settings().google_drive_value_column
+            value_column=get_settings().google_drive_value_column,
+            timestamp_column=get_settings().google_drive_timestamp_column,
+            key_column=get_settings().google_drive_key_column or None,
+            use_changes_feed=get_settings().google_drive_use_changes_feed,
+            max_backoff=get_settings().google_drive_max_backoff,
+            batch_size=get_settings().google_drive_batch_size,
+            chunk_size=get_settings().google_drive_download_chunk_size,
+            commit_size=get_settings().google_drive_commit_size,
+            max_rows_per_second=get_settings().google_drive_max_rows_per_second,
+            checkpoint_path=drive_checkpoint_path(get_settings()),
+            folder_id=get_settings().google_drive_folder_id or None,
+            query=get_settings().google_drive_query or None,
+            max_concurrent_downloads=get_settings().google_drive_max_concurrent_downloads,
+            cache_dir=get_settings().google_drive_cache_dir or None,
+            cache_max_bytes=get_settings().google_drive_cache_max_bytes,
+            commits=commit_controller(get_settings(), "google_drive", get_settings().google_drive_commit_size),
+            autocommit_duration_ms=autocommit_duration_ms(get_settings()),
+            columns=[column.strip() for column in get_settings().google_drive_columns.split(",") if column.strip()],
+            dtypes=parse_dtypes(get_settings().google_drive_dtypes),
+            extra_columns=list(extra_columns),
         )
@@ -0,0 +1,50 @@
+import time
+
+import pathway as pw
+
+from microhack.metrics import COMMIT_BATCH_SIZE, CONNECTOR_EVENTS, INGEST_LATENCY, INGESTED_AT
+
+# `on_change` receives the engine time as `time`, shadowing the module
+_now = time.time
+
+
+def observe_input(table: pw.Table, connector: str) -> None:
+    """Count events and commit sizes of an input table.
+
+    Subscribes to a running row count rather than to the rows themselves, so the
+    cost is one callback per engine commit. Sizes are net row changes: an update
+    that retracts and replaces a row counts as zero.
+    """
+    previous = 0
+
+    def on_change(key, row, time, is_addition):
+        nonlocal previous
+        if not is_addition:
+            return
+        delta = row["count"] - previous
+        previous = row["count"]
+        if delta > 0:
+            CONNECTOR_EVENTS.inc(delta, connector=connector)
+        COMMIT_BATCH_SIZE.observe(abs(delta), connector=connector)
+
+    pw.io.subscribe(table.reduce(count=pw.reducers.count()), on_change=on_change)
+
+
+def observe_output(table: pw.Table) -> None:
+    """Record ingest-to-output latency for every result row carrying an ingest time."""
+    if INGESTED_AT not in table.column_names():
+        return
+
+    def on_change(key, row, time, is_addition):
+        ingested_at = row[INGESTED_AT]
+        if is_addition and ingested_at:
+            INGEST_LATENCY.observe(max(0.0, _now() - ingested_at))
+
+    pw.io.subscribe(table, on_change=on_change)
+
+
+def without_ingest_time(table: pw.Table) -> pw.Table:
+    """`table` without the ingest time carried for `observe_output`, as written to sinks and clients."""
+    if INGESTED_AT not in table.column_names():
+        return table
+    return table.without(INGESTED_AT)
@@ -0,0 +1,74 @@
+import random
+import statistics
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+class LoadGenerator:
+    """Synthetic event source for benchmarks.
+
+    - `rate`: mean events per second, 0 for as fast as possible
+    - `payload_width`: number of extra 16-character string fields per event
+    - `key_cardinality`: number of distinct values of the `key` field
+    - `burstiness`: peak-to-mean rate ratio; each second's events are sent within
+      the first `1 / burstiness` of that second and the rest of it stays idle
+    """
+
+    def __init__(
+        self,
+        rate: float = 0,
+        payload_width: int = 0,
+        key_cardinality: int = 1,
+        burstiness: float = 1.0,
+        total: Optional[int] = None,
+        seed: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if burstiness < 1:
+            raise ValueError("burstiness must be at least 1")
+        self.rate = rate
+        self.payload_width = payload_width
+        self.key_cardinality = max(1, key_cardinality)
+        self.burstiness = burstiness
+        self.total = total
+        self._rng = random.Random(seed)
+        self._clock = clock
+        self._sleep = sleep
+        self._payload = {f"f{i}": f"{i:016d}" for i in range(payload_width)}
+
+    def record(self, seq: int) -> Dict[str, Any]:
+        return {
+            "value": self._rng.randint(1, 100),
+            "key": f"k{self._rng.randrange(self.key_cardinality)}",
+            "seq": seq,
+            "timestamp": time.time(),
+            **self._payload,
+        }
+
+    def due_at(self, seq: int) -> float:
+        """Seconds after the start at which event `seq` should be sent."""
+        if not self.rate:
+            return 0.0
+        second, offset = divmod(seq, self.rate)
+        return second + offset / (self.rate * self.burstiness)
+
+    def batches(self, batch_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """Yield batches of records, sleeping so that each batch starts on schedule."""
+        start = self._clock()
+        seq = 0
+        while self.total is None or seq < self.total:
+            size = batch_size if self.total is None else min(batch_size, self.total - seq)
+            delay = start + self.due_at(seq) - self._clock()
+            if delay > 0:
+                self._sleep(delay)
+            yield [self.record(seq + i) for i in range(size)]
+            seq += size
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=1000, method="inclusive")[round(q * 1000) - 1]
@@ -0,0 +1,194 @@
+"""Concurrent HTTP and WebSocket load against a running API server, for `run_benchmark.py --api`.
+
+HTTP clients hold one keep-alive connection each and read `/stats`, posting an
+NDJSON batch to `/ingest` every so often instead; WebSocket clients subscribe to
+`/ws/stream` and count frames. Clients run as coroutines in one process, so for
+very large client counts the load generator itself may become the bottleneck;
+check its CPU usage before reading too much into the numbers.
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional, Tuple
+
+from microhack.loadgen import LoadGenerator, percentile
+
+
+class HttpConnection:
+    """Minimal HTTP/1.1 keep-alive client; enough for the API's JSON responses, cheaper than a full client."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(
+        self, method: str, path: str, body: bytes = b"", content_type: str = "application/json"
+    ) -> Tuple[int, bytes]:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n"
+        if body:
+            head += f"Content-Type: {content_type}\r\n"
+        self._writer.write(head.encode("ascii") + b"\r\n" + body)
+        status_line = await self._reader.readline()
+        if not status_line:
+            await self.close()
+            raise ConnectionError("Connection closed by the server")
+        length, close = 0, False
+        while (line := await self._reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+            elif name.lower() == "connection" and value.strip().lower() == "close":
+                close = True
+        content = await self._reader.readexactly(length)
+        if close:
+            await self.close()
+        return int(status_line.split()[1]), content
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.ws_frames = 0
+        self.ws_failures = 0
+
+
+async def http_client(
+    host: str, port: int, deadline: float, stats: LoadStats, ingest_ratio: float, batch: bytes
+) -> None:
+    connection = HttpConnection(host, port)
+    ingest_every = round(1 / ingest_ratio) if ingest_ratio else 0
+    step = 0
+    while time.monotonic() < deadline:
+        step += 1
+        ingest = ingest_every and step % ingest_every == 0
+        start = time.monotonic()
+        try:
+            if ingest:
+                status, _ = await connection.request("POST", "/ingest", batch, "application/x-ndjson")
+            else:
+                status, _ = await connection.request("GET", "/stats")
+        except (ConnectionError, OSError, asyncio.IncompleteReadError):
+            stats.errors += 1
+            await connection.close()
+            continue
+        if status != 200:
+            stats.errors += 1
+        stats.latencies.append(time.monotonic() - start)
+    await connection.close()
+
+
+async def ws_client(url: str, deadline: float, stats: LoadStats) -> None:
+    import websockets
+
+    try:
+        async with websockets.connect(url, max_size=None) as websocket:
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    await asyncio.wait_for(websocket.recv(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                stats.ws_frames += 1
+    except (OSError, websockets.WebSocketException):
+        stats.ws_failures += 1
+
+
+async def run_load(
+    host: str,
+    port: int,
+    http_clients: int,
+    ws_clients: int,
+    duration: float,
+    ingest_ratio: float = 0.1,
+    batch_size: int = 100,
+    ws_query: str = "max_fps=10",
+) -> Dict[str, Any]:
+    generator = LoadGenerator(key_cardinality=100)
+    batch = "".join(json.dumps(generator.record(seq)) + "\n" for seq in range(batch_size)).encode("utf-8")
+    stats = LoadStats()
+    deadline = time.monotonic() + duration
+    tasks = [http_client(host, port, deadline, stats, ingest_ratio, batch) for _ in range(http_clients)]
+    if ws_clients:
+        try:
+            import websockets  # noqa: F401
+        except ImportError as e:
+            raise ImportError("WebSocket clients require websockets: pip install 'uvicorn[standard]'") from e
+        url = f"ws://{host}:{port}/ws/stream?{ws_query}"
+        tasks += [ws_client(url, deadline, stats) for _ in range(ws_clients)]
+    start = time.monotonic()
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - start
+    return {
+        "http_clients": http_clients,
+        "ws_clients": ws_clients,
+        "requests": len(stats.latencies),
+        "requests_per_sec": len(stats.latencies) / elapsed,
+        "p50_latency_ms": percentile(stats.latencies, 0.50) * 1000,
+        "p99_latency_ms": percentile(stats.latencies, 0.99) * 1000,
+        "errors": stats.errors,
+        "ws_frames_per_sec": stats.ws_frames / elapsed,
+        "ws_failures": stats.ws_failures,
+    }
+
+
+def _get_json(url: str) -> Dict[str, Any]:
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def wait_until_ready(base_url: str, workers: int, timeout: float = 60) -> None:
+    """Poll `/health` until a run of answers, likely from every worker, says healthy."""
+    deadline = time.monotonic() + timeout
+    healthy = 0
+    while healthy < 4 * workers:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"API at {base_url} did not become healthy")
+        try:
+            ready = _get_json(f"{base_url}/health")["status"] == "healthy"
+        except OSError:
+            ready = False
+        healthy = healthy + 1 if ready else 0
+        if not ready:
+            time.sleep(0.2)
+
+
+def consistent_results(base_url: str, workers: int) -> bool:
+    """Whether every worker reports the same totals once ingestion has settled."""
+    time.sleep(2)
+    answers = set()
+    for _ in range(4 * workers):
+        stats = _get_json(f"{base_url}/stats")
+        answers.add((stats["current_sum"], stats["ingested_records"]))
+    return len(answers) == 1
+
+
+def run_api_load(
+    workers: int, port: int, http_clients: int, ws_clients: int, duration: float, ingest_ratio: float, batch_size: int
+) -> Dict[str, Any]:
+    """Start `run_api.py` with `workers` processes on HTTP ingestion and put it under load."""
+    env = dict(os.environ, INPUT_CONNECTOR="http")
+    command = [sys.executable, "run_api.py", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)]
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(base_url, workers)
+        result = asyncio.run(run_load("127.0.0.1", port, http_clients, ws_clients, duration, ingest_ratio, batch_size))
+        result["consistent"] = consistent_results(base_url, workers)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return {"workers": workers, **result}
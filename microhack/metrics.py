@@ -0,0 +1,225 @@
+import bisect
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+
+# Column carrying the wall-clock time an event reached its input connector
+INGESTED_AT = "ingested_at"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    """A label value as the text exposition format quotes it."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Gauge that is either set explicitly or computed by a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], float], **labels: str) -> None:
+        with self._lock:
+            self._functions[self._key(labels)] = function
+
+    def value(self, **labels: str) -> Optional[float]:
+        key = self._key(labels)
+        if key in self._functions:
+            return self._functions[key]()
+        return self._values.get(key)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items()) + [(key, function()) for key, function in self._functions.items()]
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: non-cumulative bucket counts (last one is +Inf), sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        return "\n".join(line for metric in self._metrics.values() for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    # Further paths served next to /metrics: path -> () -> (content type, body)
+    routes: Dict[str, Callable[[], Tuple[str, bytes]]] = {}
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            content_type, body = CONTENT_TYPE, REGISTRY.render().encode("utf-8")
+        elif self.path in self.routes:
+            content_type, body = self.routes[self.path]()
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(
+    port: int, host: str = "0.0.0.0", routes: Optional[Dict[str, Callable[[], Tuple[str, bytes]]]] = None
+) -> ThreadingHTTPServer:
+    """Expose `/metrics`, and any extra `routes`, from a background thread, for processes without the API."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"routes": dict(routes or {})})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+CONNECTOR_EVENTS = REGISTRY.register(
+    Counter("microhack_connector_events_total", "Events read by each input connector", ["connector"])
+)
+INPUT_REJECTED = REGISTRY.register(
+    Counter("microhack_input_rejected_total", "Binary input messages and rows failing schema validation", ["kind"])
+)
+COMMIT_BATCH_SIZE = REGISTRY.register(
+    Histogram(
+        "microhack_commit_batch_size", "Events per engine commit, by input connector", ["connector"], SIZE_BUCKETS
+    )
+)
+COMMIT_BATCH_TARGET = REGISTRY.register(
+    Gauge("microhack_commit_batch_target", "Rows per commit currently chosen by the commit controller", ["connector"])
+)
+COMMIT_DECISIONS = REGISTRY.register(
+    Counter(
+        "microhack_commit_decisions_total",
+        "Commits by the reason the controller made them: size, deadline or flush",
+        ["connector", "reason"],
+    )
+)
+QUEUE_DEPTH = REGISTRY.register(Gauge("microhack_queue_depth", "Items waiting in an internal queue", ["queue"]))
+INGEST_LATENCY = REGISTRY.register(
+    Histogram(
+        "microhack_ingest_to_output_latency_seconds",
+        "Time from stamping an event at its connector to the pipeline output reflecting it",
+    )
+)
+WEBSOCKET_CLIENTS = REGISTRY.register(Gauge("microhack_websocket_clients", "Connected WebSocket clients"))
+WEBSOCKET_DROPPED = REGISTRY.register(
+    Counter("microhack_websocket_dropped_total", "Updates dropped for slow WebSocket clients")
+)
+WEBSOCKET_FANOUT_LAG = REGISTRY.register(
+    Histogram(
+        "microhack_websocket_fanout_lag_seconds", "Time from the engine publishing an update to a client receiving it"
+    )
+)
@@ -1,5 +1,37 @@
 import pathway as pw
 
+from microhack.config import get_settings
+from microhack.instrumentation import without_ingest_time
+from microhack.profiling import timed
+from microhack.sinks import RotatingSink, SnapshotSink
 
-def output(output_table):
-    pw.io.csv.write(output_table, "output.csv")
+
+def output(output_table, path=None):
+    """Write results to `path`, by default OUTPUT_PATH."""
+    settings = get_settings()
+    path = path or settings.output_path
+    output_table = without_ingest_time(output_table)
+
+    if settings.output_sink == "csv":
+        # Full changelog: every update appends a retraction and an insertion
+        pw.io.csv.write(output_table, path)
+        return
+
+    if settings.output_sink == "snapshot":
+        sink = SnapshotSink(path, flush_interval_ms=settings.output_flush_interval_ms)
+    else:
+        sink = RotatingSink(
+            path,
+            rotate_bytes=settings.output_rotate_bytes,
+            rotate_seconds=settings.output_rotate_seconds,
+            flush_rows=settings.output_flush_rows,
+            flush_interval_ms=settings.output_flush_interval_ms,
+            keep_files=settings.output_keep_files,
+            columns=output_table.schema.typehints(),
+        )
+    pw.io.subscribe(
+        output_table,
+        on_change=timed(f"sink:{path}", sink.on_change),
+        on_time_end=timed(f"sink:{path}:flush", sink.on_time_end),
+        on_end=sink.on_end,
+    )
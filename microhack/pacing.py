@@ -0,0 +1,31 @@
+import time
+from typing import Callable, Optional
+
+
+class RateLimiter:
+    """Blocks callers so that on average no more than `rate` items pass per second.
+
+    A `rate` of 0 or None disables pacing. Up to one second worth of items may
+    pass in a burst.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate or 0
+        self._clock = clock
+        self._sleep = sleep
+        self._allowance = self.rate
+        self._last = clock()
+
+    def acquire(self, count: int = 1) -> None:
+        if not self.rate:
+            return
+        now = self._clock()
+        self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate) - count
+        self._last = now
+        if self._allowance < 0:
+            self._sleep(-self._allowance / self.rate)
@@ -1,10 +1,15 @@
+from typing import Optional
+
 import pathway as pw
 
+from microhack.aggregations import AggregationSpec, aggregate
+
 
-def pipeline(input_table: pw.Table) -> pw.Table:
+def pipeline(input_table: pw.Table, spec: Optional[AggregationSpec] = None) -> pw.Table:
     """Your custom logic."""
 
-    # Example app: sum all the values on the stream
-    output_table = input_table.reduce(sum=pw.reducers.sum(input_table.value))
+    # Example app: sum all the values on the stream, unless a different
+    # aggregation (groups, windows, reducers) is configured
+    output_table = aggregate(input_table, spec or AggregationSpec())
 
     return output_table
@@ -0,0 +1,360 @@
+"""Opt-in profiling of a running pipeline (PROFILING_ENABLED=true).
+
+Three views of where the time goes:
+- a sampler reads the Python stack of every thread every PROFILING_INTERVAL_MS,
+  so connector loops (`InfiniteStream.run`, the Drive connector) and subscriber
+  callbacks show up with their callers, as a flame graph;
+- stages of the graph (the input table and each pipeline's output) count the row
+  changes and commits reaching them, and how long after the input each engine
+  time reaches them;
+- Python callbacks handed to the engine (sinks, API hubs) record calls and time.
+
+Attribution is per stage, not per engine operator: the operators run in Rust and
+Pathway exposes no per-operator timings to Python. A slow stage with idle Python
+threads points at the operators between it and the previous stage; `track` more
+intermediate tables of a pipeline to narrow it down.
+"""
+
+import atexit
+import hashlib
+import html
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from functools import lru_cache, wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Leaf frames of a thread waiting rather than working
+IDLE_FILES = {"threading.py", "queue.py", "selectors.py", "socket.py", "connection.py", "ssl.py"}
+# Engine times remembered for stage latencies
+MAX_TRACKED_TIMES = 10_000
+
+FLAME_WIDTH = 1200
+FLAME_FRAME_HEIGHT = 16
+
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class _Stage:
+    def __init__(self):
+        self.rows_added = 0
+        self.rows_removed = 0
+        self.commits = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_count = 0
+        self._times: OrderedDict = OrderedDict()
+
+    def summary(self) -> Dict[str, Any]:
+        mean = self.latency_total / self.latency_count if self.latency_count else 0.0
+        return {
+            "rows_added": self.rows_added,
+            "rows_removed": self.rows_removed,
+            "commits": self.commits,
+            "latency_ms_mean": mean * 1000,
+            "latency_ms_max": self.latency_max * 1000,
+        }
+
+
+class _Callback:
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "seconds": self.seconds,
+            "mean_ms": self.seconds / self.calls * 1000 if self.calls else 0.0,
+            "max_ms": self.max_seconds * 1000,
+        }
+
+
+class Profiler:
+    """Stack samples, stage counters and callback timings of this process."""
+
+    def __init__(
+        self, interval: float = 0.01, include_idle: bool = False, clock: Callable[[], float] = time.monotonic
+    ):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.clock = clock
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.stages: Dict[str, _Stage] = {}
+        self.callbacks: Dict[str, _Callback] = {}
+        self.started_at = clock()
+        self._input_times: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        """Record the current stack of every other thread."""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        folded = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            if not self.include_idle and os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(_label(frame.f_code))
+                frame = frame.f_back
+            # Threads started by the engine are unknown to `threading`
+            root = names.get(ident, f"thread-{ident}").replace(";", ":")
+            folded.append(";".join([root, *reversed(frames)]))
+        with self._lock:
+            self.samples += 1
+            self.stacks.update(folded)
+
+    def record_stage(self, stage: str, time: int, added: int = 0, removed: int = 0) -> None:
+        """Row changes reaching `stage` at engine time `time`; the stage named "input" starts the clock."""
+        now = self.clock()
+        with self._lock:
+            state = self.stages.setdefault(stage, _Stage())
+            state.rows_added += added
+            state.rows_removed += removed
+            if time in state._times:
+                return
+            state.commits += 1
+            state._times[time] = None
+            if len(state._times) > MAX_TRACKED_TIMES:
+                state._times.popitem(last=False)
+            if stage == "input":
+                self._input_times.setdefault(time, now)
+                if len(self._input_times) > MAX_TRACKED_TIMES:
+                    self._input_times.popitem(last=False)
+            elif time in self._input_times:
+                latency = now - self._input_times[time]
+                state.latency_total += latency
+                state.latency_count += 1
+                state.latency_max = max(state.latency_max, latency)
+
+    def track(self, table, stage: str, per_row: bool = True) -> None:
+        """Count row changes of a table as `stage`.
+
+        With `per_row=False` a running row count is subscribed to instead, one
+        callback per commit, which keeps the cost low for large inputs but counts
+        net rows only.
+        """
+        import pathway as pw
+
+        if per_row:
+
+            def on_change(key, row, time, is_addition):
+                self.record_stage(stage, time, added=int(is_addition), removed=int(not is_addition))
+
+            pw.io.subscribe(table, on_change=on_change)
+            return
+
+        previous = 0
+
+        def on_count(key, row, time, is_addition):
+            nonlocal previous
+            if not is_addition:
+                return
+            delta = row["count"] - previous
+            previous = row["count"]
+            self.record_stage(stage, time, added=max(delta, 0), removed=max(-delta, 0))
+
+        pw.io.subscribe(table.reduce(count=pw.reducers.count()), on_change=on_count)
+
+    def timed(self, name: str, callback: Callable) -> Callable:
+        """`callback`, recording its calls and time under `name`."""
+        with self._lock:
+            state = self.callbacks.setdefault(name, _Callback())
+
+        @wraps(callback)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return callback(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                state.calls += 1
+                state.seconds += elapsed
+                state.max_seconds = max(state.max_seconds, elapsed)
+
+        return wrapper
+
+    def folded(self) -> str:
+        """Stacks in the folded format of flamegraph.pl and speedscope."""
+        with self._lock:
+            stacks = list(self.stacks.items())
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks))
+
+    def summary(self, top: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            stacks = list(self.stacks.items())
+            stages = {name: stage.summary() for name, stage in self.stages.items()}
+            callbacks = {name: callback.summary() for name, callback in self.callbacks.items()}
+        threads: Counter = Counter()
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in stacks:
+            frames = stack.split(";")
+            threads[frames[0]] += count
+            if len(frames) > 1:
+                own[frames[-1]] += count
+            for frame in set(frames[1:]):
+                total[frame] += count
+        return {
+            "duration_s": self.clock() - self.started_at,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "threads": dict(threads.most_common()),
+            "top_functions": [
+                {"function": frame, "self_samples": count, "total_samples": total[frame]}
+                for frame, count in own.most_common(top)
+            ],
+            "stages": stages,
+            "callbacks": callbacks,
+        }
+
+    def flamegraph(self, title: str = "microhack profile") -> str:
+        """The sampled stacks as a self-contained SVG flame graph, roots at the bottom."""
+        with self._lock:
+            stacks = list(self.stacks.items())
+        root: Dict[str, Any] = {"count": 0, "children": {}}
+        depth = 0
+        for stack, count in stacks:
+            node = root
+            node["count"] += count
+            frames = stack.split(";")
+            depth = max(depth, len(frames))
+            for frame in frames:
+                node = node["children"].setdefault(frame, {"count": 0, "children": {}})
+                node["count"] += count
+
+        height = (depth + 2) * FLAME_FRAME_HEIGHT
+        scale = FLAME_WIDTH / root["count"] if root["count"] else 0
+        rects: List[str] = []
+
+        def draw(name: str, node: Dict[str, Any], x: float, level: int) -> None:
+            width = node["count"] * scale
+            if width < 0.5:
+                return
+            y = height - (level + 2) * FLAME_FRAME_HEIGHT
+            hue = int(hashlib.md5(name.encode("utf-8")).hexdigest()[:4], 16)
+            color = f"rgb({205 + hue % 50},{80 + hue % 120},{40 + hue % 40})"
+            label = html.escape(name)
+            text = label if len(name) * 7 < width else html.escape(name[: max(int(width / 7) - 2, 0)] + "..")
+            share = node["count"] / root["count"] * 100
+            rects.append(
+                f'<g><title>{label} ({node["count"]} samples, {share:.2f}%)</title>'
+                f'<rect x="{x:.1f}" y="{y}" width="{width:.1f}" height="{FLAME_FRAME_HEIGHT - 1}" fill="{color}"/>'
+                + (f'<text x="{x + 3:.1f}" y="{y + 11}">{text}</text>' if width > 21 else "")
+                + "</g>"
+            )
+            for child_name, child in sorted(node["children"].items()):
+                draw(child_name, child, x, level + 1)
+                x += child["count"] * scale
+
+        x = 0.0
+        for name, node in sorted(root["children"].items()):
+            draw(name, node, x, 0)
+            x += node["count"] * scale
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{FLAME_WIDTH}" height="{height}" '
+            f'font-family="monospace" font-size="11">'
+            f'<text x="{FLAME_WIDTH / 2}" y="12" text-anchor="middle">{html.escape(title)} '
+            f'({root["count"]} samples)</text>{"".join(rects)}</svg>\n'
+        )
+
+    def dump(self, prefix: str) -> List[str]:
+        """Write `<prefix>.folded`, `<prefix>.svg` and `<prefix>.json`; returns their paths."""
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        contents = {
+            f"{prefix}.folded": self.folded(),
+            f"{prefix}.svg": self.flamegraph(),
+            f"{prefix}.json": json.dumps(self.summary(), indent=2) + "\n",
+        }
+        for path, content in contents.items():
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(content)
+        return list(contents)
+
+
+def output_prefix(settings) -> str:
+    """PROFILING_OUTPUT, with the process id added in processes started by `pathway spawn`."""
+    if "PATHWAY_PROCESS_ID" not in os.environ:
+        return settings.profiling_output
+    return f"{settings.profiling_output}-{os.environ['PATHWAY_PROCESS_ID']}"
+
+
+@lru_cache()
+def get_profiler() -> Optional[Profiler]:
+    """The process-wide profiler, started on first use; None unless PROFILING_ENABLED is set.
+
+    Results are dumped to PROFILING_OUTPUT when the process exits.
+    """
+    from microhack.config import get_settings
+
+    settings = get_settings()
+    if not settings.profiling_enabled:
+        return None
+    profiler = Profiler(settings.profiling_interval_ms / 1000, settings.profiling_include_idle)
+    profiler.start()
+
+    def dump():
+        paths = profiler.dump(output_prefix(settings))
+        print(f"Profile written to {', '.join(paths)}")
+
+    atexit.register(dump)
+    if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+        # `kill -USR1 <pid>` dumps a live process
+        signal.signal(signal.SIGUSR1, lambda signum, frame: dump())
+    return profiler
+
+
+def timed(name: str, callback: Callable) -> Callable:
+    """`callback`, timed when profiling is enabled."""
+    profiler = get_profiler()
+    return profiler.timed(name, callback) if profiler else callback
+
+
+def profile_routes() -> Dict[str, Callable[[], Tuple[str, bytes]]]:
+    """`/profile` (JSON summary), `/profile/flamegraph` (SVG) and `/profile/folded` for `metrics.serve`."""
+    profiler = get_profiler()
+    if profiler is None:
+        return {}
+    return {
+        "/profile": lambda: ("application/json", json.dumps(profiler.summary()).encode("utf-8")),
+        "/profile/flamegraph": lambda: ("image/svg+xml", profiler.flamegraph().encode("utf-8")),
+        "/profile/folded": lambda: ("text/plain; charset=utf-8", profiler.folded().encode("utf-8")),
+    }
+
+
+def track_pipelines(input_table, output_tables: Dict[str, Any]) -> None:
+    """Track the input and every pipeline output as stages, when profiling is enabled."""
+    profiler = get_profiler()
+    if profiler is None:
+        return
+    profiler.track(input_table, "input", per_row=False)
+    for name, table in output_tables.items():
+        profiler.track(table, f"output:{name}")
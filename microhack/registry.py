@@ -0,0 +1,93 @@
+import importlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+import pathway as pw
+
+from microhack.aggregations import AggregationSpec
+
+# The pipeline configured by the AGGREGATION_* settings, served on the original routes
+MAIN = "main"
+DEFAULT_FUNCTION = "microhack.pipeline:pipeline"
+
+
+@dataclass
+class PipelineDefinition:
+    """A named pipeline attached to the shared input: `function(input_table, spec)` and its sink."""
+
+    name: str
+    spec: AggregationSpec
+    function: str = DEFAULT_FUNCTION
+    output_path: str = ""
+
+    def build(self, input_table: pw.Table) -> pw.Table:
+        return load_function(self.function)(input_table, self.spec)
+
+
+def load_function(path: str) -> Callable[[pw.Table, AggregationSpec], pw.Table]:
+    """Resolve `package.module:function`."""
+    module, separator, attribute = path.partition(":")
+    if not separator:
+        raise ValueError(f"Pipeline function '{path}' must look like package.module:function")
+    return getattr(importlib.import_module(module), attribute)
+
+
+def derived_output_path(output_path: str, name: str) -> str:
+    """`output.csv` -> `output-<name>.csv`, so that pipelines do not share a sink by default."""
+    stem, extension = os.path.splitext(output_path)
+    return f"{stem}-{name}{extension}"
+
+
+def _definition(name: str, options: Dict[str, Any], settings) -> PipelineDefinition:
+    """Pipeline `name` from its config entry; spec options default to the AGGREGATION_* settings.
+
+    Spec options are named like the settings without the `aggregation_` prefix,
+    e.g. `{"group_by": "category", "reducers": "count,p99", "window": "tumbling"}`.
+    """
+    options = dict(options)
+    function = options.pop("function", DEFAULT_FUNCTION)
+    output_path = options.pop("output_path", "") or derived_output_path(settings.output_path, name)
+    overrides = {}
+    for option, value in options.items():
+        setting = f"aggregation_{option}"
+        if setting not in type(settings).model_fields:
+            known = [
+                name[len("aggregation_") :] for name in type(settings).model_fields if name.startswith("aggregation_")
+            ]
+            raise ValueError(
+                f"Unknown option '{option}' of pipeline '{name}', expected function, output_path or {known}"
+            )
+        overrides[setting] = value
+    # Validated like the settings themselves; pydantic's ValidationError is a ValueError
+    merged = type(settings).model_validate({**settings.model_dump(), **overrides})
+    spec = AggregationSpec.from_settings(merged)
+    return PipelineDefinition(name, spec, function, output_path)
+
+
+def load_pipelines(settings) -> List[PipelineDefinition]:
+    """The main pipeline, followed by those declared in the `PIPELINES` setting.
+
+    `PIPELINES` is a JSON object from pipeline names to their options.
+    """
+    definitions = [PipelineDefinition(MAIN, AggregationSpec.from_settings(settings), output_path=settings.output_path)]
+    declared = json.loads(settings.pipelines) if settings.pipelines else {}
+    for name, options in declared.items():
+        if name == MAIN or not name.replace("_", "").replace("-", "").isalnum():
+            raise ValueError(f"Invalid pipeline name '{name}'")
+        definitions.append(_definition(name, options, settings))
+    return definitions
+
+
+def input_columns(definitions: List[PipelineDefinition]) -> List[str]:
+    """Extra input columns needed by any pipeline (group-by and distinct columns)."""
+    columns: Dict[str, None] = {}
+    for definition in definitions:
+        columns.update(dict.fromkeys(definition.spec.group_by + definition.spec.distinct_columns))
+    return list(columns)
+
+
+def build_pipelines(input_table: pw.Table, definitions: List[PipelineDefinition]) -> Dict[str, pw.Table]:
+    """Attach every pipeline to the one input table; the engine then reads and parses the input once."""
+    return {definition.name: definition.build(input_table) for definition in definitions}
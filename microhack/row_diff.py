@@ -0,0 +1,90 @@
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Set
+
+import pandas as pd
+
+
+class RowChanges(NamedTuple):
+    """Positional indices into the new frame for inserts/updates, keys for deletes."""
+
+    inserted: List[int]
+    updated: List[int]
+    deleted: List[str]
+    keys: List[str]
+
+    @property
+    def size(self) -> int:
+        return len(self.inserted) + len(self.updated) + len(self.deleted)
+
+
+def row_keys(
+    df: pd.DataFrame, hashes: pd.Series, key_column: Optional[str] = None, seen: Optional[Counter] = None
+) -> List[str]:
+    """Stable identity for every row of `df`.
+
+    With a key column the row is identified by its value there. Otherwise the row
+    content hash is used, suffixed with an occurrence counter so that duplicate
+    rows stay distinct; `seen` carries the counters over from earlier batches.
+    """
+    if key_column:
+        if key_column not in df.columns:
+            raise ValueError(f"Key column '{key_column}' not found in {list(df.columns)}")
+        keys = df[key_column].astype(str)
+        if keys.duplicated().any():
+            raise ValueError(f"Key column '{key_column}' contains duplicate values")
+        return keys.tolist()
+
+    occurrence = hashes.groupby(hashes.values).cumcount()
+    if seen:
+        occurrence += hashes.map(lambda value: seen.get(value, 0))
+    return (hashes.map("{:016x}".format) + ":" + occurrence.astype(str)).tolist()
+
+
+class RowDiffer:
+    """Remembers the rows seen on the previous poll and reports what changed since.
+
+    A poll is either a single `diff(df)` call, or `begin()`, one `diff_batch` per
+    chunk of the file and `finish()`, which returns the deleted keys. The state is
+    updated batch by batch, so an interrupted pass leaves it matching exactly what
+    was reported.
+    """
+
+    def __init__(self, key_column: Optional[str] = None):
+        self.key_column = key_column
+        self.hashes: Dict[str, int] = {}
+        self._seen_keys: Set[str] = set()
+        self._seen_hashes: Counter = Counter()
+
+    def begin(self) -> None:
+        self._seen_keys = set()
+        self._seen_hashes = Counter()
+
+    def diff_batch(self, df: pd.DataFrame) -> RowChanges:
+        content = pd.util.hash_pandas_object(df, index=False)
+        keys = row_keys(df, content, self.key_column, self._seen_hashes)
+        if self.key_column and not self._seen_keys.isdisjoint(keys):
+            raise ValueError(f"Key column '{self.key_column}' contains duplicate values")
+
+        inserted, updated = [], []
+        for position, (key, value) in enumerate(zip(keys, content.tolist())):
+            old = self.hashes.get(key)
+            if old is None:
+                inserted.append(position)
+            elif old != value:
+                updated.append(position)
+            self.hashes[key] = value
+
+        self._seen_keys.update(keys)
+        self._seen_hashes.update(content.tolist())
+        return RowChanges(inserted, updated, [], keys)
+
+    def finish(self) -> List[str]:
+        deleted = [key for key in self.hashes if key not in self._seen_keys]
+        for key in deleted:
+            del self.hashes[key]
+        return deleted
+
+    def diff(self, df: pd.DataFrame) -> RowChanges:
+        self.begin()
+        changes = self.diff_batch(df)
+        return changes._replace(deleted=self.finish())
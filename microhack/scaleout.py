@@ -0,0 +1,34 @@
+import os
+import sys
+from typing import List
+
+
+def spawn_command(processes: int, threads: int, command: List[str], first_port: int = 0) -> List[str]:
+    """`pathway spawn` invocation running `command` on `processes` x `threads` workers."""
+    spawn = ["pathway", "spawn", "--processes", str(processes), "--threads", str(threads)]
+    if first_port:
+        spawn += ["--first-port", str(first_port)]
+    return spawn + command
+
+
+def process_id() -> int:
+    """Index of this process among those started by `pathway spawn`; 0 when not spawned."""
+    return int(os.environ.get("PATHWAY_PROCESS_ID", "0"))
+
+
+def metrics_port(settings) -> int:
+    """METRICS_PORT offset by the process id, so every spawned process serves its own metrics."""
+    return settings.metrics_port + process_id() if settings.metrics_port else 0
+
+
+def relaunch_with_workers(settings) -> None:
+    """Replace this process with `pathway spawn` when more than one process is configured.
+
+    The spawned processes get PATHWAY_PROCESS_ID set, so they run the pipeline
+    instead of relaunching again.
+    """
+    if settings.pathway_processes <= 1 or "PATHWAY_PROCESS_ID" in os.environ:
+        return
+    command = spawn_command(settings.pathway_processes, settings.pathway_threads, [sys.executable, *sys.argv])
+    print(f"Starting {settings.pathway_processes} processes x {settings.pathway_threads} threads")
+    os.execvp(command[0], command)
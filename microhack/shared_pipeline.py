@@ -0,0 +1,219 @@
+"""One pipeline shared by several API worker processes.
+
+The process running the engine serves its results over a local socket
+(`multiprocessing.connection`). Every worker follows the same ordered change
+stream: a snapshot of the output rows with its sequence number, then each engine
+change in order, for every pipeline of the registry. Workers therefore hold
+identical state and hand out the same sequence numbers, whichever of them a
+client hits. Ingested records travel the
+other way and are pushed into the engine by the serving process.
+"""
+
+import queue
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from microhack.broadcast import BroadcastHub
+from microhack.registry import MAIN
+
+# Seconds between attempts to reach the serving process
+RECONNECT_DELAY = 0.5
+
+
+class PipelineError(Exception):
+    """The serving process failed to push records into the engine; the message is its error."""
+
+
+class _Stream:
+    """A worker following the change stream; a worker too far behind is dropped and resyncs."""
+
+    def __init__(self, connection: Connection, max_queued: int):
+        self.connection = connection
+        self.closed = False
+        self._messages: queue.Queue = queue.Queue(maxsize=max_queued)
+
+    def offer(self, message: tuple) -> None:
+        try:
+            self._messages.put_nowait(message)
+        except queue.Full:
+            self.close()
+
+    def close(self) -> None:
+        self.closed = True
+        self.connection.close()
+
+    def run(self) -> None:
+        try:
+            while not self.closed:
+                self.connection.send(self._messages.get())
+        except (OSError, ValueError):
+            self.closed = True
+
+
+class PipelineServer:
+    """Serves the pipeline running in this process to API workers.
+
+    Pass `on_change` to `pw.io.subscribe` in place of the hub's, with `pipeline=`
+    set for pipelines other than the main one. Workers open one
+    connection to follow the stream and others, as needed, to push records through
+    `push(records, typed)` (usually `IngestSubject.push`, which blocks while the
+    engine is behind).
+    """
+
+    def __init__(
+        self,
+        address: str,
+        authkey: bytes,
+        push: Callable[[List[Dict[str, Any]], bool], None],
+        hub: Optional[BroadcastHub] = None,
+        max_queued: int = 100_000,
+    ):
+        self.address = address
+        self.push = push
+        self.hub = hub or BroadcastHub()
+        self.hubs: Dict[str, BroadcastHub] = {MAIN: self.hub}
+        self.max_queued = max_queued
+        self.counters = {"records": 0, "batches": 0}
+        self._listener = Listener(address, authkey=authkey)
+        self._streams: Set[_Stream] = set()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        threading.Thread(target=self._accept, name="pipeline-server", daemon=True).start()
+
+    def on_change(self, key: Any, row: Dict[str, Any], time: int, is_addition: bool, pipeline: str = MAIN) -> None:
+        with self._lock:
+            hub = self.hubs.get(pipeline)
+            if hub is None:
+                hub = self.hubs[pipeline] = BroadcastHub()
+            hub.on_change(key, row, time, is_addition)
+            self._broadcast(("change", pipeline, str(key), row, time, is_addition))
+
+    def _broadcast(self, message: tuple) -> None:
+        for stream in list(self._streams):
+            stream.offer(message)
+            if stream.closed:
+                self._streams.discard(stream)
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                connection = self._listener.accept()
+            except OSError:
+                # Failed handshake, e.g. a wrong authkey
+                continue
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection: Connection) -> None:
+        try:
+            kind = connection.recv()
+            if kind == "stream":
+                self._follow(connection)
+            elif kind == "ingest":
+                self._ingest(connection)
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+
+    def _follow(self, connection: Connection) -> None:
+        stream = _Stream(connection, self.max_queued)
+        with self._lock:
+            # Registered under the lock, so the snapshot is followed by exactly the later changes
+            pipelines = {name: (hub.seq, hub.view.entries()) for name, hub in self.hubs.items()}
+            stream.offer(("snapshot", pipelines, dict(self.counters)))
+            self._streams.add(stream)
+        stream.run()
+        with self._lock:
+            self._streams.discard(stream)
+
+    def _ingest(self, connection: Connection) -> None:
+        while True:
+            records, typed = connection.recv()
+            try:
+                self.push(records, typed)
+            except Exception as e:
+                # Reported to the worker, which fails the request; the connection stays usable
+                connection.send(("error", repr(e)))
+                continue
+            with self._lock:
+                self.counters["records"] += len(records)
+                self.counters["batches"] += 1
+                self._broadcast(("counters", dict(self.counters)))
+            connection.send(("ok", len(records)))
+
+
+class PipelineClient:
+    """Mirrors a `PipelineServer` into this worker's hubs and forwards ingested records to it.
+
+    `hubs` maps the names of pipelines other than the main one to their hubs;
+    changes of pipelines this worker does not serve are ignored.
+    """
+
+    def __init__(
+        self, address: str, authkey: bytes, hub: BroadcastHub, hubs: Optional[Dict[str, BroadcastHub]] = None
+    ):
+        self.address = address
+        self.authkey = authkey
+        self.hub = hub
+        self.hubs = {**(hubs or {}), MAIN: hub}
+        self.counters = {"records": 0, "batches": 0}
+        self.connected = threading.Event()
+        # Idle ingest connections, reused across requests
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+
+    def start(self) -> None:
+        threading.Thread(target=self._follow, name="pipeline-client", daemon=True).start()
+
+    def _follow(self) -> None:
+        while True:
+            connection = None
+            try:
+                connection = Client(self.address, authkey=self.authkey)
+                connection.send("stream")
+                while True:
+                    self._handle(connection.recv())
+            except (EOFError, OSError) as e:
+                if connection is not None:
+                    connection.close()
+                self.connected.clear()
+                print(f"Lost the shared pipeline at {self.address} ({e!r}); reconnecting")
+                time.sleep(RECONNECT_DELAY)
+
+    def _handle(self, message: tuple) -> None:
+        kind = message[0]
+        if kind == "change":
+            hub = self.hubs.get(message[1])
+            if hub is not None:
+                hub.on_change(*message[2:])
+        elif kind == "counters":
+            self.counters = message[1]
+        elif kind == "snapshot":
+            _, pipelines, self.counters = message
+            for name, hub in self.hubs.items():
+                seq, entries = pipelines.get(name, (0, []))
+                hub.load(entries, seq)
+            self.connected.set()
+
+    def push(self, records: List[Dict[str, Any]], typed: bool = False) -> None:
+        """Blocks until the serving process has handed the records to the engine.
+
+        `typed` is passed on to `IngestSubject.push`. Raises `PipelineError` if the
+        serving process failed to push them.
+        """
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = Client(self.address, authkey=self.authkey)
+            connection.send("ingest")
+        try:
+            connection.send((records, typed))
+            status, result = connection.recv()
+        except BaseException:
+            connection.close()
+            raise
+        self._idle.put(connection)
+        if status == "error":
+            raise PipelineError(result)
@@ -0,0 +1,223 @@
+import csv
+import json
+import os
+import re
+import time
+import types
+import typing
+from typing import Any, Callable, Dict, List, Optional
+
+# Arrow types of the output columns' Python types; other columns are written as strings
+ARROW_TYPES = {int: "int64", float: "float64", str: "string", bool: "bool_", bytes: "binary"}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet output requires pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def write_rows(path: str, rows: List[Dict[str, Any]]) -> None:
+    """Atomically replace `path` with `rows`, in the format given by its extension (.csv, .jsonl, .parquet)."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    if path.endswith(".parquet"):
+        pa = _require_pyarrow()
+        pa.parquet.write_table(pa.Table.from_pylist(rows), tmp_path)
+    elif path.endswith(".csv"):
+        with open(tmp_path, "w", newline="") as f:
+            columns = list(rows[0]) if rows else []
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(tmp_path, "w") as f:
+            for row in rows:
+                f.write(json.dumps(row, default=str) + "\n")
+    os.replace(tmp_path, path)
+
+
+def _arrow_type(pa, hint: Any):
+    """Arrow type of a column type hint, unwrapping Optional; None if it has none."""
+    args = [arg for arg in typing.get_args(hint) if arg is not type(None)]
+    if typing.get_origin(hint) in (typing.Union, types.UnionType) and len(args) == 1:
+        hint = args[0]
+    name = ARROW_TYPES.get(hint)
+    return getattr(pa, name)() if name else None
+
+
+class SnapshotSink:
+    """Keeps only the latest row per key and rewrites `path` with the full state.
+
+    The file is rewritten at most once per `flush_interval_ms`, at the end of an
+    engine time, and once more when the stream ends; its size tracks the size of
+    the state rather than the length of the update history.
+    """
+
+    def __init__(self, path: str, flush_interval_ms: int = 1000, clock: Callable[[], float] = time.monotonic):
+        self.path = path
+        self.flush_interval = flush_interval_ms / 1000
+        self._clock = clock
+        self.state: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._last_flush = float("-inf")
+
+    def on_change(self, key: Any, row: Dict[str, Any], time: int, is_addition: bool) -> None:
+        key = str(key)
+        if is_addition:
+            self.state[key] = row
+        elif self.state.get(key) == row:
+            del self.state[key]
+        self._dirty = True
+
+    def on_time_end(self, time: int) -> None:
+        if self._dirty and self._clock() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def on_end(self) -> None:
+        if self._dirty:
+            self.flush()
+
+    def flush(self) -> None:
+        write_rows(self.path, [{"key": key, **row} for key, row in self.state.items()])
+        self._dirty = False
+        self._last_flush = self._clock()
+
+
+class RotatingSink:
+    """Buffered changelog writer that rolls over to a new file by size or age.
+
+    Rows are written as JSON Lines or Parquet row groups with `time` and `diff`
+    columns, like the CSV changelog. Files are named `<base>-<timestamp>-<n><ext>`
+    next to `path`; only the newest `keep_files` are retained when it is set.
+
+    `columns` maps the output columns to their types, fixing the Parquet schema
+    up front; otherwise it is inferred from the first rows written to each file.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        rotate_bytes: int = 64 * 1024 * 1024,
+        rotate_seconds: float = 3600,
+        flush_rows: int = 1000,
+        flush_interval_ms: int = 1000,
+        keep_files: int = 0,
+        clock: Callable[[], float] = time.time,
+        columns: Optional[Dict[str, Any]] = None,
+    ):
+        self.base, self.extension = os.path.splitext(path)
+        if self.extension not in (".jsonl", ".parquet"):
+            raise ValueError(f"Rotating output supports .jsonl and .parquet files, got '{path}'")
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval_ms / 1000
+        self.keep_files = keep_files
+        self._clock = clock
+        self._buffer: List[Dict[str, Any]] = []
+        self._sequence = 0
+        self._current: Optional[str] = None
+        self._opened_at = 0.0
+        self._last_flush = clock()
+        self._writer = None
+        self._handle = None
+        self._schema = None
+        # Columns without an Arrow type, converted with str() as in JSON Lines
+        self._stringified: List[str] = []
+        if self.extension == ".parquet":
+            self._pa = _require_pyarrow()
+            if columns is not None:
+                self._schema = self._arrow_schema(columns)
+
+    def _arrow_schema(self, columns: Dict[str, Any]):
+        pa = self._pa
+        fields = []
+        for name, hint in columns.items():
+            arrow_type = _arrow_type(pa, hint)
+            if arrow_type is None:
+                self._stringified.append(name)
+                arrow_type = pa.string()
+            fields.append(pa.field(name, arrow_type))
+        return pa.schema([*fields, pa.field("time", pa.int64()), pa.field("diff", pa.int64())])
+
+    @property
+    def current_file(self) -> Optional[str]:
+        return self._current
+
+    def on_change(self, key: Any, row: Dict[str, Any], time: int, is_addition: bool) -> None:
+        self._buffer.append({**row, "time": time, "diff": 1 if is_addition else -1})
+        if len(self._buffer) >= self.flush_rows:
+            self.flush()
+
+    def on_time_end(self, time: int) -> None:
+        if self._buffer and self._clock() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def on_end(self) -> None:
+        self.flush()
+        self._close()
+
+    def flush(self) -> None:
+        self._last_flush = self._clock()
+        if not self._buffer:
+            return
+        if self._current is None or self._should_rotate():
+            self._rotate()
+        rows, self._buffer = self._buffer, []
+        if self.extension == ".parquet":
+            for row in rows:
+                for column in self._stringified:
+                    if row.get(column) is not None:
+                        row[column] = str(row[column])
+            table = self._pa.Table.from_pylist(rows, schema=self._writer.schema if self._writer else self._schema)
+            if self._writer is None:
+                self._writer = self._pa.parquet.ParquetWriter(self._current, table.schema)
+            self._writer.write_table(table)
+        else:
+            self._handle.write("".join(json.dumps(row, default=str) + "\n" for row in rows))
+            self._handle.flush()
+
+    def _should_rotate(self) -> bool:
+        too_old = self.rotate_seconds and self._clock() - self._opened_at >= self.rotate_seconds
+        too_big = self.rotate_bytes and os.path.getsize(self._current) >= self.rotate_bytes
+        return bool(too_old or too_big)
+
+    def _rotate(self) -> None:
+        self._close()
+        self._sequence += 1
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(self._clock()))
+        self._current = f"{self.base}-{stamp}-{self._sequence:04d}{self.extension}"
+        self._opened_at = self._clock()
+        directory = os.path.dirname(self._current)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.extension == ".jsonl":
+            self._handle = open(self._current, "w")
+        else:
+            # ParquetWriter is created on the first write, once the schema is known if not given
+            open(self._current, "wb").close()
+        self._prune()
+
+    def _close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def _prune(self) -> None:
+        if not self.keep_files:
+            return
+        # Only this sink's own files: another sink's `<base>-<name>` files share the prefix
+        directory, prefix = os.path.split(self.base)
+        pattern = re.compile(rf"^{re.escape(prefix)}-\d{{8}}T\d{{6}}-\d{{4}}{re.escape(self.extension)}$")
+        files = sorted(name for name in os.listdir(directory or ".") if pattern.match(name))
+        for stale in files[: -self.keep_files]:
+            os.remove(os.path.join(directory, stale))
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, Iterable, List, Literal, Mapping, NamedTuple, Optional, Tuple
+
+from microhack.metrics import WEBSOCKET_FANOUT_LAG
+
+Encoding = Literal["json", "msgpack"]
+
+
+class Update(NamedTuple):
+    """One engine change, numbered by the hub.
+
+    `current` is the key's row after the change, or None once it is gone; clients
+    that only want the latest state can ignore `row` and `is_addition`.
+    """
+
+    seq: int
+    key: str
+    row: Dict[str, Any]
+    time: int
+    is_addition: bool
+    current: Optional[Dict[str, Any]]
+
+
+def _require_msgpack():
+    try:
+        import msgpack
+    except ImportError as e:
+        raise ImportError("Binary WebSocket frames require msgpack: pip install msgpack") from e
+    return msgpack
+
+
+class Subscription:
+    """What a `/ws/stream` client asked for, parsed from the connection's query string.
+
+    - `keys`: comma-separated output keys to receive
+    - `group`: `column:value` filters on output rows, repeatable; rows must match one per column
+    - `since`: last sequence number seen, to resume after a reconnect
+    - `snapshot`: whether to start with the current state (default true)
+    - `max_fps`: upper bound on frames per second; updates in between are coalesced
+    - `encoding`: `json` text frames or `msgpack` binary frames
+    """
+
+    def __init__(
+        self,
+        keys: Iterable[str] = (),
+        groups: Iterable[Tuple[str, str]] = (),
+        since: Optional[int] = None,
+        snapshot: bool = True,
+        max_fps: float = 0,
+        encoding: Encoding = "json",
+    ):
+        if max_fps < 0:
+            raise ValueError("max_fps must not be negative")
+        if encoding not in ("json", "msgpack"):
+            raise ValueError(f"Unknown encoding '{encoding}', expected json or msgpack")
+        if encoding == "msgpack":
+            _require_msgpack()
+        self.keys = set(keys)
+        self.groups: Dict[str, set] = {}
+        for column, value in groups:
+            self.groups.setdefault(column, set()).add(value)
+        self.since = since
+        self.snapshot = snapshot
+        self.max_fps = max_fps
+        self.encoding = encoding
+
+    @classmethod
+    def from_query(cls, params) -> "Subscription":
+        """Build from the connection's Starlette `QueryParams`."""
+        groups = []
+        for item in params.getlist("group"):
+            column, separator, value = item.partition(":")
+            if not separator:
+                raise ValueError(f"Group filter '{item}' must look like column:value")
+            groups.append((column, value))
+        try:
+            since = int(params["since"]) if "since" in params else None
+            max_fps = float(params.get("max_fps", 0))
+        except ValueError as e:
+            raise ValueError(f"Invalid subscription parameter: {e}")
+        return cls(
+            keys=[key for value in params.getlist("keys") for key in value.split(",") if key],
+            groups=groups,
+            since=since,
+            snapshot=params.get("snapshot", "true").lower() not in ("false", "0", "no"),
+            max_fps=max_fps,
+            encoding=params.get("encoding", "json"),
+        )
+
+    def matches(self, key: str, row: Mapping[str, Any]) -> bool:
+        if self.keys and key not in self.keys:
+            return False
+        if not self.groups:
+            return True
+        return all(str(row.get(column)) in values for column, values in self.groups.items())
+
+    def encode(self, frame: Dict[str, Any]):
+        if self.encoding == "msgpack":
+            return _require_msgpack().packb(frame, default=str)
+        return json.dumps(frame, default=str)
+
+
+class StreamSubscriber:
+    """Per-client state for the subscription protocol.
+
+    Only the latest state of each matching key is kept between frames, so memory is
+    bounded by the number of subscribed keys and a slow client simply receives fewer,
+    fuller frames instead of falling behind.
+    """
+
+    def __init__(
+        self,
+        subscription: Subscription,
+        base_seq: int,
+        initial: Dict[str, Optional[Dict[str, Any]]],
+        initial_type: str = "snapshot",
+    ):
+        self.subscription = subscription
+        self.closed = False
+        # Updates superseded by a newer one for the same key before being sent
+        self.coalesced = 0
+        # Updates up to base_seq are already reflected in `initial`
+        self.seq = base_seq
+        self._pending: Dict[str, Optional[Dict[str, Any]]] = dict(initial)
+        self._pending_since: Optional[float] = time.monotonic()
+        self._frame_type = initial_type
+        self._force_frame = True
+        self._last_sent = float("-inf")
+        self._ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def offer(self, update, published_at: Optional[float] = None) -> None:
+        if self.closed or not isinstance(update, Update) or update.seq <= self.seq:
+            return
+        self.seq = update.seq
+        # Filter on the retracted row when the key is gone, so its deletion still reaches the client
+        if not self.subscription.matches(update.key, update.row if update.current is None else update.current):
+            return
+        if update.key in self._pending:
+            self.coalesced += 1
+        elif self._pending_since is None:
+            self._pending_since = time.monotonic() if published_at is None else published_at
+        self._pending[update.key] = update.current
+        self._ready.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self._pending.clear()
+        self._ready.set()
+
+    async def get(self):
+        """Wait for the next encoded frame; returns None once the subscriber is closed."""
+        while True:
+            if self.closed:
+                return None
+            if self._pending or self._force_frame:
+                wait = self._last_sent + self._interval() - time.monotonic()
+                if wait <= 0:
+                    return self._take_frame()
+                await asyncio.sleep(wait)
+                continue
+            self._ready.clear()
+            await self._ready.wait()
+
+    def _interval(self) -> float:
+        return 1 / self.subscription.max_fps if self.subscription.max_fps else 0
+
+    def _take_frame(self):
+        updates: List[Dict[str, Any]] = [
+            {"key": key, "row": row} if row is not None else {"key": key, "deleted": True}
+            for key, row in self._pending.items()
+        ]
+        frame = {"type": self._frame_type, "seq": self.seq, "updates": updates}
+        if self._pending_since is not None:
+            WEBSOCKET_FANOUT_LAG.observe(time.monotonic() - self._pending_since)
+        self._pending = {}
+        self._pending_since = None
+        self._frame_type = "update"
+        self._force_frame = False
+        self._last_sent = time.monotonic()
+        return self.subscription.encode(frame)
@@ -0,0 +1,19 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def to_epoch(value: Optional[str]) -> Optional[float]:
+    """Seconds since the epoch from a number or an ISO 8601 date-time (UTC unless it has an offset)."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
@@ -0,0 +1,139 @@
+import bisect
+import itertools
+import threading
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+Row = Dict[str, Any]
+
+
+class MaterializedView:
+    """Latest pipeline output rows, kept up to date from the change stream.
+
+    Rows are indexed by key, by time and by equality on `index_columns` (typically
+    the group-by columns). Time is the row's `time_column` when given (e.g.
+    `window_start`), otherwise the engine time of the row's last change. Queries
+    read only this structure, never the engine, and are ordered by (time, key) so
+    that they can be paginated with a cursor.
+    """
+
+    def __init__(self, index_columns: Iterable[str] = (), time_column: Optional[str] = None):
+        self.index_columns = list(index_columns)
+        self.time_column = time_column
+        self.rows: Dict[str, Row] = {}
+        self._times: Dict[str, Any] = {}
+        # Sorted (time, key) pairs
+        self._by_time: List[Tuple[Any, str]] = []
+        self._indexes: Dict[str, Dict[str, Set[str]]] = {column: {} for column in self.index_columns}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def apply(self, key: str, row: Row, time: int, is_addition: bool) -> None:
+        """Callback-compatible with `pw.io.subscribe`."""
+        with self._lock:
+            if is_addition:
+                row_time = row.get(self.time_column) if self.time_column else None
+                self._remove(key)
+                self._insert(key, row, time if row_time is None else row_time)
+            elif self.rows.get(key) == row:
+                # The retraction may arrive after the replacing insertion
+                self._remove(key)
+
+    def _insert(self, key: str, row: Row, time: Any) -> None:
+        self.rows[key] = row
+        self._times[key] = time
+        bisect.insort(self._by_time, (time, key))
+        for column, index in self._indexes.items():
+            index.setdefault(str(row.get(column)), set()).add(key)
+
+    def _remove(self, key: str) -> None:
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        time = self._times.pop(key)
+        position = bisect.bisect_left(self._by_time, (time, key))
+        del self._by_time[position]
+        for column, index in self._indexes.items():
+            keys = index[str(row.get(column))]
+            keys.discard(key)
+            if not keys:
+                del index[str(row.get(column))]
+
+    def get(self, key: str) -> Optional[Row]:
+        return self.rows.get(key)
+
+    def entries(self) -> List[Tuple[str, Row, Any]]:
+        """(key, row, time) of every row, enough to rebuild the view elsewhere."""
+        with self._lock:
+            return [(key, row, self._times[key]) for key, row in self.rows.items()]
+
+    def empty(self) -> "MaterializedView":
+        """A new view with the same indexes."""
+        return MaterializedView(self.index_columns, self.time_column)
+
+    def query(
+        self,
+        filters: Optional[Mapping[str, str]] = None,
+        time_from: Optional[float] = None,
+        time_to: Optional[float] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Row], Optional[str]]:
+        """Rows matching all equality `filters` with `time_from <= time < time_to`.
+
+        Returns one page of at most `limit` rows, each with its `key` and `time`,
+        and the cursor of the next page (None on the last one).
+        """
+        filters = dict(filters or {})
+        with self._lock:
+            candidates = self._candidates(filters)
+            if candidates is None:
+                entries = self._by_time
+            else:
+                # Few keys match an indexed filter; order just those instead of scanning all
+                entries = sorted((self._times[key], key) for key in candidates)
+            start = self._start(entries, time_from, cursor)
+            page: List[Row] = []
+            for time, key in itertools.islice(entries, start, None):
+                if time_to is not None and time >= time_to:
+                    break
+                row = self.rows[key]
+                if any(str(row.get(column)) != value for column, value in filters.items()):
+                    continue
+                if len(page) == limit:
+                    return page, self._cursor(page[-1]["time"], page[-1]["key"])
+                page.append({"key": key, "time": time, **row})
+        return page, None
+
+    def _candidates(self, filters: Mapping[str, str]) -> Optional[Set[str]]:
+        """Keys allowed by the indexed filters, or None when no filter is indexed."""
+        candidates = None
+        for column, value in filters.items():
+            if column in self._indexes:
+                keys = self._indexes[column].get(value, set())
+                candidates = keys if candidates is None else candidates & keys
+        return candidates
+
+    def _start(self, entries: List[Tuple[Any, str]], time_from: Optional[float], cursor: Optional[str]) -> int:
+        """Position of the first (time, key) entry at or after `time_from` and after `cursor`."""
+        start = 0
+        if time_from is not None:
+            start = bisect.bisect_left(entries, (time_from,))
+        if cursor is not None:
+            start = max(start, bisect.bisect_right(entries, self._parse_cursor(cursor)))
+        return start
+
+    @staticmethod
+    def _cursor(time: Any, key: str) -> str:
+        return f"{time}|{key}"
+
+    @staticmethod
+    def _parse_cursor(cursor: str) -> Tuple[Any, str]:
+        time, separator, key = cursor.partition("|")
+        if not separator:
+            raise ValueError(f"Invalid cursor '{cursor}'")
+        try:
+            return (int(time) if time.lstrip("-").isdigit() else float(time)), key
+        except ValueError:
+            raise ValueError(f"Invalid cursor '{cursor}'")
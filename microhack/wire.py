@@ -0,0 +1,203 @@
+"""Schema-bound MessagePack input format (INPUT_FORMAT=msgpack).
+
+A message is a MessagePack map holding a batch of rows, column names once:
+
+    {"columns": ["value", "timestamp"], "rows": [[10, 1700000000.0], [25, null]]}
+
+Columns must belong to the input schema and include every column without a
+default; the others are filled with their defaults. Each value is checked
+against its column type. A message that breaks these rules is rejected whole; a
+row of the wrong length or with a value of the wrong type is skipped. Both are
+counted in `microhack_input_rejected_total`.
+"""
+
+import json
+import time
+import typing
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from microhack.metrics import INPUT_REJECTED
+
+_MISSING = object()
+
+
+def require_msgpack():
+    try:
+        import msgpack
+    except ImportError as e:
+        raise ImportError("INPUT_FORMAT=msgpack requires msgpack: pip install msgpack") from e
+    return msgpack
+
+
+def _allowed_types(hint: Any) -> Optional[frozenset]:
+    """Python types a decoded value of a column may have; None accepts anything."""
+    allowed = set()
+    if typing.get_origin(hint) is typing.Union:
+        arguments = typing.get_args(hint)
+    else:
+        arguments = (hint,)
+    for argument in arguments:
+        if argument is type(None):
+            allowed.add(type(None))
+        elif argument is float:
+            # MessagePack encodes integral floats from some producers as ints
+            allowed.update((float, int))
+        elif argument in (int, str, bool, bytes):
+            allowed.add(argument)
+        else:
+            return None
+    return frozenset(allowed)
+
+
+class RowCodec:
+    """Encodes and validates batches of rows for a fixed set of typed columns."""
+
+    def __init__(self, types: Dict[str, Any], defaults: Optional[Dict[str, Any]] = None):
+        self.types = dict(types)
+        self.defaults = dict(defaults or {})
+        self.columns = list(self.types)
+        self._allowed = {column: _allowed_types(hint) for column, hint in self.types.items()}
+        # Columns whose ints are converted to floats
+        self._floats = {column for column, hint in self.types.items() if float in (hint, *typing.get_args(hint))}
+
+    @classmethod
+    def from_schema(cls, schema) -> "RowCodec":
+        """Codec for a Pathway schema such as `input_schema()`."""
+        return cls(schema.typehints(), schema.default_values())
+
+    def encode(self, records: Sequence[Dict[str, Any]]) -> bytes:
+        """One message holding `records`, with the schema columns any of them has."""
+        present = set()
+        for record in records:
+            present.update(record)
+        unknown = present - set(self.types)
+        if unknown:
+            raise ValueError(f"Columns not in the input schema: {sorted(unknown)}")
+        columns = [column for column in self.columns if column in present]
+        rows = [[record.get(column, self.defaults.get(column)) for column in columns] for record in records]
+        return require_msgpack().packb({"columns": columns, "rows": rows}, use_bin_type=True)
+
+    def _layout(self, header: Any) -> List[Tuple[int, Optional[frozenset], bool, Any]]:
+        """Per schema column: its position in the message rows (-1 if absent), allowed types,
+        whether ints become floats, and default."""
+        if not isinstance(header, list) or not all(isinstance(column, str) for column in header):
+            raise ValueError("'columns' must be a list of column names")
+        unknown = [column for column in header if column not in self.types]
+        if unknown:
+            raise ValueError(f"Columns not in the input schema: {unknown}")
+        positions = {column: index for index, column in enumerate(header)}
+        layout = []
+        for column in self.columns:
+            default = self.defaults.get(column, _MISSING)
+            if column not in positions and default is _MISSING:
+                raise ValueError(f"Missing column '{column}'")
+            layout.append((positions.get(column, -1), self._allowed[column], column in self._floats, default))
+        return layout
+
+    def decode(self, message: bytes, strict: bool = False) -> List[tuple]:
+        """Rows of a message as tuples in schema column order.
+
+        `strict` raises ValueError for an invalid message or row instead of skipping it.
+        """
+        msgpack = require_msgpack()
+        try:
+            batch = msgpack.unpackb(message, raw=False)
+            if not isinstance(batch, dict) or not isinstance(batch.get("rows"), list):
+                raise ValueError("Expected a map with 'columns' and 'rows'")
+            layout = self._layout(batch.get("columns"))
+        except ValueError as e:
+            if strict:
+                raise
+            INPUT_REJECTED.inc(kind="message")
+            print(f"Rejected input message: {e}")
+            return []
+
+        rows = batch["rows"]
+        if not rows:
+            return []
+        width = len(batch["columns"])
+        # Validated a column at a time, with the per-value work in C (map, set, zip)
+        if set(map(type, rows)) == {list} and set(map(len, rows)) == {width}:
+            columns = list(zip(*rows)) if width else []
+            decoded = []
+            for position, allowed, floats, default in layout:
+                if position < 0:
+                    decoded.append([default] * len(rows))
+                    continue
+                values = columns[position]
+                types = set(map(type, values))
+                if allowed is not None and not types <= allowed:
+                    break
+                if floats and int in types:
+                    values = [value if value is None else float(value) for value in values]
+                decoded.append(values)
+            else:
+                return list(zip(*decoded))
+        return self._decode_rows(rows, width, layout, strict)
+
+    def _decode_rows(self, rows: List[Any], width: int, layout, strict: bool) -> List[tuple]:
+        """Row by row, skipping invalid rows; for batches failing the column-wise checks."""
+        decoded = []
+        rejected = 0
+        for row in rows:
+            if not isinstance(row, list) or len(row) != width:
+                rejected += 1
+                continue
+            values = []
+            for position, allowed, floats, default in layout:
+                if position < 0:
+                    values.append(default)
+                    continue
+                value = row[position]
+                if allowed is not None and type(value) not in allowed:
+                    break
+                values.append(float(value) if floats and type(value) is int else value)
+            else:
+                decoded.append(tuple(values))
+                continue
+            rejected += 1
+        if rejected and strict:
+            raise ValueError(f"{rejected} of {len(rows)} rows do not match the input schema")
+        if rejected:
+            INPUT_REJECTED.inc(rejected, kind="row")
+        return decoded
+
+    def decode_records(self, message: bytes, strict: bool = False) -> List[Dict[str, Any]]:
+        """Rows of a message as dicts of every schema column."""
+        return [dict(zip(self.columns, row)) for row in self.decode(message, strict)]
+
+
+def benchmark_decode(records: List[Dict[str, Any]], batch_size: int, repeat: int = 3) -> Dict[str, Any]:
+    """Decode cost and size per event: one JSON message per event, JSON arrays of `batch_size`
+    events, and schema-bound MessagePack batches (validation included).
+
+    JSON is decoded by the `json` module here, while the engine's own JSON parser is
+    native code; compare end-to-end throughput with the pipeline benchmark too.
+    """
+    types = {column: type(value) for column, value in records[0].items()}
+    codec = RowCodec(types)
+    batches = [records[start : start + batch_size] for start in range(0, len(records), batch_size)]
+    encoded = {
+        "json": [json.dumps(record).encode("utf-8") for record in records],
+        "json_batch": [json.dumps(batch).encode("utf-8") for batch in batches],
+        "msgpack": [codec.encode(batch) for batch in batches],
+    }
+    decoders = {"json": json.loads, "json_batch": json.loads, "msgpack": codec.decode}
+
+    results = {}
+    for name, messages in encoded.items():
+        decode = decoders[name]
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for message in messages:
+                decode(message)
+            best = min(best, time.perf_counter() - start)
+        results[name] = {
+            "us_per_event": best / len(records) * 1e6,
+            "bytes_per_event": sum(len(message) for message in messages) / len(records),
+        }
+    for name in ("json_batch", "msgpack"):
+        results[name]["speedup_vs_json"] = results["json"]["us_per_event"] / results[name]["us_per_event"]
+        results[name]["size_vs_json"] = results[name]["bytes_per_event"] / results["json"]["bytes_per_event"]
+    return {"events": len(records), "batch_size": batch_size, "formats": results}
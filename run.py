@@ -1,15 +1,38 @@
+import signal
+import sys
+
+from microhack.checkpoint import persistence_config
 from microhack.config import get_settings
 from microhack.input import input
+from microhack.instrumentation import observe_input, observe_output
+from microhack.metrics import serve
 from microhack.output import output
-from microhack.pipeline import pipeline
+from microhack.profiling import get_profiler, profile_routes, track_pipelines
+from microhack.registry import MAIN, build_pipelines, input_columns, load_pipelines
+from microhack.scaleout import metrics_port, relaunch_with_workers
 
 import pathway as pw
 
 if __name__ == "__main__":
-    get_settings()
+    settings = get_settings()
+    relaunch_with_workers(settings)
+
+    # Every pipeline in PIPELINES reads the same input table, consumed and parsed once
+    definitions = load_pipelines(settings)
+    input_table = input(input_columns(definitions))
+    output_tables = build_pipelines(input_table, definitions)
+    for definition in definitions:
+        output(output_tables[definition.name], definition.output_path)
+    track_pipelines(input_table, output_tables)
+
+    if settings.metrics_port:
+        observe_input(input_table, settings.input_connector)
+        observe_output(output_tables[MAIN])
+        serve(metrics_port(settings), routes=profile_routes())
 
-    input_table = input()
-    output_table = pipeline(input_table)
-    output(output_table)
+    if get_profiler():
+        # Exit through Python on `docker stop`, so the profile is written
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
 
-    pw.run(monitoring_level=pw.MonitoringLevel.ALL)
+    # Resumes from the last snapshot in PERSISTENCE_PATH, if any
+    pw.run(monitoring_level=pw.MonitoringLevel.ALL, persistence_config=persistence_config(settings))
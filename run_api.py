@@ -1,11 +1,44 @@
+import argparse
+import os
+import secrets
+import tempfile
+
 import uvicorn
-from microhack.api import app
+
+from microhack.config import get_settings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve the MicroHack API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers", type=int, default=get_settings().api_workers, help="worker processes sharing one pipeline"
+    )
+    parser.add_argument("--reload", action="store_true", help="restart on code changes (single worker only)")
+    return parser.parse_args()
+
+
+def serve_shared_pipeline() -> None:
+    """Run the pipeline in this process and point the workers about to be spawned at it."""
+    from microhack.api import start_pipeline
+    from microhack.input import get_ingest_subject
+    from microhack.shared_pipeline import PipelineServer
+
+    address = os.path.join(tempfile.mkdtemp(prefix="microhack-"), "pipeline.sock")
+    authkey = secrets.token_bytes(32)
+    server = PipelineServer(address, authkey, push=lambda records, typed: get_ingest_subject().push(records, typed))
+    start_pipeline(server.on_change)
+    server.start()
+    os.environ["PIPELINE_ADDRESS"] = address
+    os.environ["PIPELINE_AUTHKEY"] = authkey.hex()
+    print(f"Serving the shared pipeline at {address}")
+
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "microhack.api:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    ) 
\ No newline at end of file
+    args = parse_args()
+    if args.workers > 1:
+        serve_shared_pipeline()
+        uvicorn.run("microhack.api:app", host=args.host, port=args.port, workers=args.workers, log_level="info")
+    else:
+        uvicorn.run("microhack.api:app", host=args.host, port=args.port, reload=args.reload, log_level="info")
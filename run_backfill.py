@@ -0,0 +1,47 @@
+import argparse
+
+from microhack.backfill import backfill_input
+from microhack.config import get_settings
+from microhack.input import input
+from microhack.output import output
+from microhack.profiling import track_pipelines
+from microhack.registry import build_pipelines, input_columns, load_pipelines
+from microhack.scaleout import relaunch_with_workers
+
+import pathway as pw
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Recompute the pipeline's results over historical CSV/JSONL files")
+    parser.add_argument("paths", nargs="+", help="directories or glob patterns of .csv and .jsonl files")
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="keep running on INPUT_CONNECTOR afterwards, on top of the backfilled results",
+    )
+    parser.add_argument("--shards", type=int, default=0, help="file groups read in parallel; 0 = one per worker")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    settings = get_settings()
+    relaunch_with_workers(settings)
+
+    definitions = load_pipelines(settings)
+    shards = args.shards or settings.pathway_processes * settings.pathway_threads
+    history = backfill_input(args.paths, input_columns(definitions), shards)
+    if args.stream:
+        if settings.input_connector == "google_drive":
+            raise SystemExit("--stream needs an input with the same schema: python, http or kafka")
+        # History and live events feed the same aggregates; results cover both
+        input_table = history.concat_reindex(input(input_columns(definitions)))
+    else:
+        input_table = history
+
+    output_tables = build_pipelines(input_table, definitions)
+    for definition in definitions:
+        output(output_tables[definition.name], definition.output_path)
+    track_pipelines(input_table, output_tables)
+    # Without --stream the run ends once every file is read, leaving the final results in the output paths
+    pw.run(monitoring_level=pw.MonitoringLevel.ALL)
@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import sys
+
+from microhack.loadgen import LoadGenerator
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure pipeline() throughput and latency under synthetic load")
+    parser.add_argument("--events", type=int, default=100_000, help="events per run")
+    parser.add_argument("--rate", type=float, default=0, help="events per second, 0 for as fast as possible")
+    parser.add_argument("--payload-width", type=int, default=0, help="extra string fields per event")
+    parser.add_argument("--key-cardinality", type=int, default=100, help="distinct group-by keys")
+    parser.add_argument("--burstiness", type=float, default=1.0, help="peak-to-mean rate ratio")
+    parser.add_argument("--batch-size", type=int, default=1000, help="events generated per batch")
+    parser.add_argument("--threads", default="1,2,4", help="comma-separated PATHWAY_THREADS values")
+    parser.add_argument("--autocommit-ms", default="10,100,1000", help="comma-separated autocommit durations")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", default="benchmarks/baseline.json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression, as a fraction")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument(
+        "--scaling", action="store_true", help="measure throughput from 1 to N processes over a partitioned topic"
+    )
+    parser.add_argument("--processes", default="1,2,4", help="comma-separated process counts for --scaling")
+    parser.add_argument("--partitions", type=int, default=8, help="in-memory topic partitions for --scaling")
+    parser.add_argument(
+        "--kafka-bootstrap", help="Kafka bootstrap servers for --scaling, instead of the in-memory topic"
+    )
+    parser.add_argument(
+        "--topic", default="microhack-benchmark", help="topic for --scaling, with a partition per process or more"
+    )
+    parser.add_argument(
+        "--api", action="store_true", help="load run_api.py with concurrent HTTP and WebSocket clients instead"
+    )
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated API worker counts for --api")
+    parser.add_argument("--http-clients", type=int, default=200, help="concurrent HTTP clients for --api")
+    parser.add_argument("--ws-clients", type=int, default=100, help="concurrent WebSocket clients for --api")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of load per worker count for --api")
+    parser.add_argument("--ingest-ratio", type=float, default=0.1, help="share of HTTP requests that ingest")
+    parser.add_argument("--port", type=int, default=8100, help="port of the API started by --api")
+    parser.add_argument(
+        "--decode", action="store_true", help="compare the decode cost of JSON and MessagePack input messages"
+    )
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--partition-worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--kafka-worker", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def generator_args(args):
+    return [
+        "--events",
+        str(args.events),
+        "--rate",
+        str(args.rate),
+        "--payload-width",
+        str(args.payload_width),
+        "--key-cardinality",
+        str(args.key_cardinality),
+        "--burstiness",
+        str(args.burstiness),
+        "--batch-size",
+        str(args.batch_size),
+        "--partitions",
+        str(args.partitions),
+    ]
+
+
+def run_scaling_report(args):
+    from microhack.benchmark import produce_events, run_partitioned, run_scaling
+
+    if args.kafka_bootstrap:
+        generator = LoadGenerator(
+            payload_width=args.payload_width, key_cardinality=args.key_cardinality, total=args.events
+        )
+        produced = produce_events(args.kafka_bootstrap, args.topic, generator)
+        print(f"Produced {produced} events to {args.topic}", file=sys.stderr)
+
+    # One engine thread per process, so the speedup comes from processes (and their GILs)
+    autocommit_ms = int(args.autocommit_ms.split(",")[0])
+    results = []
+    for processes in [int(value) for value in args.processes.split(",")]:
+        if args.kafka_bootstrap:
+            result = run_scaling(processes, 1, autocommit_ms, args.events, args.kafka_bootstrap, args.topic)
+        else:
+            result = run_partitioned(processes, 1, autocommit_ms, generator_args(args))
+        result["speedup"] = result["events_per_sec"] / results[0]["events_per_sec"] if results else 1.0
+        print(
+            f"processes={processes}: {result['events_per_sec']:.0f} events/s, speedup {result['speedup']:.2f}x",
+            file=sys.stderr,
+        )
+        results.append(result)
+    topic = {"topic": args.topic} if args.kafka_bootstrap else {"partitions": args.partitions}
+    return {**topic, "autocommit_ms": autocommit_ms, "results": results}
+
+
+def run_api_report(args):
+    from microhack.loadtest import run_api_load
+
+    results = []
+    for workers in [int(value) for value in args.workers.split(",")]:
+        result = run_api_load(
+            workers, args.port, args.http_clients, args.ws_clients, args.duration, args.ingest_ratio, args.batch_size
+        )
+        print(
+            f"workers={workers}: {result['requests_per_sec']:.0f} requests/s, "
+            f"p50 {result['p50_latency_ms']:.1f} ms, p99 {result['p99_latency_ms']:.1f} ms, "
+            f"{result['ws_frames_per_sec']:.0f} WebSocket frames/s, {result['errors']} errors, "
+            f"{'consistent' if result['consistent'] else 'INCONSISTENT'} results",
+            file=sys.stderr,
+        )
+        results.append(result)
+    return {"batch_size": args.batch_size, "ingest_ratio": args.ingest_ratio, "results": results}
+
+
+def run_decode_report(args):
+    from microhack.wire import benchmark_decode
+
+    generator = LoadGenerator(payload_width=args.payload_width, key_cardinality=args.key_cardinality)
+    report = benchmark_decode([generator.record(seq) for seq in range(args.events)], args.batch_size)
+    for name, result in report["formats"].items():
+        relative = (
+            f", {result['speedup_vs_json']:.1f}x faster, {result['size_vs_json']:.0%} of the size"
+            if "speedup_vs_json" in result
+            else ""
+        )
+        print(
+            f"{name}: {result['us_per_event']:.2f} us/event, {result['bytes_per_event']:.0f} bytes/event{relative}",
+            file=sys.stderr,
+        )
+    return report
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.partition_worker:
+        from microhack.benchmark import run_partition_worker
+        from microhack.fake_broker import FakeBroker
+
+        # Every process builds the same topic and consumes only its own partitions
+        broker = FakeBroker(args.partitions)
+        generator = LoadGenerator(
+            payload_width=args.payload_width, key_cardinality=args.key_cardinality, total=args.events
+        )
+        for batch in generator.batches(args.batch_size):
+            broker.produce_all(batch)
+        print(json.dumps(run_partition_worker(broker, args.batch_size, int(args.autocommit_ms))))
+        sys.exit(0)
+
+    if args.kafka_worker is not None:
+        from microhack.benchmark import run_kafka_worker
+
+        run_kafka_worker(args.kafka_worker)
+        sys.exit(0)
+
+    if args.scaling or args.api or args.decode:
+        if args.decode:
+            report = run_decode_report(args)
+        else:
+            report = run_api_report(args) if args.api else run_scaling_report(args)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+        else:
+            print(json.dumps(report, indent=2))
+        sys.exit(0)
+
+    from microhack.benchmark import baseline_from, find_regressions, run_in_subprocess, run_single
+
+    if args.single:
+        generator = LoadGenerator(
+            rate=args.rate,
+            payload_width=args.payload_width,
+            key_cardinality=args.key_cardinality,
+            burstiness=args.burstiness,
+            total=args.events,
+        )
+        result = run_single(generator, args.batch_size, int(args.autocommit_ms))
+        print(json.dumps(result))
+        sys.exit(0)
+
+    results = []
+    for threads in [int(value) for value in args.threads.split(",")]:
+        for autocommit_ms in [int(value) for value in args.autocommit_ms.split(",")]:
+            result = run_in_subprocess(threads, autocommit_ms, generator_args(args))
+            print(
+                f"threads={threads} autocommit_ms={autocommit_ms}: {result['events_per_sec']:.0f} events/s, "
+                f"p50 {result['p50_latency_ms']:.1f} ms, p99 {result['p99_latency_ms']:.1f} ms, "
+                f"peak RSS {result['peak_rss_mb']:.0f} MB",
+                file=sys.stderr,
+            )
+            results.append(result)
+
+    generator = {
+        "events": args.events,
+        "rate": args.rate,
+        "payload_width": args.payload_width,
+        "key_cardinality": args.key_cardinality,
+        "burstiness": args.burstiness,
+        "batch_size": args.batch_size,
+    }
+    report = {"generator": generator, "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline_from(results), f, indent=2)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+    else:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one", file=sys.stderr)
@@ -0,0 +1,41 @@
+import os
+
+from microhack.backfill import find_files, shard_files, stage_shards
+
+
+def write(path, size):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_find_files_in_directories_and_globs(tmp_path):
+    csv = write(tmp_path / "a" / "day-1.csv", 1)
+    jsonl = write(tmp_path / "a" / "nested" / "dump.jsonl", 1)
+    write(tmp_path / "a" / "notes.txt", 1)
+    other = write(tmp_path / "b" / "day-2.CSV", 1)
+
+    assert find_files([str(tmp_path / "a")]) == sorted([csv, jsonl])
+    assert find_files([str(tmp_path / "*" / "*.CSV"), str(tmp_path / "a")]) == sorted([csv, jsonl, other])
+
+
+def test_shards_balance_sizes_deterministically(tmp_path):
+    files = [write(tmp_path / f"{i}.csv", size) for i, size in enumerate([50, 40, 30, 20, 10, 10])]
+
+    shards = shard_files(files, 3)
+
+    assert sorted(path for shard in shards for path in shard) == sorted(files)
+    assert [sum(os.path.getsize(path) for path in shard) for shard in shards] == [60, 50, 50]
+    assert shard_files(list(reversed(files)), 3) == shards
+
+
+def test_stage_shards_links_files_by_format(tmp_path):
+    files = [write(tmp_path / "in" / "a.csv", 2), write(tmp_path / "in" / "b.jsonl", 1)]
+
+    staged = stage_shards(files, 2, str(tmp_path / "staged"))
+    # Staging again, e.g. from another process, is harmless
+    assert stage_shards(files, 2, str(tmp_path / "staged")) == staged
+
+    assert [sorted(directories) for directories in staged] == [["csv"], ["jsonlines"]]
+    [link] = os.listdir(staged[0]["csv"])
+    assert os.path.realpath(os.path.join(staged[0]["csv"], link)) == os.path.realpath(files[0])
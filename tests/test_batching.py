@@ -0,0 +1,57 @@
+from microhack.batching import CommitController
+from microhack.metrics import COMMIT_BATCH_TARGET, COMMIT_DECISIONS
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def feed(controller, clock, rows_per_second, seconds):
+    """Emit rows one by one at a steady rate; returns the sizes of the commits made."""
+    commits = []
+    for _ in range(int(rows_per_second * seconds)):
+        clock.now += 1 / rows_per_second
+        committed = controller.add()
+        if committed:
+            commits.append(committed)
+    return commits
+
+
+def test_static_controller_commits_every_batch_size_rows():
+    controller = CommitController("test-static", batch_size=3)
+    assert [controller.add() for _ in range(7)] == [0, 0, 3, 0, 0, 3, 0]
+    assert controller.flush() == 1
+    assert controller.flush() == 0
+    assert controller.timeout() is None
+
+
+def test_adaptive_batches_follow_load():
+    clock = FakeClock()
+    controller = CommitController("test-adaptive", 1, latency_target=0.1, max_batch=5000, clock=clock)
+
+    commits = feed(controller, clock, rows_per_second=10_000, seconds=2)
+    # About 100ms worth of rows per commit at peak
+    assert 800 <= controller.batch_size <= 1000
+    assert len(commits) < 100
+    assert COMMIT_BATCH_TARGET.value(connector="test-adaptive") == controller.batch_size
+
+    feed(controller, clock, rows_per_second=5, seconds=5)
+    assert controller.batch_size == 1
+
+
+def test_adaptive_commits_pending_rows_at_the_deadline():
+    clock = FakeClock()
+    controller = CommitController("test-deadline", 1, latency_target=0.1, clock=clock)
+    controller.batch_size = 1000
+
+    assert controller.add(10) == 0
+    clock.now += 0.04
+    assert abs(controller.timeout() - 0.06) < 1e-9
+    clock.now += 0.06
+    assert controller.add(0) == 10
+    assert controller.timeout() is None
+    assert COMMIT_DECISIONS.value(connector="test-deadline", reason="deadline") == 1
@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+from microhack.broadcast import BroadcastHub, Subscriber
+
+
+def test_drop_oldest_keeps_newest_messages():
+    subscriber = Subscriber(queue_size=2, policy="drop_oldest")
+    for message in ["a", "b", "c"]:
+        subscriber.offer(message)
+
+    assert asyncio.run(subscriber.get()) == "b"
+    assert asyncio.run(subscriber.get()) == "c"
+    assert subscriber.dropped == 1
+
+
+def test_latest_keeps_only_last_message():
+    subscriber = Subscriber(queue_size=10, policy="latest")
+    for message in ["a", "b", "c"]:
+        subscriber.offer(message)
+
+    assert len(subscriber) == 1
+    assert asyncio.run(subscriber.get()) == "c"
+
+
+def test_disconnect_closes_overflowing_subscriber():
+    subscriber = Subscriber(queue_size=1, policy="disconnect")
+    subscriber.offer("a")
+    subscriber.offer("b")
+
+    assert subscriber.closed
+    assert asyncio.run(subscriber.get()) is None
+
+
+def test_hub_fans_out_engine_updates_to_all_subscribers():
+    async def scenario():
+        hub = BroadcastHub(queue_size=10)
+        hub.attach(asyncio.get_running_loop())
+        first, second = hub.subscribe(), hub.subscribe()
+
+        # pw.io.subscribe invokes the callback from the engine thread
+        await asyncio.to_thread(hub.on_change, 1, {"sum": 6}, 42, True)
+
+        return await first.get(), await second.get()
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert json.loads(first) == {"key": "1", "sum": 6, "timestamp": 42, "is_addition": True}
+
+
+def test_hub_drops_disconnected_subscribers():
+    async def scenario():
+        hub = BroadcastHub(queue_size=1, policy="disconnect")
+        hub.attach(asyncio.get_running_loop())
+        hub.subscribe()
+        hub.publish("a")
+        hub.publish("b")
+        await asyncio.sleep(0)
+        return hub.subscriber_count
+
+    assert asyncio.run(scenario()) == 0
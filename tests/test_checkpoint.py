@@ -0,0 +1,60 @@
+import os
+
+import pandas as pd
+import pytest
+
+from microhack.checkpoint import load_checkpoint, remove_checkpoint, save_checkpoint, shard_path
+from microhack.fake_drive import FakeDriveService
+from microhack.google_drive import DriveFilePoller
+from microhack.row_diff import RowDiffer
+
+
+def test_checkpoint_round_trips_and_replaces_atomically(tmp_path):
+    path = str(tmp_path / "state" / "google_drive.json")
+    assert load_checkpoint(path) is None
+
+    save_checkpoint(path, {"revision": "abc", "hashes": {"k": 2**63 + 1}})
+    save_checkpoint(path, {"revision": "def", "hashes": {"k": 2**63 + 1}})
+
+    assert load_checkpoint(path) == {"revision": "def", "hashes": {"k": 2**63 + 1}}
+    assert os.listdir(tmp_path / "state") == ["google_drive.json"]
+
+
+@pytest.mark.parametrize("use_changes_feed", [False, True])
+def test_restored_poller_and_differ_skip_unchanged_content(tmp_path, use_changes_feed):
+    service = FakeDriveService()
+    file_id = service.put_file("a.csv", b"value\n1\n2\n")
+    df = pd.DataFrame({"value": [1, 2]})
+    path = str(tmp_path / "google_drive.json")
+
+    poller = DriveFilePoller(service, file_id, use_changes_feed)
+    differ = RowDiffer()
+    differ.diff(df)
+    poller.acknowledge(poller.poll())
+    save_checkpoint(path, {"poller": poller.state(), "hashes": differ.hashes})
+
+    # A fresh process resumes from the checkpoint
+    state = load_checkpoint(path)
+    restarted = DriveFilePoller(service, file_id, use_changes_feed)
+    restarted.restore(state["poller"])
+    restarted_differ = RowDiffer()
+    restarted_differ.hashes = state["hashes"]
+
+    assert restarted.poll() is None
+    assert restarted_differ.diff(df).size == 0
+
+    service.put_file("a.csv", b"value\n1\n3\n")
+    assert restarted.poll() is not None
+
+
+def test_shards_are_saved_and_removed_on_their_own(tmp_path):
+    path = str(tmp_path / "google_drive.json")
+    save_checkpoint(shard_path(path, "a"), {"hashes": {"k": 1}})
+    save_checkpoint(shard_path(path, "b"), {"hashes": {"k": 2}})
+
+    remove_checkpoint(shard_path(path, "a"))
+    remove_checkpoint(shard_path(path, "a"))
+
+    assert load_checkpoint(shard_path(path, "a")) is None
+    assert load_checkpoint(shard_path(path, "b")) == {"hashes": {"k": 2}}
+    assert sorted(os.listdir(tmp_path)) == ["google_drive.json.d"]
@@ -0,0 +1,75 @@
+import os
+
+import pandas as pd
+
+from microhack.drive_cache import DriveCache
+from microhack.fake_drive import FakeDriveService
+from microhack.google_drive import GoogleDriveConnector
+
+CSV = b"value,category\n" + b"".join(b"%d,A\n" % i for i in range(100))
+
+
+def test_parsed_batches_are_served_from_disk_for_the_same_revision(tmp_path):
+    service = FakeDriveService()
+    file_id = service.put_file("a.csv", CSV)
+    drive = GoogleDriveConnector(service=service, cache=DriveCache(str(tmp_path)))
+    info = service.files().get(fileId=file_id).execute()
+
+    first = pd.concat(drive.iter_file_batches(info, batch_size=30))
+    second = pd.concat(drive.iter_file_batches(info, batch_size=30))
+
+    pd.testing.assert_frame_equal(first, second)
+    assert service.calls["media"] == 1
+    assert (drive.cache.hits, drive.cache.misses) == (1, 1)
+
+    # A new revision is a miss; the cache survives a restart
+    service.put_file("a.csv", CSV + b"100,B\n")
+    info = service.files().get(fileId=file_id).execute()
+    restarted = GoogleDriveConnector(service=service, cache=DriveCache(str(tmp_path)))
+    assert len(pd.concat(restarted.iter_file_batches(info, batch_size=30))) == 101
+    assert restarted.cache.misses == 1
+
+
+def test_abandoned_download_leaves_no_entry(tmp_path):
+    service = FakeDriveService()
+    file_id = service.put_file("a.csv", CSV)
+    cache = DriveCache(str(tmp_path))
+    drive = GoogleDriveConnector(service=service, cache=cache)
+    info = service.files().get(fileId=file_id).execute()
+
+    batches = drive.iter_file_batches(info, batch_size=30)
+    next(batches)
+    batches.close()
+
+    assert os.listdir(tmp_path) == []
+    assert cache.get_frames(file_id, "any", 30) is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DriveCache(str(tmp_path), max_bytes=250)
+    cache.put_content("a", "r1", b"x" * 100)
+    cache.put_content("b", "r1", b"x" * 100)
+    assert cache.get_content("a", "r1") is not None
+
+    cache.put_content("c", "r1", b"x" * 100)
+
+    assert cache.get_content("b", "r1") is None
+    assert cache.get_content("a", "r1") is not None
+    assert cache.get_content("c", "r1") is not None
+    assert cache.size == 200
+
+
+def test_entries_being_read_are_not_evicted(tmp_path):
+    cache = DriveCache(str(tmp_path), max_bytes=1)
+    frames = [pd.DataFrame({"value": range(start, start + 10)}) for start in (0, 10)]
+    list(cache.put_frames("a", "r1", 10, iter(frames)))
+
+    cached = cache.get_frames("a", "r1", 10)
+    next(cached)
+    # Over budget, but "a" is being read
+    cache.put_content("b", "r1", b"x" * 100)
+    pd.testing.assert_frame_equal(next(cached), frames[1])
+
+    cached.close()
+    assert cache.get_frames("a", "r1", 10) is None
+    assert cache.get_content("b", "r1") is not None
@@ -0,0 +1,20 @@
+from microhack.fake_broker import FakeBroker, assign_partitions, partition_for
+
+
+def test_partitions_are_split_evenly_across_workers():
+    assignments = [assign_partitions(8, 3, worker) for worker in range(3)]
+
+    assert assignments == [[0, 3, 6], [1, 4, 7], [2, 5]]
+    assert sorted(sum(assignments, [])) == list(range(8))
+
+
+def test_broker_keeps_keys_in_one_partition_in_order():
+    broker = FakeBroker(partitions=4)
+    broker.produce_all({"key": f"k{seq % 5}", "seq": seq} for seq in range(100))
+
+    partition = partition_for("k3", 4)
+    records = [record for record in broker.consume(partition, 0, 1000) if record["key"] == "k3"]
+
+    assert [record["seq"] for record in records] == list(range(3, 100, 5))
+    assert broker.size() == 100
+    assert broker.consume(partition, 0, 2) == broker.partitions[partition][:2]
@@ -0,0 +1,204 @@
+import pytest
+
+from microhack.fake_drive import FakeDriveService
+from microhack.drive_cache import DriveCache
+from microhack.google_drive import (
+    GOOGLE_SHEETS_MIME,
+    Backoff,
+    DriveFilePoller,
+    DriveFolderPoller,
+    GoogleDriveConnector,
+    GoogleDriveStream,
+    folder_query,
+    parse_dtypes,
+)
+
+CSV = b"value,category\n10,A\n25,B\n"
+
+
+@pytest.fixture
+def service():
+    return FakeDriveService()
+
+
+def test_stream_downloads_only_when_content_changes(service):
+    service.put_file("sample_data.csv", CSV)
+    stream = GoogleDriveStream(GoogleDriveConnector(service=service), filename="sample_data.csv")
+
+    assert stream.get_data()["value"].tolist() == [10, 25]
+    assert stream.get_data() is None
+
+    # Re-saving without edits bumps modifiedTime but keeps the checksum
+    service.touch(stream.file_id)
+    assert stream.get_data() is None
+    assert service.calls["media"] == 1
+
+    service.put_file("sample_data.csv", CSV + b"15,A\n")
+    assert stream.get_data()["value"].tolist() == [10, 25, 15]
+
+
+def test_cached_revision_is_read_again_without_downloading(service, tmp_path):
+    file_id = service.put_file("sample_data.csv", CSV)
+    drive = GoogleDriveConnector(service=service, cache=DriveCache(str(tmp_path)))
+
+    # A new stream, e.g. after a restart, reads the unchanged file from the cache
+    for _ in range(2):
+        assert GoogleDriveStream(drive, file_id=file_id).get_data()["value"].tolist() == [10, 25]
+    assert service.calls["media"] == 1
+
+    service.put_file("sample_data.csv", CSV + b"15,A\n")
+    assert GoogleDriveStream(drive, file_id=file_id).get_data()["value"].tolist() == [10, 25, 15]
+    assert service.calls["media"] == 2
+
+
+@pytest.mark.parametrize("use_changes_feed", [False, True])
+def test_poller_reports_each_revision_once(service, use_changes_feed):
+    file_id = service.put_file("a.csv", CSV)
+    poller = DriveFilePoller(service, file_id, use_changes_feed=use_changes_feed)
+
+    first = poller.poll()
+    poller.acknowledge(first)
+    assert poller.poll() is None
+
+    service.put_file("other.csv", b"value\n1\n")
+    assert poller.poll() is None
+
+    service.put_file("a.csv", CSV + b"15,A\n")
+    changed = poller.poll()
+    assert changed["version"] == "2"
+    poller.acknowledge(changed)
+    assert poller.poll() is None
+
+
+def test_changes_feed_keeps_unacknowledged_change(service):
+    file_id = service.put_file("a.csv", CSV)
+    poller = DriveFilePoller(service, file_id, use_changes_feed=True)
+    poller.acknowledge(poller.poll())
+
+    service.put_file("a.csv", CSV + b"15,A\n")
+    assert poller.poll() is not None
+    # The download failed, so the change must be reported again
+    assert poller.poll() is not None
+    assert service.calls["files.get"] == 1
+
+
+def test_changes_feed_idle_poll_is_a_single_request(service):
+    file_id = service.put_file("a.csv", CSV)
+    poller = DriveFilePoller(service, file_id, use_changes_feed=True)
+    poller.acknowledge(poller.poll())
+    service.calls.clear()
+
+    for _ in range(5):
+        assert poller.poll() is None
+    assert dict(service.calls) == {"changes.list": 5}
+
+
+def test_backoff_grows_on_failures_and_resets_on_success():
+    backoff = Backoff(interval=10, max_delay=60)
+
+    delays = [backoff.failure() for _ in range(6)]
+    assert all(10 <= delay <= 60 for delay in delays)
+    assert backoff.failures == 6
+    assert backoff.success() == 10
+    assert backoff.failures == 0
+
+
+def test_read_errors_surface_to_the_caller(service):
+    file_id = service.put_file("a.csv", CSV)
+    poller = DriveFilePoller(service, file_id)
+    service.fail_next(status=429)
+
+    with pytest.raises(Exception):
+        poller.poll()
+    assert poller.poll() is not None
+
+
+def test_csv_is_parsed_in_bounded_batches_while_downloading(service):
+    rows = b"".join(b"%d,%s\n" % (i, b"AB"[i % 2 : i % 2 + 1]) for i in range(100000))
+    file_id = service.put_file("big.csv", b"value,category\n" + rows)
+    drive = GoogleDriveConnector(service=service)
+
+    batches = drive.iter_csv_batches(file_id, batch_size=30000, chunk_size=64 * 1024)
+    first = next(batches)
+    # Parsing started before the whole file was transferred
+    assert service.bytes_served < len(service.contents[file_id])
+
+    sizes = [len(first)] + [len(batch) for batch in batches]
+    assert sizes == [30000, 30000, 30000, 10000]
+    assert service.bytes_served == len(service.contents[file_id])
+
+
+def test_empty_csv_yields_no_batches(service):
+    file_id = service.put_file("empty.csv", b"")
+    assert list(GoogleDriveConnector(service=service).iter_csv_batches(file_id)) == []
+
+
+def test_listing_follows_page_tokens(service):
+    for i in range(7):
+        service.put_file(f"report-{i}.csv", CSV)
+    drive = GoogleDriveConnector(service=service)
+
+    files = list(drive.iter_files("name contains 'report'", page_size=3))
+
+    assert sorted(info["name"] for info in files) == [f"report-{i}.csv" for i in range(7)]
+    assert service.calls["files.list"] == 3
+
+
+def test_recent_files_filters_on_modified_time(service):
+    service.put_file("a.csv", CSV)
+    # Fake modification times are in 2024, far outside the window
+    assert GoogleDriveConnector(service=service).get_recent_files(days=7) == []
+
+
+def test_folder_poller_reports_new_and_changed_files(service):
+    first = service.put_file("day-1.csv", CSV, parents=["reports"])
+    service.put_file("notes.txt", b"hello", mime_type="text/plain", parents=["reports"])
+    service.put_file("elsewhere.csv", CSV)
+    poller = DriveFolderPoller(GoogleDriveConnector(service=service), folder_query("reports"))
+
+    changed, present = poller.poll()
+    assert [info["id"] for info in changed] == [first]
+    assert present == {first}
+    poller.acknowledge(changed[0])
+
+    second = service.put_file("day-2.csv", CSV, parents=["reports"])
+    service.touch(first)
+    changed, present = poller.poll()
+    assert [info["id"] for info in changed] == [second]
+    assert present == {first, second}
+
+    service.delete_file(first)
+    assert poller.poll()[1] == {second}
+
+
+def test_google_sheets_are_exported_as_csv(service):
+    file_id = service.put_file("sheet", CSV, mime_type=GOOGLE_SHEETS_MIME)
+    drive = GoogleDriveConnector(service=service)
+
+    batches = list(drive.iter_file_batches(service.metadata[file_id], batch_size=1))
+
+    assert [batch["value"].tolist() for batch in batches] == [[10], [25]]
+    assert service.calls["export"] == 1
+    assert service.calls["media"] == 0
+
+
+def test_projection_and_dtype_hints(service, tmp_path):
+    file_id = service.put_file("wide.csv", b"value,category,note\n10,A,x\n25,B,y\n")
+    cache = DriveCache(str(tmp_path))
+    narrow = GoogleDriveConnector(
+        service=service, cache=cache, columns=["value", "missing"], dtypes=parse_dtypes("value:float32")
+    )
+
+    [batch] = narrow.iter_file_batches(service.metadata[file_id])
+    assert list(batch.columns) == ["value"]
+    assert str(batch["value"].dtype) == "float32"
+
+    # Frames parsed with another projection are not served from the cache
+    [batch] = GoogleDriveConnector(service=service, cache=cache).iter_file_batches(service.metadata[file_id])
+    assert list(batch.columns) == ["value", "category", "note"]
+    assert cache.misses == 2
+
+
+def test_invalid_dtype_hint():
+    with pytest.raises(ValueError):
+        parse_dtypes("value")
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from microhack.ingest import iter_batches, iter_records
+
+
+async def _chunks(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start : start + size]
+
+
+def _parse(body: bytes, size: int):
+    async def collect():
+        return [record async for record in iter_records(_chunks(body, size))]
+
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1024])
+def test_json_array_split_across_chunks(size):
+    body = '[{"value": 1}, {"value": 2},\n {"value": 3, "label": "é"}]'.encode()
+    assert _parse(body, size) == [{"value": 1}, {"value": 2}, {"value": 3, "label": "é"}]
+
+
+@pytest.mark.parametrize("size", [1, 5, 1024])
+def test_ndjson_split_across_chunks(size):
+    body = b'{"value": 1}\n\n{"value": 2}\n{"value": 3}'
+    assert _parse(body, size) == [{"value": 1}, {"value": 2}, {"value": 3}]
+
+
+@pytest.mark.parametrize("body", [b'[{"value": 1}', b"[1, 2]", b'{"value":'])
+def test_malformed_body_is_rejected(body):
+    with pytest.raises(ValueError):
+        _parse(body, 4)
+
+
+def test_batches_are_bounded():
+    async def collect():
+        records = iter_records(_chunks(b"\n".join(b'{"value": 1}' for _ in range(5)), 8))
+        return [len(batch) async for batch in iter_batches(records, 2)]
+
+    assert asyncio.run(collect()) == [2, 2, 1]
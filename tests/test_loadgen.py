@@ -0,0 +1,39 @@
+from microhack.loadgen import LoadGenerator
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_generator_shapes_records():
+    generator = LoadGenerator(payload_width=3, key_cardinality=5, total=1000)
+    records = [record for batch in generator.batches(100) for record in batch]
+
+    assert [record["seq"] for record in records] == list(range(1000))
+    assert {record["key"] for record in records} == {f"k{i}" for i in range(5)}
+    assert {"f0", "f1", "f2"} <= set(records[0])
+
+
+def test_generator_paces_to_rate():
+    clock = FakeClock()
+    generator = LoadGenerator(rate=100, total=300, clock=clock, sleep=clock.sleep)
+
+    assert sum(len(batch) for batch in generator.batches(10)) == 300
+    assert clock.now == 2.9
+
+
+def test_bursty_generator_sends_each_second_early():
+    generator = LoadGenerator(rate=100, burstiness=4)
+
+    assert generator.due_at(0) == 0
+    assert generator.due_at(99) == 99 / 400
+    assert generator.due_at(100) == 1
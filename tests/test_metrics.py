@@ -0,0 +1,39 @@
+from microhack.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_counter_and_gauge_render_with_labels():
+    registry = Registry()
+    events = registry.register(Counter("events_total", "Events", ["connector"]))
+    depth = registry.register(Gauge("queue_depth", "Depth", ["queue"]))
+    events.inc(3, connector="http")
+    events.inc(connector="http")
+    depth.set_function(lambda: 7, queue="ingest")
+
+    text = registry.render()
+
+    assert "# TYPE events_total counter" in text
+    assert 'events_total{connector="http"} 4' in text
+    assert 'queue_depth{queue="ingest"} 7' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.register(Histogram("latency_seconds", "Latency", buckets=(0.1, 1)))
+    for value in [0.05, 0.5, 0.7, 3]:
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_sum 4.25" in lines
+    assert "latency_seconds_count 4" in lines
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    errors = registry.register(Counter("errors_total", "Errors", ["error"]))
+    errors.inc(error='bad "quote" \\ and\nnewline')
+
+    assert 'errors_total{error="bad \\"quote\\" \\\\ and\\nnewline"} 1' in registry.render()
@@ -0,0 +1,32 @@
+from microhack.pacing import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_rate_limiter_paces_to_configured_rate():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=100, clock=clock, sleep=clock.sleep)
+
+    for _ in range(10):
+        limiter.acquire(50)
+
+    # 100 rows pass in the initial burst, the remaining 400 take 4 seconds
+    assert clock.now == 4.0
+
+
+def test_disabled_rate_limiter_never_sleeps():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=0, clock=clock, sleep=clock.sleep)
+
+    limiter.acquire(10**6)
+
+    assert clock.now == 0.0
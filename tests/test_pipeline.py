@@ -1,17 +1,22 @@
+import pickle
+
+import pathway as pw
+import pytest
+
+from microhack.aggregations import AggregationSpec, DistinctCountAccumulator, QuantileAccumulator, _accumulator
+from microhack.instrumentation import without_ingest_time
 from microhack.pipeline import pipeline
 
 from pathway.tests.utils import T, assert_table_equality_wo_index
 
 
 def test_pipeline():
-    input_table = T(
-        """
+    input_table = T("""
             | value
         1   | 1
         2   | 2
         3   | 3
-    """
-    )
+    """)
     output_table = pipeline(input_table)
     assert_table_equality_wo_index(
         output_table,
@@ -22,3 +27,215 @@ def test_pipeline():
     """,
         ),
     )
+
+
+def test_pipeline_grouped_reducers():
+    input_table = T("""
+            | value | category
+        1   | 10    | A
+        2   | 25    | B
+        3   | 15    | A
+    """)
+    spec = AggregationSpec(reducers=["count", "sum", "min", "max"], group_by=["category"])
+    output_table = pipeline(input_table, spec)
+    assert_table_equality_wo_index(
+        output_table,
+        T(
+            """
+        category | count | sum | min | max
+        A        | 2     | 25  | 10  | 15
+        B        | 1     | 25  | 25  | 25
+    """,
+        ),
+    )
+
+
+def test_pipeline_tumbling_window():
+    input_table = T(
+        """
+            | value | timestamp
+        1   | 1.0   | 0.0
+        2   | 2.0   | 5.0
+        3   | 3.0   | 12.0
+    """,
+        schema=pw.schema_from_types(value=float, timestamp=float),
+    )
+    spec = AggregationSpec(reducers=["count", "mean"], window="tumbling", duration=10.0)
+    output_table = pipeline(input_table, spec)
+    assert_table_equality_wo_index(
+        output_table,
+        T(
+            """
+        window_start | window_end | count | mean
+        0.0          | 10.0       | 2     | 1.5
+        10.0         | 20.0       | 1     | 3.0
+    """,
+            schema=pw.schema_from_types(window_start=float, window_end=float, count=int, mean=float),
+        ),
+    )
+
+
+def test_unknown_reducer_is_rejected():
+    with pytest.raises(ValueError):
+        AggregationSpec(reducers=["median"])
+
+
+def test_pipeline_distinct_count():
+    input_table = T("""
+            | value | category
+        1   | 1     | A
+        2   | 2     | B
+        3   | 2     | A
+    """)
+    spec = AggregationSpec(reducers=["distinct"], distinct_columns=["category"])
+    output_table = pipeline(input_table, spec)
+    assert_table_equality_wo_index(
+        output_table,
+        T(
+            """
+        distinct | distinct_category
+        2        | 2
+    """,
+        ),
+    )
+
+
+def test_pipeline_distinct_count_keeps_retracted_values():
+    input_table = T("""
+            | value | category | __time__ | __diff__
+        1   | 1     | A        | 2        | 1
+        2   | 2     | B        | 2        | 1
+        2   | 2     | B        | 4        | -1
+    """)
+    spec = AggregationSpec(reducers=["count", "distinct"], distinct_columns=["category"])
+    output_table = pipeline(input_table, spec)
+    assert_table_equality_wo_index(
+        output_table,
+        T(
+            """
+        count | distinct | distinct_category
+        1     | 2        | 2
+    """,
+        ),
+    )
+
+
+def test_parametrized_accumulators_can_be_pickled():
+    # The engine pickles reducer state, e.g. to persist it
+    distinct = _accumulator(DistinctCountAccumulator, precision=10)
+    quantile = _accumulator(QuantileAccumulator, quantile=0.999, relative_accuracy=0.02, max_bins=512)
+    assert _accumulator(DistinctCountAccumulator, precision=10) is distinct
+    for accumulator in [distinct.from_row(["A"]), quantile.from_row([1.5])]:
+        restored = pickle.loads(pickle.dumps(accumulator))
+        assert type(restored) is type(accumulator)
+        assert restored.compute_result() == pytest.approx(accumulator.compute_result())
+    assert pickle.loads(pickle.dumps(quantile.from_row([1.5]))).quantile == 0.999
+
+
+def test_pipeline_carries_newest_ingest_time():
+    input_table = T(
+        """
+            | value | category | ingested_at
+        1   | 1     | A        | 100.0
+        2   | 2     | A        | 105.0
+        3   | 3     | B        | 101.0
+    """,
+        schema=pw.schema_from_types(value=int, category=str, ingested_at=float),
+    )
+    output_table = pipeline(input_table, AggregationSpec(group_by=["category"]))
+    assert_table_equality_wo_index(
+        output_table,
+        T(
+            """
+        category | sum | ingested_at
+        A        | 3   | 105.0
+        B        | 3   | 101.0
+    """,
+            schema=pw.schema_from_types(category=str, sum=int, ingested_at=float),
+        ),
+    )
+    # Sinks and clients receive the results without it
+    assert list(without_ingest_time(output_table).column_names()) == ["category", "sum"]
+
+
+def test_sharded_pipeline_matches_single_phase():
+    input_table = T("""
+            | value | category
+        1   | 10    | A
+        2   | 25    | B
+        3   | 15    | A
+        4   | 5     | A
+    """)
+    spec = AggregationSpec(reducers=["count", "sum", "min", "max", "mean"], group_by=["category"], shards=4)
+    assert spec.sharded
+    output_table = pipeline(input_table, spec)
+    assert_table_equality_wo_index(
+        output_table,
+        T(
+            """
+        category | count | sum | min | max | mean
+        A        | 3     | 30  | 5   | 15  | 10.0
+        B        | 1     | 25  | 25  | 25  | 25.0
+    """,
+            schema=pw.schema_from_types(category=str, count=int, sum=int, min=int, max=int, mean=float),
+        ),
+    )
+    assert_table_equality_wo_index(output_table, pipeline(input_table, AggregationSpec(**{**vars(spec), "shards": 1})))
+
+
+def test_pipeline_is_sharded_only_when_asked():
+    assert not AggregationSpec.from_settings(_settings(pathway_processes=4)).sharded
+    assert AggregationSpec.from_settings(_settings(aggregation_shards=8)).sharded
+
+
+def _settings(**overrides):
+    from microhack.config import Settings
+
+    return Settings(
+        input_connector="python",
+        autocommit_duration_ms=1000,
+        pathway_threads=1,
+        kafka_bootstrap_servers="",
+        kafka_group_id="",
+        kafka_session_timeout_ms="",
+        kafka_topic="",
+        **overrides,
+    )
+
+
+def test_pipelines_share_one_input():
+    from microhack.registry import build_pipelines, input_columns, load_pipelines
+
+    settings = _settings(pipelines='{"by_category": {"group_by": "category", "reducers": "count,max"}}')
+    definitions = load_pipelines(settings)
+    assert [definition.name for definition in definitions] == ["main", "by_category"]
+    assert definitions[1].output_path == "output-by_category.csv"
+    assert input_columns(definitions) == ["category"]
+
+    input_table = T("""
+            | value | category
+        1   | 10    | A
+        2   | 25    | B
+        3   | 15    | A
+    """)
+    output_tables = build_pipelines(input_table, definitions)
+    assert_table_equality_wo_index(output_tables["main"], T("sum\n50"))
+    assert_table_equality_wo_index(
+        output_tables["by_category"],
+        T(
+            """
+        category | count | max
+        A        | 2     | 15
+        B        | 1     | 25
+    """,
+        ),
+    )
+
+
+def test_pipeline_options_are_validated():
+    from microhack.registry import load_pipelines
+
+    with pytest.raises(ValueError):
+        load_pipelines(_settings(pipelines='{"bad": {"grup_by": "category"}}'))
+    with pytest.raises(ValueError):
+        load_pipelines(_settings(pipelines='{"bad": {"window": "hourly"}}'))
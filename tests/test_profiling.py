@@ -0,0 +1,65 @@
+import json
+import threading
+import xml.etree.ElementTree as ElementTree
+
+from microhack.profiling import Profiler
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_sampler_folds_thread_stacks():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name="connector")
+    worker.start()
+    profiler = Profiler()
+    try:
+        for _ in range(20):
+            profiler.sample()
+    finally:
+        stop.set()
+        worker.join()
+
+    assert profiler.samples == 20
+    stacks = [line for line in profiler.folded().splitlines() if line.startswith("connector;")]
+    assert stacks and all("busy_loop (test_profiling.py:" in line for line in stacks)
+    summary = profiler.summary()
+    assert summary["threads"]["connector"] > 0
+    assert any("busy_loop" in entry["function"] for entry in summary["top_functions"])
+    # Well-formed SVG
+    assert ElementTree.fromstring(profiler.flamegraph()).tag.endswith("svg")
+
+
+def test_stage_latency_is_measured_from_the_input():
+    now = [0.0]
+    profiler = Profiler(clock=lambda: now[0])
+    profiler.record_stage("input", 2, added=100)
+    profiler.record_stage("input", 2, added=50)
+    now[0] = 0.25
+    profiler.record_stage("output:main", 2, added=1)
+    profiler.record_stage("output:main", 2, removed=1)
+    now[0] = 1.0
+    profiler.record_stage("output:main", 4, added=1)
+
+    stages = profiler.summary()["stages"]
+    assert stages["input"]["rows_added"] == 150
+    assert stages["input"]["commits"] == 1
+    output = stages["output:main"]
+    assert (output["rows_added"], output["rows_removed"], output["commits"]) == (2, 1, 2)
+    # Time 4 never reached the input stage, so only time 2 has a latency
+    assert output["latency_ms_mean"] == output["latency_ms_max"] == 250
+
+
+def test_timed_callbacks_and_dump(tmp_path):
+    profiler = Profiler()
+    callback = profiler.timed("sink:output.csv", lambda value: value * 2)
+    assert callback(2) == 4 and callback(3) == 6
+
+    paths = profiler.dump(str(tmp_path / "profiles" / "run"))
+
+    assert sorted(path.rsplit(".", 1)[1] for path in paths) == ["folded", "json", "svg"]
+    with open(tmp_path / "profiles" / "run.json") as file:
+        summary = json.load(file)
+    assert summary["callbacks"]["sink:output.csv"]["calls"] == 2
@@ -0,0 +1,65 @@
+import pandas as pd
+
+from microhack.row_diff import RowDiffer
+
+
+def test_unchanged_frame_produces_no_changes():
+    df = pd.DataFrame({"value": [10, 25, 15], "category": ["A", "B", "A"]})
+    differ = RowDiffer()
+
+    assert differ.diff(df).inserted == [0, 1, 2]
+    assert differ.diff(df.copy()).size == 0
+
+
+def test_single_cell_edit_is_one_delete_and_one_insert_by_content():
+    df = pd.DataFrame({"value": [10, 25, 15], "category": ["A", "B", "A"]})
+    differ = RowDiffer()
+    differ.diff(df)
+
+    edited = df.copy()
+    edited.loc[1, "value"] = 26
+    changes = differ.diff(edited)
+
+    assert changes.inserted == [1]
+    assert changes.updated == []
+    assert len(changes.deleted) == 1
+
+
+def test_key_column_reports_updates_in_place():
+    df = pd.DataFrame({"id": [1, 2, 3], "value": [10, 25, 15]})
+    differ = RowDiffer(key_column="id")
+    differ.diff(df)
+
+    edited = pd.DataFrame({"id": [2, 3, 4], "value": [25, 16, 30]})
+    changes = differ.diff(edited)
+
+    assert changes.inserted == [2]
+    assert changes.updated == [1]
+    assert changes.deleted == ["1"]
+
+
+def test_duplicate_rows_stay_distinct():
+    df = pd.DataFrame({"value": [5, 5]})
+    differ = RowDiffer()
+    differ.diff(df)
+
+    changes = differ.diff(pd.DataFrame({"value": [5]}))
+
+    assert changes.inserted == []
+    assert len(changes.deleted) == 1
+
+
+def test_batched_pass_matches_whole_frame_diff():
+    df = pd.DataFrame({"value": [5, 5, 7, 8]})
+    differ = RowDiffer()
+    differ.diff(df)
+
+    edited = pd.DataFrame({"value": [5, 5, 7, 9]})
+    differ.begin()
+    first = differ.diff_batch(edited.iloc[:2])
+    second = differ.diff_batch(edited.iloc[2:])
+    deleted = differ.finish()
+
+    assert first.inserted == [] and second.inserted == [1]
+    assert len(deleted) == 1
+    assert RowDiffer().diff(edited).keys == first.keys + second.keys
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from microhack.broadcast import BroadcastHub
+from microhack.shared_pipeline import PipelineClient, PipelineError, PipelineServer
+
+AUTHKEY = b"test"
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_workers_mirror_the_shared_pipeline(tmp_path):
+    pushed = []
+
+    def push(records, typed):
+        pushed.extend((record, typed) for record in records)
+
+    server = PipelineServer(str(tmp_path / "pipeline.sock"), AUTHKEY, push=push)
+    server.start()
+    server.on_change("a", {"sum": 1}, 2, True)
+
+    early = PipelineClient(server.address, AUTHKEY, BroadcastHub())
+    early.start()
+    wait_for(early.connected.is_set)
+
+    server.on_change("a", {"sum": 1}, 4, False)
+    server.on_change("a", {"sum": 5}, 4, True)
+    server.on_change("b", {"sum": 7}, 4, True)
+
+    late = PipelineClient(server.address, AUTHKEY, BroadcastHub())
+    late.start()
+    wait_for(late.connected.is_set)
+    server.on_change("b", {"sum": 7}, 6, False)
+
+    for client in (early, late):
+        wait_for(lambda: client.hub.seq == server.hub.seq)
+        assert client.hub.snapshot() == server.hub.snapshot() == {"a": {"sum": 5}}
+
+    early.push([{"value": 1}, {"value": 2}])
+    late.push([{"value": 3}], typed=True)
+    assert [(record["value"], typed) for record, typed in pushed] == [(1, False), (2, False), (3, True)]
+    wait_for(lambda: early.counters == late.counters == {"records": 3, "batches": 2})
+
+
+def test_load_replaces_hub_state():
+    hub = BroadcastHub()
+    hub.on_change("old", {"sum": 1}, 2, True)
+
+    hub.load([("a", {"sum": 3}, 8)], seq=41)
+    hub.on_change("b", {"sum": 4}, 10, True)
+
+    assert hub.snapshot() == {"a": {"sum": 3}, "b": {"sum": 4}}
+    assert hub.seq == 42
+
+
+def test_workers_mirror_every_pipeline(tmp_path):
+    server = PipelineServer(str(tmp_path / "pipeline.sock"), AUTHKEY, push=lambda records, typed: None)
+    server.start()
+    server.on_change("a", {"sum": 1}, 2, True)
+    server.on_change("x", {"count": 1}, 2, True, pipeline="by_category")
+
+    client = PipelineClient(server.address, AUTHKEY, BroadcastHub(), {"by_category": BroadcastHub()})
+    client.start()
+    wait_for(client.connected.is_set)
+    server.on_change("y", {"count": 2}, 4, True, pipeline="by_category")
+    server.on_change("z", {"count": 3}, 4, True, pipeline="unserved")
+
+    by_category = client.hubs["by_category"]
+    wait_for(lambda: by_category.seq == server.hubs["by_category"].seq == 2)
+    assert by_category.snapshot() == {"x": {"count": 1}, "y": {"count": 2}}
+    assert client.hub.snapshot() == {"a": {"sum": 1}}
+    assert set(client.hubs) == {"main", "by_category"}
+
+
+def test_push_errors_reach_the_worker(tmp_path):
+    def push(records, typed):
+        if records[0]["value"] < 0:
+            raise ValueError("negative value")
+
+    server = PipelineServer(str(tmp_path / "pipeline.sock"), AUTHKEY, push=push)
+    server.start()
+    client = PipelineClient(server.address, AUTHKEY, BroadcastHub())
+
+    with pytest.raises(PipelineError, match="negative value"):
+        client.push([{"value": -1}])
+    # The connection stays usable, and only pushed batches are counted
+    client.push([{"value": 1}])
+    assert server.counters == {"records": 1, "batches": 1}
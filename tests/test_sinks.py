@@ -0,0 +1,127 @@
+import json
+import os
+from typing import Optional
+
+import pytest
+
+from microhack.sinks import RotatingSink, SnapshotSink
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_snapshot_keeps_only_latest_state(tmp_path):
+    path = str(tmp_path / "state.jsonl")
+    sink = SnapshotSink(path, flush_interval_ms=0)
+
+    for time, total in enumerate([10, 20, 30]):
+        if total > 10:
+            sink.on_change("k", {"sum": total - 10}, time, False)
+        sink.on_change("k", {"sum": total}, time, True)
+        sink.on_time_end(time)
+
+    with open(path) as f:
+        assert [json.loads(line) for line in f] == [{"key": "k", "sum": 30}]
+
+
+def test_snapshot_csv_and_flush_interval(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "state.csv")
+    sink = SnapshotSink(path, flush_interval_ms=1000, clock=clock)
+
+    sink.on_change("a", {"sum": 1}, 0, True)
+    sink.on_time_end(0)
+    sink.on_change("a", {"sum": 1}, 1, False)
+    sink.on_change("a", {"sum": 2}, 1, True)
+    sink.on_time_end(1)  # within the flush interval: not written yet
+    with open(path) as f:
+        assert f.read().splitlines() == ["key,sum", "a,1"]
+
+    sink.on_end()
+    with open(path) as f:
+        assert f.read().splitlines() == ["key,sum", "a,2"]
+
+
+def test_rotating_jsonl_rolls_over_by_size_and_prunes(tmp_path):
+    clock = FakeClock()
+    sink = RotatingSink(
+        str(tmp_path / "out.jsonl"), rotate_bytes=100, rotate_seconds=0, flush_rows=2, keep_files=2, clock=clock
+    )
+
+    for time in range(10):
+        sink.on_change("k", {"sum": time}, time, True)
+    sink.on_end()
+
+    files = sorted(os.listdir(tmp_path))
+    assert len(files) == 2
+    rows = [json.loads(line) for name in files for line in open(tmp_path / name)]
+    assert rows[-1] == {"sum": 9, "time": 9, "diff": 1}
+
+
+def test_rotating_rolls_over_by_age(tmp_path):
+    clock = FakeClock()
+    sink = RotatingSink(str(tmp_path / "out.jsonl"), rotate_seconds=60, flush_rows=1, clock=clock)
+
+    sink.on_change("k", {"sum": 1}, 0, True)
+    first = sink.current_file
+    clock.now += 61
+    sink.on_change("k", {"sum": 1}, 1, False)
+
+    assert sink.current_file != first
+
+
+def test_rotating_parquet(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    sink = RotatingSink(str(tmp_path / "out.parquet"), flush_rows=2)
+
+    for time in range(3):
+        sink.on_change("k", {"sum": time}, time, True)
+    sink.on_end()
+
+    table = pq.read_table(sink.current_file)
+    assert table.column("sum").to_pylist() == [0, 1, 2]
+
+
+def test_rotating_parquet_schema_comes_from_the_output_columns(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    columns = {"category": Optional[str], "sum": int, "mean": float | None, "window": tuple}
+    sink = RotatingSink(str(tmp_path / "out.parquet"), flush_rows=1, columns=columns)
+
+    # The first row holds only nulls, which would otherwise fix null-typed columns
+    sink.on_change("k", {"category": None, "sum": 0, "mean": None, "window": None}, 0, True)
+    sink.on_change("k", {"category": "A", "sum": 3, "mean": 1.5, "window": (0, 10)}, 2, True)
+    sink.on_end()
+
+    table = pq.read_table(sink.current_file)
+    assert table.column("category").to_pylist() == [None, "A"]
+    assert table.column("mean").to_pylist() == [None, 1.5]
+    assert table.column("window").to_pylist() == [None, "(0, 10)"]
+    assert [str(field.type) for field in table.schema] == ["string", "int64", "double", "string", "int64", "int64"]
+
+
+def test_rotating_rejects_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        RotatingSink(str(tmp_path / "out.csv"))
+
+
+def test_rotating_prunes_only_its_own_files(tmp_path):
+    clock = FakeClock()
+    options = dict(rotate_bytes=1, rotate_seconds=0, flush_rows=1, keep_files=2, clock=clock)
+    main = RotatingSink(str(tmp_path / "output.jsonl"), **options)
+    other = RotatingSink(str(tmp_path / "output-by_category.jsonl"), **options)
+
+    for time in range(5):
+        other.on_change("k", {"sum": time}, time, True)
+        main.on_change("k", {"sum": time}, time, True)
+    main.on_end()
+    other.on_end()
+
+    files = sorted(os.listdir(tmp_path))
+    assert len([name for name in files if name.startswith("output-by_category-")]) == 2
+    assert len([name for name in files if not name.startswith("output-by_category-")]) == 2
+    assert os.path.basename(main.current_file) in files
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from microhack.sketches import DDSketch, HyperLogLog
+
+
+def test_hyperloglog_estimates_distinct_count_within_error_bound():
+    sketch = HyperLogLog(precision=12)
+    for value in range(50000):
+        sketch.add(value)
+        sketch.add(value)  # duplicates do not count
+
+    assert sketch.count() == pytest.approx(50000, rel=4 * 1.04 / 64)
+    assert sketch.memory_bytes == 4096
+
+
+def test_hyperloglog_is_exact_for_small_sets_and_mergeable():
+    left, right = HyperLogLog(), HyperLogLog()
+    for value in "abc":
+        left.add(value)
+    for value in "cde":
+        right.add(value)
+
+    left.merge(right)
+
+    assert left.count() == 5
+
+
+def test_ddsketch_quantiles_are_within_relative_accuracy():
+    rng = random.Random(0)
+    values = sorted(rng.lognormvariate(0, 2) for _ in range(20000))
+    sketch = DDSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.02)
+
+
+def test_ddsketch_memory_is_bounded_and_retractions_cancel_out():
+    sketch = DDSketch(relative_accuracy=0.05, max_bins=32)
+    for value in range(-1000, 1000):
+        sketch.add(value)
+    assert len(sketch.positive.counts) <= 32 and len(sketch.negative.counts) <= 32
+
+    other = DDSketch(relative_accuracy=0.05, max_bins=32)
+    for value in range(-1000, 1000):
+        other.add(value)
+    sketch.subtract(other)
+
+    assert sketch.count == 0
+    assert sketch.positive.counts == {} and sketch.negative.counts == {}
+    assert sketch.quantile(0.5) is None
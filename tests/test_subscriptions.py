@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+import pytest
+from starlette.datastructures import QueryParams
+
+from microhack.broadcast import BroadcastHub
+from microhack.subscriptions import Subscription
+
+
+def frames(hub, subscription, changes, count):
+    """Subscribe, take the first frame, apply engine changes, and collect `count` decoded frames in all."""
+
+    def decode(frame):
+        if isinstance(frame, bytes):
+            import msgpack
+
+            return msgpack.unpackb(frame)
+        return json.loads(frame)
+
+    async def scenario():
+        hub.attach(asyncio.get_running_loop())
+        subscriber = hub.subscribe_stream(subscription)
+        received = [decode(await subscriber.get())]
+        for change in changes:
+            await asyncio.to_thread(hub.on_change, *change)
+        for _ in range(count - 1):
+            received.append(decode(await asyncio.wait_for(subscriber.get(), timeout=5)))
+        return received
+
+    return asyncio.run(scenario())
+
+
+def test_query_parameters_are_parsed():
+    subscription = Subscription.from_query(
+        QueryParams("keys=a,b&group=category:A&group=category:B&since=7&max_fps=5&snapshot=false")
+    )
+
+    assert subscription.keys == {"a", "b"}
+    assert subscription.groups == {"category": {"A", "B"}}
+    assert (subscription.since, subscription.max_fps, subscription.snapshot) == (7, 5.0, False)
+    with pytest.raises(ValueError):
+        Subscription.from_query(QueryParams("group=category"))
+
+
+def test_snapshot_then_filtered_coalesced_updates():
+    hub = BroadcastHub()
+    hub.on_change("a", {"category": "A", "sum": 1}, 1, True)
+    hub.on_change("b", {"category": "B", "sum": 2}, 1, True)
+    changes = [
+        ("a", {"category": "A", "sum": 1}, 2, False),
+        ("a", {"category": "A", "sum": 5}, 2, True),
+        ("b", {"category": "B", "sum": 2}, 2, False),
+        ("b", {"category": "B", "sum": 3}, 2, True),
+    ]
+
+    snapshot, update = frames(hub, Subscription(groups=[("category", "A")]), changes, 2)
+
+    assert snapshot == {"type": "snapshot", "seq": 2, "updates": [{"key": "a", "row": {"category": "A", "sum": 1}}]}
+    # The retraction and the insertion of "a" arrive as its latest row only
+    assert update == {"type": "update", "seq": 6, "updates": [{"key": "a", "row": {"category": "A", "sum": 5}}]}
+
+
+def test_resume_sends_only_keys_changed_since_and_deletions():
+    pytest.importorskip("msgpack")
+    hub = BroadcastHub()
+    hub.on_change("a", {"sum": 1}, 1, True)
+    hub.on_change("b", {"sum": 2}, 1, True)
+    hub.on_change("b", {"sum": 2}, 2, False)
+    hub.on_change("c", {"sum": 3}, 2, True)
+
+    [resume] = frames(hub, Subscription(since=2, encoding="msgpack"), [], 1)
+
+    assert resume == {
+        "type": "resume",
+        "seq": 4,
+        "updates": [{"key": "b", "deleted": True}, {"key": "c", "row": {"sum": 3}}],
+    }
+
+
+def test_resume_from_beyond_the_log_falls_back_to_a_snapshot():
+    hub = BroadcastHub(log_size=2)
+    for value in range(5):
+        hub.on_change(str(value), {"sum": value}, value, True)
+
+    [frame] = frames(hub, Subscription(since=1), [], 1)
+
+    assert frame["type"] == "snapshot"
+    assert len(frame["updates"]) == 5
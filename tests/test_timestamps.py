@@ -0,0 +1,9 @@
+from microhack.timestamps import to_epoch
+
+
+def test_to_epoch():
+    assert to_epoch("1700000000.5") == 1700000000.5
+    assert to_epoch("2024-01-01 10:00:00") == 1704103200.0
+    assert to_epoch("2024-01-01T10:00:00+01:00") == 1704099600.0
+    assert to_epoch("yesterday") is None
+    assert to_epoch(None) is None
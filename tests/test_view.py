@@ -0,0 +1,59 @@
+import pytest
+
+from microhack.view import MaterializedView
+
+
+def make_view():
+    view = MaterializedView(["region"], "window_start")
+    for index in range(10):
+        region = "eu" if index % 2 else "us"
+        view.apply(f"k{index}", {"region": region, "window_start": index * 10, "sum": index}, 2, True)
+    return view
+
+
+def test_retraction_after_replacing_insertion_keeps_new_row():
+    view = MaterializedView(["region"])
+    view.apply("a", {"region": "eu", "sum": 1}, 2, True)
+    view.apply("a", {"region": "eu", "sum": 2}, 4, True)
+    view.apply("a", {"region": "eu", "sum": 1}, 4, False)
+    assert view.get("a") == {"region": "eu", "sum": 2}
+    rows, _ = view.query({"region": "eu"})
+    assert [(row["key"], row["time"], row["sum"]) for row in rows] == [("a", 4, 2)]
+
+    view.apply("a", {"region": "eu", "sum": 2}, 6, False)
+    assert len(view) == 0
+    assert view.query({"region": "eu"}) == ([], None)
+
+
+def test_index_and_plain_filters():
+    view = make_view()
+    rows, cursor = view.query({"region": "eu"})
+    assert [row["sum"] for row in rows] == [1, 3, 5, 7, 9]
+    assert cursor is None
+    rows, _ = view.query({"region": "eu", "sum": "3"})
+    assert [row["key"] for row in rows] == ["k3"]
+    assert view.query({"region": "asia"}) == ([], None)
+
+
+def test_time_range():
+    view = make_view()
+    rows, _ = view.query(time_from=20, time_to=50)
+    assert [row["time"] for row in rows] == [20, 30, 40]
+
+
+@pytest.mark.parametrize("filters", [{}, {"region": "us"}])
+def test_cursor_pagination(filters):
+    view = make_view()
+    expected, _ = view.query(filters, limit=1000)
+    seen, cursor = [], None
+    while True:
+        rows, cursor = view.query(filters, limit=2, cursor=cursor)
+        seen.extend(rows)
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_invalid_cursor():
+    with pytest.raises(ValueError):
+        make_view().query(cursor="nonsense")
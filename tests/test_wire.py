@@ -0,0 +1,60 @@
+from typing import Optional
+
+import pytest
+
+from microhack.metrics import INPUT_REJECTED
+from microhack.wire import RowCodec, benchmark_decode
+
+msgpack = pytest.importorskip("msgpack")
+
+TYPES = {"value": int, "timestamp": Optional[float], "category": Optional[str]}
+DEFAULTS = {"timestamp": None, "category": None}
+
+
+def test_batches_round_trip_in_schema_order():
+    codec = RowCodec(TYPES, DEFAULTS)
+    message = codec.encode([{"value": 1, "timestamp": 2}, {"category": "A", "value": 3}])
+
+    assert codec.decode(message) == [(1, 2.0, None), (3, None, "A")]
+    assert codec.decode_records(message)[1] == {"value": 3, "timestamp": None, "category": "A"}
+    with pytest.raises(ValueError):
+        codec.encode([{"value": 1, "unknown": 2}])
+
+
+def test_invalid_rows_are_skipped():
+    codec = RowCodec(TYPES, DEFAULTS)
+    before = INPUT_REJECTED.value(kind="row")
+    message = msgpack.packb({"columns": ["timestamp", "value"], "rows": [[1.5, 1], [2.5, "2"], [3.5], [None, 4]]})
+
+    assert codec.decode(message) == [(1, 1.5, None), (4, None, None)]
+    assert INPUT_REJECTED.value(kind="row") == before + 2
+    with pytest.raises(ValueError):
+        codec.decode(message, strict=True)
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        {"columns": ["timestamp"], "rows": [[1.0]]},  # no value column
+        {"columns": ["value", "region"], "rows": [[1, "eu"]]},  # not in the schema
+        {"rows": [[1]]},
+        [[1]],
+    ],
+)
+def test_invalid_messages_are_rejected(message):
+    codec = RowCodec(TYPES, DEFAULTS)
+    before = INPUT_REJECTED.value(kind="message")
+
+    assert codec.decode(msgpack.packb(message)) == []
+    assert INPUT_REJECTED.value(kind="message") == before + 1
+    with pytest.raises(ValueError):
+        codec.decode(msgpack.packb(message), strict=True)
+    assert codec.decode(b"\xc1") == []
+
+
+def test_decode_benchmark_reports_every_format():
+    records = [{"value": seq, "key": f"k{seq % 3}", "timestamp": float(seq)} for seq in range(100)]
+    report = benchmark_decode(records, batch_size=10, repeat=1)
+
+    assert set(report["formats"]) == {"json", "json_batch", "msgpack"}
+    assert report["formats"]["msgpack"]["size_vs_json"] < 1